@@ -11,7 +11,7 @@ migrate = Migrate()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
-def create_app(config_class=None):
+def create_app(config_class=None, overrides=None):
     app = Flask(__name__)
     
     # Load configuration
@@ -26,14 +26,44 @@ def create_app(config_class=None):
     # Override with environment variables if available
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', app.config.get('SECRET_KEY'))
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', app.config.get('SQLALCHEMY_DATABASE_URI'))
+    app.config.update(overrides or {})
     
     
+    # Connection pool profile of the config class (DB_POOL_*)
+    from app.services.db_pool import DbPool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = DbPool.engine_options(app.config)
+    
     # Initialize extensions
     db.init_app(app)
+    DbPool.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
     
+    # Buffered audit writer (one per worker process)
+    from app.services.audit_service import AuditService
+    AuditService.init_app(app)
+    
+    # Live stock events for POS terminals
+    from app.services.stock_events import StockEvents
+    StockEvents.init_app(app)
+    
+    # Long-lived wkhtmltopdf renderers (one pool per worker process)
+    from app.services.pdf_service import PdfService
+    PdfService.init_app(app)
+    
+    # Rendered receipts on disk, keyed by sale, status and receipt settings
+    from app.services.receipt_cache import ReceiptCache
+    ReceiptCache.init_app(app)
+    
+    # Report/inventory exports built by worker processes
+    from app.services.export_jobs import ExportJobs
+    ExportJobs.init_app(app, config_class)
+    
+    # In-process product search index
+    from app.services.product_search import ProductSearch
+    ProductSearch.init_app(app)
+    
     # Security Extensions
 
     from flask_talisman import Talisman
@@ -47,6 +77,7 @@ def create_app(config_class=None):
     from app.routes.admin import admin_bp
     from app.routes.api import api_bp
     from app.routes.expenses import expenses_bp
+    from app.routes.exports import exports_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
@@ -56,6 +87,7 @@ def create_app(config_class=None):
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(api_bp)
     app.register_blueprint(expenses_bp, url_prefix='/expenses')
+    app.register_blueprint(exports_bp, url_prefix='/exports')
 
     
 
@@ -78,10 +110,9 @@ def create_app(config_class=None):
     
     @login_manager.user_loader
     def load_user(user_id):
-        # Import inside function to avoid circular imports if needed,
-        # though models is already imported in create_app
-        from app.models import User
-        return User.query.get(int(user_id))
+        # Cached read-only identity with its role names; no query on most requests
+        from app.services.identity_cache import IdentityCache
+        return IdentityCache.get(int(user_id))
     
 
     
@@ -106,6 +106,7 @@ def init_db():
 def seed_data():
     """Seed the database with sample data."""
     from app.models import Category, Product, SystemSetting
+    from app.services.catalog_service import CatalogService
     
     click.echo('Creating sample categories...')
     categories = [
@@ -155,9 +156,80 @@ def seed_data():
             product = Product(**prod_data)
             db.session.add(product)
     
+    CatalogService.invalidate()
     db.session.commit()
     
     click.echo('Setting system defaults...')
     SystemSetting.set('tax_rate', '0.08', 'Default tax rate (8%)')
     
-    click.echo('Sample data seeded successfully!')
\ No newline at end of file
+    click.echo('Sample data seeded successfully!')
+
+@cli.command()
+@with_appcontext
+def prune_idempotency_keys():
+    """Delete checkout idempotency keys older than the retention window."""
+    from flask import current_app
+    from app.services.idempotency_service import IdempotencyService
+    
+    days = current_app.config.get('IDEMPOTENCY_KEY_RETENTION_DAYS', 7)
+    removed = IdempotencyService.prune(older_than_days=days)
+    click.echo(f'Removed {removed} idempotency keys older than {days} days.')
+
+
+@cli.command()
+@with_appcontext
+def replay_audit_fallback():
+    """Insert audit events saved to the fallback file while the DB was down."""
+    from app.services.audit_service import AuditService
+    
+    inserted = AuditService.replay_fallback()
+    click.echo(f'Replayed {inserted} audit events.')
+
+
+@cli.command()
+@click.option('--start', 'start', required=True, help='First business date (YYYY-MM-DD).')
+@click.option('--end', 'end', default=None, help='Last business date (YYYY-MM-DD), defaults to today.')
+@with_appcontext
+def rebuild_rollups(start, end):
+    """Recompute the daily sales rollups for a date range from raw sales."""
+    from datetime import datetime
+    from app.services.rollup_service import RollupService
+    
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.utcnow().date()
+    except ValueError:
+        raise click.BadParameter('Dates must be in YYYY-MM-DD format.')
+    
+    sales_rows, product_rows = RollupService.rebuild(start_date, end_date)
+    click.echo(f'Rebuilt {sales_rows} sales rollup rows and {product_rows} product rollup rows '
+               f'for {start_date} to {end_date}.')
+
+
+@cli.command()
+@with_appcontext
+def purge_exports():
+    """Delete export files older than EXPORT_RETENTION_HOURS."""
+    from app.services.export_jobs import ExportJobs
+    
+    removed = ExportJobs.purge()
+    click.echo(f'Removed {removed} expired exports.')
+
+
+@cli.command()
+@click.option('--months', type=int, default=None, help='Months to keep live (default AUDIT_RETENTION_MONTHS).')
+@with_appcontext
+def archive_audit_logs(months):
+    """Move audit log months past the retention window into archive files."""
+    from datetime import datetime
+    from app.services.audit_archive import AuditArchive, months_back
+    
+    added = AuditArchive.ensure_partitions()
+    if added:
+        click.echo(f'Added audit partitions: {", ".join(added)}')
+    
+    cutoff = months_back(datetime.utcnow().date(), months) if months is not None else None
+    archived = AuditArchive.archive(cutoff=cutoff)
+    for month in archived:
+        click.echo(f"{month['month']}: archived {month['rows']} rows to {month['file']}")
+    click.echo(f'Archived {len(archived)} months of audit logs.')
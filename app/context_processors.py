@@ -1,12 +1,13 @@
-from app.models import SystemSetting
+from app.services.settings_cache import SettingsCache
 
 def inject_global_context():
     """Inject global settings into all templates"""
     settings = {}
     try:
-        settings['currency_symbol'] = SystemSetting.get('currency_symbol', '$')
-        settings['company_name'] = SystemSetting.get('company_name', 'Electronics Store POS')
-        settings['company_logo'] = SystemSetting.get('company_logo', '')
+        cached = SettingsCache.all()
+        settings['currency_symbol'] = cached.get('currency_symbol', '$')
+        settings['company_name'] = cached.get('company_name', 'Electronics Store POS')
+        settings['company_logo'] = cached.get('company_logo', '')
     except Exception:
         settings['currency_symbol'] = '$'
         settings['company_name'] = 'Electronics Store POS'
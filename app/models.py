@@ -66,7 +66,9 @@ class Product(db.Model):
     sale_items = db.relationship('SaleItem', backref='product', lazy=True)
     
     __table_args__ = (
-        db.Index('ix_product_is_active_category', 'is_active', 'category_id'),
+        db.Index('ix_product_is_active_category', 'is_active', 'category_id', 'name', 'id'),
+        db.Index('ix_product_is_active_name', 'is_active', 'name', 'id'),
+        db.Index('ix_product_updated_at_id', 'updated_at', 'id'),
     )
     
     def __repr__(self):
@@ -107,7 +109,7 @@ class Sale(db.Model):
     change_given = db.Column(db.Numeric(12, 2), nullable=False)
     sale_status = db.Column(db.Enum(SaleStatus), default=SaleStatus.COMPLETED)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     sale_items = db.relationship('SaleItem', backref='sale', lazy=True, cascade="all, delete-orphan")
@@ -138,6 +140,68 @@ class SaleItem(db.Model):
         self.total_price = self.quantity_sold * self.unit_price_at_time
         return self
 
+class CheckoutIdempotencyKey(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False)
+    grand_total = db.Column(db.Numeric(12, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<CheckoutIdempotencyKey {self.key}>'
+
+class DailySalesRollup(db.Model):
+    """Sale totals per business (UTC) date, payment method and cashier."""
+    business_date = db.Column(db.Date, primary_key=True)
+    payment_method = db.Column(db.Enum(PaymentMethod), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    tax = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    discount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+    cogs = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailySalesRollup {self.business_date} {self.payment_method} {self.user_id}>'
+
+class DailyProductRollup(db.Model):
+    """Sale line totals per business (UTC) date and product."""
+    business_date = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    cogs = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyProductRollup {self.business_date} {self.product_id}>'
+
+class CacheVersion(db.Model):
+    """Version counter shared by all workers; bumping it invalidates their local caches."""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @staticmethod
+    def get(name):
+        version = db.session.query(CacheVersion.version).filter_by(name=name).scalar()
+        return version or 0
+
+    @staticmethod
+    def bump(name):
+        """Increment the version inside the caller's transaction (committed by the caller)."""
+        updated = CacheVersion.query.filter_by(name=name).update(
+            {'version': CacheVersion.version + 1, 'updated_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        if not updated:
+            db.session.add(CacheVersion(name=name, version=1))
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
 class SystemSetting(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(100), unique=True, nullable=False)
@@ -147,11 +211,12 @@ class SystemSetting(db.Model):
     
     @staticmethod
     def get(key, default=None):
-        setting = SystemSetting.query.filter_by(key=key).first()
-        return setting.value if setting else default
+        from app.services.settings_cache import SettingsCache
+        return SettingsCache.get(key, default)
 
     @staticmethod
     def set(key, value, description=None):
+        from app.services.settings_cache import SettingsCache
         setting = SystemSetting.query.filter_by(key=key).first()
         if setting:
             setting.value = value
@@ -160,7 +225,9 @@ class SystemSetting(db.Model):
         else:
             setting = SystemSetting(key=key, value=value, description=description)
             db.session.add(setting)
+        SettingsCache.invalidate()
         db.session.commit()
+        SettingsCache.clear()
         return setting
 
 class AuditLog(db.Model):
@@ -172,7 +239,7 @@ class AuditLog(db.Model):
     details = db.Column(db.JSON) # Structrued details of changes
     ip_address = db.Column(db.String(50))
     user_agent = db.Column(db.String(255))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True) # Monthly partition key on MySQL
 
     # Relationships
     user = db.relationship('User', backref='audit_logs', lazy=True)
@@ -215,5 +282,9 @@ class Expense(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_expense_date_id', 'date', 'id'),
+    )
+
     def __repr__(self):
         return f'<Expense {self.id}: {self.title}>'
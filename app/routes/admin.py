@@ -1,12 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import User, Role, SystemSetting, Sale, Product, Category, SaleItem
+from app.models import User, Role, SystemSetting, Category
 from app import db
 from app.forms import UserForm, SystemSettingsForm
 from app.decorators import role_required
 from app.services.audit_service import AuditService
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
+from app.services.audit_archive import AuditArchive
+from app.services.stock_events import StockEvents
+from app.services.pdf_service import PdfService
+from app.services.receipt_cache import ReceiptCache
+from app.services.export_jobs import ExportJobs
+from app.services.settings_cache import SettingsCache
+from app.services.dashboard_service import DashboardService
+from app.services.sale_summary import SaleSummary
+from app.services.keyset import Keyset
+from app.services.product_search import ProductSearch
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.identity_cache import IdentityCache
+from app.services.db_pool import DbPool
+from datetime import datetime
 from werkzeug.utils import secure_filename
 import json
 import os
@@ -27,50 +39,30 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 @role_required('Admin')
 def dashboard():
     
-    # Get dashboard statistics
-    total_sales = Sale.query.count()
-    total_revenue = db.session.query(func.sum(Sale.grand_total)).scalar() or 0
-    total_products = Product.query.count()
-    low_stock_products = Product.query.filter(Product.quantity_in_stock <= Product.low_stock_threshold).count()
-    
-    # Get today's sales
-    today = datetime.utcnow().date()
-    today_sales = Sale.query.filter(func.date(Sale.created_at) == today).count()
-    today_revenue = db.session.query(func.sum(Sale.grand_total)).filter(
-        func.date(Sale.created_at) == today
-    ).scalar() or 0
+    # Get dashboard statistics (shared per-worker snapshot)
+    stats = DashboardService.snapshot()
     
     # Get recent sales
-    recent_sales = Sale.query.order_by(desc(Sale.created_at)).limit(10).all()
-    
-    # Get top selling products
-    top_products = db.session.query(
-        Product.name,
-        func.sum(SaleItem.quantity_sold).label('total_sold')
-    ).join(SaleItem).group_by(Product.id).order_by(desc('total_sold')).limit(5).all()
-    
-    # Get sales data for charts
-    sales_data = get_sales_data()
+    recent_sales = SaleSummary.recent(10)
     
     return render_template('admin/dashboard.html',
-                         total_sales=total_sales,
-                         total_revenue=total_revenue,
-                         total_products=total_products,
-                         low_stock_products=low_stock_products,
-                         today_sales=today_sales,
-                         today_revenue=today_revenue,
+                         total_sales=stats['total_sales'],
+                         total_revenue=stats['total_revenue'],
+                         total_products=stats['total_products'],
+                         low_stock_products=stats['low_stock_products'],
+                         today_sales=stats['today_sales'],
+                         today_revenue=stats['today_revenue'],
                          recent_sales=recent_sales,
-                         top_products=top_products,
-                         sales_data=json.dumps(sales_data))
+                         top_products=stats['top_products'],
+                         sales_data=json.dumps(stats['sales_data']))
 
 @admin_bp.route('/users')
 @login_required
 @role_required('Admin')
 def users():
-    
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(
-        page=page, per_page=10, error_out=False
+    users = Keyset.paginate(
+        User.query, (User.id,), cursor=request.args.get('cursor'), per_page=10,
+        count_key=('users',)
     )
     return render_template('admin/users.html', users=users)
 
@@ -130,6 +122,7 @@ def edit_user(user_id):
         if form.password.data:
             user.set_password(form.password.data)
         
+        IdentityCache.invalidate(user.id)
         db.session.commit()
         
         # Log user update
@@ -202,7 +195,9 @@ def settings():
                     updated_keys.append(setting.key)
         
         if updated_keys:
+            SettingsCache.invalidate()
             db.session.commit()
+            SettingsCache.clear()
             
             # Log settings update
             AuditService.log_action(
@@ -222,41 +217,42 @@ def settings():
 @login_required
 @role_required('Admin')
 def logs():
-    page = request.args.get('page', 1, type=int)
-    audit_logs = AuditService.get_logs(page=page, per_page=50)
-    return render_template('admin/logs.html', logs=audit_logs)
+    """
+    Audit log viewer. month (YYYY-MM) selects one month; months moved out of
+    the live table by archive-audit-logs are read from their archive files.
+    """
+    cursor = request.args.get('cursor')
+    month = request.args.get('month', '').strip()
+    action = request.args.get('action', '').strip().upper() or None
+    archived_months = AuditArchive.months()
 
-def get_sales_data():
-    """Get sales data for the last 30 days - optimized with single query"""
-    from sqlalchemy import case
-    
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=30)
-    
-    # Single optimized query using GROUP BY
-    daily_sales = db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.sum(Sale.grand_total).label('total')
-    ).filter(
-        Sale.created_at >= start_date,
-        Sale.created_at <= end_date
-    ).group_by(
-        func.date(Sale.created_at)
-    ).all()
-    
-    # Convert to dictionary for fast lookup
-    sales_dict = {str(row.date): float(row.total) for row in daily_sales}
-    
-    # Build complete date range with zeros for missing days
-    sales_data = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        sales_data.append({
-            'date': date_str,
-            'sales': sales_dict.get(date_str, 0.0)
-        })
-        current_date += timedelta(days=1)
-    
-    return sales_data
+    if month in archived_months:
+        audit_logs = AuditArchive.search(month, action=action, cursor=cursor, per_page=50)
+    else:
+        try:
+            month_date = datetime.strptime(month, '%Y-%m').date() if month else None
+        except ValueError:
+            flash("Invalid month format", "danger")
+            month, month_date = '', None
+        audit_logs = AuditService.get_logs(cursor=cursor, per_page=50, month=month_date, action=action)
+
+    return render_template('admin/logs.html', logs=audit_logs, month=month, action=action or '',
+                           archived_months=archived_months, archived=month in archived_months)
+
+@admin_bp.route('/metrics/data')
+@login_required
+@role_required('Admin')
+def metrics_data():
+    """Per-worker runtime counters (JSON)."""
+    return jsonify({
+        'pid': os.getpid(),
+        'audit': AuditService.stats(),
+        'stock_events': StockEvents.stats(),
+        'pdf': PdfService.stats(),
+        'receipt_cache': ReceiptCache.stats(),
+        'exports': ExportJobs.stats(),
+        'product_search': ProductSearch.stats(),
+        'catalog_snapshot': CatalogSnapshot.stats(),
+        'identity_cache': IdentityCache.stats(),
+        'db_pool': DbPool.stats()
+    })
@@ -1,7 +1,9 @@
 from flask import Blueprint, jsonify, request
 from app.models import Product, Category
 from app import db
-from sqlalchemy import or_
+from app.services.product_search import ProductSearch
+from app.services.catalog_service import CatalogService
+from app.services.catalog_snapshot import CatalogSnapshot
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -12,28 +14,28 @@ def get_categories():
 
 @api_bp.route('/products')
 def get_products():
-    category_id = request.args.get('category_id')
+    category_id = request.args.get('category_id', type=int)
     search = request.args.get('search')
     
-    query = Product.query.filter(Product.is_active == True)
+    ids = ProductSearch.search(search, limit=50, category_id=category_id, active_only=True) if search else None
     
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-        
-    if search:
-        query = query.filter(or_(
-            Product.name.contains(search),
-            Product.sku.contains(search),
-            Product.barcode.contains(search)
-        ))
-        
-    products = query.order_by(Product.name).limit(50).all()
+    # Read from the shared snapshot when there is one, else from the table
+    products = CatalogSnapshot.products(ids=ids, category_id=category_id, limit=50)
+    if products is None:
+        if search:
+            rows = ProductSearch.load(ids)
+        else:
+            query = Product.query.filter(Product.is_active == True)
+            if category_id:
+                query = query.filter(Product.category_id == category_id)
+            rows = query.order_by(Product.name).limit(50).all()
+        products = [CatalogService.serialize_product(p) for p in rows]
     
     return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'price': float(p.selling_price),
-        'sku': p.sku,
-        'quantity': p.quantity_in_stock,
-        'category_id': p.category_id
+        'id': p['id'],
+        'name': p['name'],
+        'price': p['price'],
+        'sku': p['sku'],
+        'quantity': p['stock'],
+        'category_id': p['category_id']
     } for p in products])
@@ -4,6 +4,7 @@ from urllib.parse import urlparse, urljoin
 from app.models import User
 from app import db
 from app.forms import LoginForm, RegistrationForm, ProfileForm
+from app.services.identity_cache import IdentityCache
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -104,23 +105,26 @@ def register():
 @auth_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
-    form = ProfileForm(obj=current_user)
+    # current_user is a read-only cached identity; edit the row itself
+    user = db.session.get(User, current_user.id)
+    form = ProfileForm(obj=user)
     
     if form.validate_on_submit():
-        current_user.username = form.username.data
-        current_user.email = form.email.data
+        user.username = form.username.data
+        user.email = form.email.data
         
         if form.password.data:
-            current_user.set_password(form.password.data)
+            user.set_password(form.password.data)
             
+        IdentityCache.invalidate(user.id)
         db.session.commit()
         
         # Log profile update
         AuditService.log_action(
             action='UPDATE_PROFILE',
             target_type='User',
-            target_id=current_user.id,
-            details={'username': current_user.username}
+            target_id=user.id,
+            details={'username': user.username}
         )
         
         flash('Profile updated successfully', 'success')
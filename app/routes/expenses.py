@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app import db
 from app.models import Expense, ExpenseCategory, ExpenseType, ExpenseStatus
+from app.services.keyset import Keyset
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
 
@@ -15,7 +16,7 @@ def index():
         return redirect(url_for('main.dashboard'))
 
     # Pagination
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 10
 
     # Filters
@@ -73,8 +74,11 @@ def index():
     chart_colors = [stat[1] for stat in category_stats]
     chart_values = [float(stat[2]) for stat in category_stats]
 
-    # Pagination execution
-    pagination = query.order_by(Expense.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    # Pagination execution (newest date first, keyset on (date, id))
+    pagination = Keyset.paginate(
+        query, (Expense.date, Expense.id), cursor=cursor, per_page=per_page,
+        count_key=('expenses', month_filter or start_date.isoformat(), category_id, status_filter)
+    )
     expenses = pagination.items
     categories = ExpenseCategory.query.order_by(ExpenseCategory.name).all()
 
@@ -145,7 +149,7 @@ def export_pdf():
     # Render PDF
     from app.utils import format_currency
     from app.models import SystemSetting
-    import pdfkit
+    from app.services.pdf_service import PdfService
     from io import BytesIO
     from flask import send_file, current_app
 
@@ -166,11 +170,9 @@ def export_pdf():
     )
 
     try:
-        path_wkhtmltopdf = current_app.config.get('WKHTMLTOPDF_PATH')
-        config = pdfkit.configuration(wkhtmltopdf=path_wkhtmltopdf)
-        pdf_bytes = pdfkit.from_string(html, False, configuration=config)
+        pdf_bytes = PdfService.render(html)
     except Exception as e:
-        current_app.logger.exception("pdfkit failed to generate PDF")
+        current_app.logger.exception("PDF renderer failed to generate PDF")
         flash(f"PDF generation failed: {str(e)}", "danger")
         return redirect(url_for('expenses.index'))
 
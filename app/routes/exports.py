@@ -0,0 +1,52 @@
+from flask import Blueprint, jsonify, url_for, send_file
+from flask_login import login_required
+from app.decorators import role_required
+from app.services.export_jobs import ExportJobs
+import os
+
+exports_bp = Blueprint('exports', __name__, url_prefix='/exports')
+
+
+def export_job_json(job):
+    """Public view of an export job for the polling client."""
+    data = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'error': job['error'],
+        'status_url': url_for('exports.status', job_id=job['id'])
+    }
+    if job['status'] == 'done':
+        data['download_url'] = url_for('exports.download', job_id=job['id'])
+        data['filename'] = job['filename']
+    return data
+
+
+@exports_bp.route('/<job_id>')
+@login_required
+@role_required('Admin', 'Manager')
+def status(job_id):
+    job = ExportJobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Export not found'}), 404
+    return jsonify(export_job_json(job))
+
+
+@exports_bp.route('/<job_id>/download')
+@login_required
+@role_required('Admin', 'Manager')
+def download(job_id):
+    job = ExportJobs.get(job_id)
+    if job is None or job['status'] != 'done':
+        return jsonify({'error': 'Export not ready'}), 404
+
+    path = ExportJobs.artifact_path(job)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Export has expired'}), 410
+
+    return send_file(
+        path,
+        mimetype=job['mimetype'],
+        as_attachment=True,
+        download_name=job['filename']
+    )
@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, request, jsonify, current_app
-from app.models import db, Product, Category, Sale, SaleItem, SystemSetting
-from app.models import PaymentMethod, SaleStatus  # Import Enums
+from flask import Blueprint, render_template, request, jsonify, current_app, Response
+from app.models import db, Sale, SaleItem
+from app.services.checkout_service import CheckoutService, CheckoutError
+from app.services.idempotency_service import IdempotencyService
+from app.services.catalog_service import CatalogService, CatalogCursorError
+from app.services.catalog_payload import CatalogPayload
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.stock_events import StockEvents
+from app.services.product_search import ProductSearch
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
+import json
+import queue
+import time
 
 pos_bp = Blueprint('pos', __name__, url_prefix='/pos')
 
@@ -11,40 +19,149 @@ pos_bp = Blueprint('pos', __name__, url_prefix='/pos')
 @login_required
 def index():
     """Renders the main POS interface."""
-    return render_template('pos/index.html')
+    return render_template('pos/index.html', paged_catalog=CatalogService.paged())
 
 @pos_bp.route('/api/data')
 @login_required
 def get_pos_data():
-    """Loads categories and products for the UI."""
+    """
+    Loads categories and products for the UI, as one columnar document.
+
+    products holds parallel arrays (id, name, price, stock, category_id,
+    sku, barcode). The body is prebuilt per catalog version and sent
+    brotli- or gzip-compressed when the client accepts it; the strong ETag
+    answers unchanged catalogs with 304.
+    """
     try:
-        categories = Category.query.all()
-        products = Product.query.filter_by(is_active=True).all()
-        
-        tax_rate = float(SystemSetting.get('tax_rate', 0.08))
-
-        product_data = []
-        for p in products:
-            product_data.append({
-                'id': p.id,
-                'name': p.name,
-                'price': float(p.selling_price),
-                'stock': p.quantity_in_stock,
-                'category_id': p.category_id,
-                'sku': p.sku,
-                'barcode': p.barcode
-            })
+        payload = CatalogPayload.current()
+        encoding = CatalogPayload.negotiate(request.accept_encodings, payload)
+        etag = f"{payload['etag']}-{encoding}"
 
-        category_data = [{'id': c.id, 'name': c.name} for c in categories]
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(payload['bodies'][encoding], mimetype='application/json')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+    except Exception as e:
+        current_app.logger.error(f"POS Data Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
 
-        return jsonify({
+@pos_bp.route('/api/catalog')
+@login_required
+def get_catalog():
+    """
+    Delta catalog sync for terminals that keep a local copy of the products.
+
+    Query args:
+      - cursor: token from the previous response (omit for a full sync)
+      - limit: page size (default 1000, max 5000)
+
+    The ETag identifies the catalog state, so a terminal that finished its
+    last sync at that tag gets a 304 while nothing has changed and its
+    cursor has reached the newest row, once that row is past the settle window.
+    """
+    try:
+        cursor = request.args.get('cursor') or None
+        limit = min(max(request.args.get('limit', 1000, type=int), 1), 5000)
+
+        version = CatalogService.version()
+        categories = CatalogService.categories()
+        tax_rate = CatalogService.tax_rate()
+
+        etag = CatalogService.etag(version, categories, tax_rate)
+        settle_seconds = current_app.config.get('CATALOG_CURSOR_SETTLE_SECONDS', 2)
+        if cursor and request.if_none_match.contains_weak(etag) and \
+                CatalogService.cursor_settled(cursor, version, settle_seconds):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        changes = CatalogService.changes_since(cursor, limit=limit, settle_seconds=settle_seconds)
+
+        response = jsonify({
             'success': True,
+            'full': cursor is None,
             'tax_rate': tax_rate,
-            'categories': category_data,
-            'products': product_data
+            'categories': categories,
+            'active_count': version['active_count'],
+            **changes
         })
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    except CatalogCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
-        current_app.logger.error(f"POS Data Error: {e}")
+        current_app.logger.error(f"POS Catalog Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@pos_bp.route('/api/catalog/browse')
+@login_required
+def browse_catalog():
+    """
+    Catalog page for terminals that browse instead of syncing every product.
+
+    Query args:
+      - category_id: only this category
+      - search: name/SKU/barcode filter
+      - cursor: next_cursor from the previous page (omit for the first page)
+      - limit: page size (default POS_CATALOG_PAGE_SIZE, max 200)
+
+    The first page also carries the categories, the tax rate and, when not
+    searching, the category's best sellers to show ahead of the A-Z list.
+    """
+    try:
+        category_id = request.args.get('category_id', type=int)
+        search = (request.args.get('search') or '').strip()
+        cursor = request.args.get('cursor') or None
+        limit = min(max(request.args.get('limit', current_app.config.get('POS_CATALOG_PAGE_SIZE', 60), type=int), 1), 200)
+
+        page = CatalogService.browse(category_id=category_id, search=search, cursor=cursor, per_page=limit)
+        data = {
+            'success': True,
+            'products': [CatalogService.serialize_product(p) for p in page.items],
+            'next_cursor': page.next_cursor,
+            'has_more': page.has_next
+        }
+        if cursor is None:
+            data['categories'] = CatalogService.categories()
+            data['tax_rate'] = CatalogService.tax_rate()
+            data['popular'] = [] if search else CatalogService.popular(category_id)
+
+        response = jsonify(data)
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    except Exception as e:
+        current_app.logger.error(f"POS Browse Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@pos_bp.route('/api/barcode/<path:code>')
+@login_required
+def barcode_lookup(code):
+    """
+    Scanner lookup: the active product with this barcode (or SKU) and its
+    current stock, without the terminal holding the whole catalog.
+    """
+    try:
+        product = CatalogSnapshot.find_by_code(code)
+        if product is None:
+            # Not in the shared snapshot yet (or snapshots are disabled)
+            found = ProductSearch.find_by_code(code)
+            if found is not None and found.is_active:
+                product = CatalogService.serialize_product(found)
+        if product is None:
+            return jsonify({'success': False, 'message': f'No product found with barcode: {code}'}), 404
+
+        response = jsonify({'success': True, 'product': product})
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Barcode Lookup Error: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @pos_bp.route('/api/checkout', methods=['POST'])
@@ -65,93 +182,144 @@ def checkout():
         if not payment_method_str:
             return jsonify({'success': False, 'message': 'Payment method required.'}), 400
 
-        # --- MAP FRONTEND STRINGS TO DB ENUMS ---
-        if payment_method_str == 'Cash':
-            db_payment_method = PaymentMethod.CASH
-        else:
-            db_payment_method = PaymentMethod.MOBILE_MONEY
-
-        subtotal = 0.0
-        product_map = {}
-
-        # 1. Validate Stock & Calculate Subtotal
-        for item in items:
-            product = Product.query.get(item['product_id'])
-            if not product:
-                return jsonify({'success': False, 'message': f'Product {item["product_id"]} not found.'}), 404
-            
-            if product.quantity_in_stock < item['quantity']:
-                return jsonify({'success': False, 'message': f'Insufficient stock for {product.name}.'}), 400
-            
-            subtotal += (item['price'] * item['quantity'])
-            product_map[product.id] = product
-
-        # 2. Calculate Totals
-        tax_rate = float(SystemSetting.get('tax_rate', 0.08))
-        
-        taxable_amount = max(0, subtotal - discount)
-        tax_amount = taxable_amount * tax_rate
-        grand_total = taxable_amount + tax_amount
-
-        # 3. Create Sale
-        new_sale = Sale(
-            user_id=current_user.id,
-            subtotal=subtotal,
-            tax_rate=tax_rate,
-            tax_amount=tax_amount,
-            discount=discount,
-            grand_total=grand_total,
-            payment_method=db_payment_method,
-            amount_paid=grand_total,
-            change_given=0.0,
-            sale_status=SaleStatus.COMPLETED,
-            created_at=datetime.utcnow()
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key and not IdempotencyService.is_valid_key(idempotency_key):
+            return jsonify({'success': False, 'message': 'Invalid idempotency key.'}), 400
+
+        # Lock, validate, decrement and insert in one short transaction
+        result = CheckoutService.checkout(
+            current_user.id, items, discount, payment_method_str,
+            idempotency_key=idempotency_key
         )
-        
-        db.session.add(new_sale)
-        db.session.flush() 
-
-        # 4. Create Sale Items
-        for item in items:
-            product = product_map[item['product_id']]
-            
-            sale_item = SaleItem(
-                sale_id=new_sale.id,
-                product_id=product.id,
-                quantity_sold=item['quantity'],
-                unit_price_at_time=item['price'],
-                total_price=item['quantity'] * item['price']
-            )
-            db.session.add(sale_item)
-            product.quantity_in_stock -= item['quantity']
 
-        # 5. Commit
-        db.session.commit()
+        if result.replayed:
+            return jsonify({
+                'success': True,
+                'sale_id': result.sale_id,
+                'total': result.grand_total,
+                'replayed': True
+            })
+
+        StockEvents.publish_stock(result.stock_levels)
 
-        # 6. Log transaction
+        # Log transaction
         from app.services.audit_service import AuditService
         AuditService.log_action(
             action='POS_CHECKOUT',
             target_type='Sale',
-            target_id=new_sale.id,
+            target_id=result.sale_id,
             details={
-                'grand_total': float(grand_total),
-                'items_count': len(items),
+                'grand_total': float(result.grand_total),
+                'items_count': result.items_count,
                 'payment_method': payment_method_str
             }
         )
 
         return jsonify({
             'success': True,
-            'sale_id': new_sale.id,
-            'total': grand_total
+            'sale_id': result.sale_id,
+            'total': result.grand_total
         })
 
+    except CheckoutError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Checkout Exception: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@pos_bp.route('/api/checkout/batch', methods=['POST'])
+@login_required
+def checkout_batch():
+    """
+    Uploads sales a terminal queued while offline.
+
+    Body: {"sales": [{items, discount, payment_method, idempotency_key,
+    sold_at, client_ref}, ...]}. Every sale gets its own outcome; sales
+    rejected for stock or validation do not stop the rest of the batch.
+    """
+    try:
+        data = request.get_json(silent=True)
+        sales = data.get('sales') if isinstance(data, dict) else None
+        if not isinstance(sales, list) or not sales:
+            return jsonify({'success': False, 'message': 'No sales to upload.'}), 400
+
+        max_sales = current_app.config.get('POS_BATCH_MAX_SALES', 200)
+        if len(sales) > max_sales:
+            return jsonify({'success': False, 'message': f'At most {max_sales} sales per batch.'}), 413
+
+        outcomes, stock_levels = CheckoutService.checkout_batch(current_user.id, sales)
+
+        StockEvents.publish_stock(stock_levels)
+
+        from app.services.audit_service import AuditService
+        for outcome, sale in zip(outcomes, sales):
+            if outcome['status'] != 'created':
+                continue
+            AuditService.log_action(
+                action='POS_CHECKOUT',
+                target_type='Sale',
+                target_id=outcome['sale_id'],
+                details={
+                    'grand_total': outcome['total'],
+                    'items_count': outcome['items_count'],
+                    'payment_method': sale.get('payment_method'),
+                    'batch': True
+                }
+            )
+
+        return jsonify({
+            'success': True,
+            'created': sum(1 for o in outcomes if o['status'] == 'created'),
+            'replayed': sum(1 for o in outcomes if o['status'] == 'replayed'),
+            'rejected': sum(1 for o in outcomes if o['status'] == 'rejected'),
+            'results': outcomes
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Batch Checkout Exception: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@pos_bp.route('/api/stock/stream')
+@login_required
+def stock_stream():
+    """
+    Server-Sent Events stream of stock changes.
+
+    Emits 'stock' events carrying [{product_id, stock}, ...] after each
+    committed checkout or product edit, and 'resync' when the terminal may
+    have missed events and should run a catalog sync. The stream closes
+    after STOCK_STREAM_MAX_SECONDS and the browser reconnects by itself.
+    """
+    broker = StockEvents.broker()
+    heartbeat = current_app.config.get('STOCK_STREAM_HEARTBEAT_SECONDS', 15)
+    max_seconds = current_app.config.get('STOCK_STREAM_MAX_SECONDS', 300)
+    subscription = broker.subscribe()
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            deadline = time.monotonic() + max_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = subscription.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                data = json.dumps(message['data'], separators=(',', ':'))
+                yield f"event: {message['event']}\ndata: {data}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @pos_bp.route('/receipt/<int:sale_id>')
 @login_required
 def receipt(sale_id):
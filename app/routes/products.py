@@ -4,16 +4,16 @@ from app.models import Product, Category, SaleItem
 from app import db
 from app.forms import ProductForm
 from app.services.audit_service import AuditService
-from sqlalchemy import or_, desc
+from app.services.stock_events import StockEvents
+from app.services.keyset import Keyset
+from app.services.product_search import ProductSearch
+from app.services.catalog_service import CatalogService
+from app.services.export_jobs import ExportJobs
+from app.routes.exports import export_job_json
+from sqlalchemy.orm import joinedload
 import json
-import pdfkit
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from datetime import datetime
-from flask import send_file, Response, current_app
+from flask import Response
 from app.models import SystemSetting
-from app.utils import format_currency
 
 
 products_bp = Blueprint('products', __name__, url_prefix='/products')
@@ -21,24 +21,21 @@ products_bp = Blueprint('products', __name__, url_prefix='/products')
 @products_bp.route('/')
 @login_required
 def index():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     category_id = request.args.get('category_id', type=int)
     
     query = Product.query
     
     if search:
-        query = query.filter(or_(
-            Product.name.contains(search),
-            Product.sku.contains(search),
-            Product.barcode.contains(search)
-        ))
+        query = query.filter(ProductSearch.criterion(search))
     
     if category_id:
         query = query.filter(Product.category_id == category_id)
     
-    products = query.order_by(desc(Product.created_at)).paginate(
-        page=page, per_page=10, error_out=False
+    products = Keyset.paginate(
+        query, (Product.created_at, Product.id), cursor=cursor, per_page=10,
+        count_key=('products', search, category_id)
     )
     
     categories = Category.query.all()
@@ -72,7 +69,9 @@ def add():
             description=form.description.data
         )
         db.session.add(product)
+        CatalogService.invalidate()
         db.session.commit()
+        ProductSearch.upsert(product)
         
         # Log product creation
         AuditService.log_action(
@@ -81,6 +80,7 @@ def add():
             target_id=product.id,
             details={'name': product.name, 'sku': product.sku}
         )
+        StockEvents.publish_stock({product.id: product.quantity_in_stock})
         
         flash('Product added successfully', 'success')
         return redirect(url_for('products.index'))
@@ -114,7 +114,9 @@ def edit(product_id):
         product.low_stock_threshold = form.low_stock_threshold.data
         product.description = form.description.data
         
+        CatalogService.invalidate()
         db.session.commit()
+        ProductSearch.upsert(product)
         
         # Log product update
         AuditService.log_action(
@@ -123,6 +125,7 @@ def edit(product_id):
             target_id=product.id,
             details={'name': product.name, 'sku': product.sku}
         )
+        StockEvents.publish_stock({product.id: product.quantity_in_stock})
         
         flash('Product updated successfully', 'success')
         return redirect(url_for('products.index'))
@@ -144,7 +147,9 @@ def delete(product_id):
         return redirect(url_for('products.index'))
     
     db.session.delete(product)
+    CatalogService.invalidate()
     db.session.commit()
+    ProductSearch.remove(product_id)
     
     # Log product deletion
     AuditService.log_action(
@@ -164,13 +169,7 @@ def search():
     if not query:
         return jsonify([])
     
-    products = Product.query.filter(
-        or_(
-            Product.name.contains(query),
-            Product.sku.contains(query),
-            Product.barcode.contains(query)
-        )
-    ).limit(10).all()
+    products = ProductSearch.load(ProductSearch.search(query, limit=10), joinedload(Product.category))
     
     results = []
     for product in products:
@@ -295,59 +294,9 @@ def export_pdf():
         flash('Access denied', 'danger')
         return redirect(url_for('products.index'))
 
-    # Get filters
-    search = request.args.get('search', '')
-    category_id = request.args.get('category_id', type=int)
-
-    # Build query
-    query = Product.query
-    if search:
-        query = query.filter(or_(
-            Product.name.contains(search),
-            Product.sku.contains(search),
-            Product.barcode.contains(search)
-        ))
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-
-    products = query.order_by(desc(Product.created_at)).all()
-
-    # Context for template
-    # Context for template
-    category_name = None
-    if category_id:
-        cat = Category.query.get(category_id)
-        if cat:
-            category_name = cat.name
-
-    html = render_template(
-        'products/pdf_export.html',
-        products=products,
-        generated_at=datetime.now().strftime('%Y-%m-%d %H:%M'),
-        category_filter=category_name,
-        search_query=search,
-        format_currency=format_currency
-    )
-
-    try:
-        path_wkhtmltopdf = current_app.config.get('WKHTMLTOPDF_PATH')
-        config = pdfkit.configuration(wkhtmltopdf=path_wkhtmltopdf)
-        pdf_bytes = pdfkit.from_string(html, False, configuration=config)
-    except Exception as e:
-        current_app.logger.exception("pdfkit failed to generate inventory PDF")
-        flash(f"PDF generation failed: {str(e)}", "danger")
-        return redirect(url_for('products.index'))
-
-    pdf_io = BytesIO(pdf_bytes)
-    pdf_io.seek(0)
-    filename = f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-
-    return send_file(
-        pdf_io,
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=filename
-    )
+    # Built by an export worker; the client polls the status URL
+    job = ExportJobs.enqueue('inventory_pdf', request.args)
+    return jsonify(export_job_json(job)), 202
 
 
 @products_bp.route('/export/excel')
@@ -357,80 +306,6 @@ def export_excel():
         flash('Access denied', 'danger')
         return redirect(url_for('products.index'))
 
-    # Get filters
-    search = request.args.get('search', '')
-    category_id = request.args.get('category_id', type=int)
-
-    # Build query
-    query = Product.query
-    if search:
-        query = query.filter(or_(
-            Product.name.contains(search),
-            Product.sku.contains(search),
-            Product.barcode.contains(search)
-        ))
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-
-    products = query.order_by(desc(Product.created_at)).all()
-
-    # Create Excel Workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Inventory"
-
-    # Headers
-    headers = ['ID', 'Name', 'Category', 'SKU', 'Barcode', 'Cost Price', 'Selling Price', 'Stock', 'Low Stock Threshold', 'Status']
-    ws.append(headers)
-
-    # Style Header
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    # Add Data
-    for p in products:
-        status = "Low Stock" if p.is_low_stock else "In Stock"
-        row = [
-            p.id,
-            p.name,
-            p.category.name if p.category else '-',
-            p.sku,
-            p.barcode,
-            p.cost_price,
-            p.selling_price,
-            p.quantity_in_stock,
-            p.low_stock_threshold,
-            status
-        ]
-        ws.append(row)
-
-    # Auto-width
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    # Save to BytesIO
-    excel_io = BytesIO()
-    wb.save(excel_io)
-    excel_io.seek(0)
-    
-    filename = f"inventory_export_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-
-    return send_file(
-        excel_io,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename
-    )
+    # Built by an export worker; the client polls the status URL
+    job = ExportJobs.enqueue('inventory_excel', request.args)
+    return jsonify(export_job_json(job)), 202
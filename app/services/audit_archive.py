@@ -0,0 +1,355 @@
+"""
+Monthly partitions and archival of the audit log.
+
+On MySQL audit_log is RANGE-partitioned by month (migration d41a7c9e05b3).
+Months older than AUDIT_RETENTION_MONTHS are written, newest first, to a
+gzipped JSONL file per month in AUDIT_ARCHIVE_DIR and then removed from the
+live table: by dropping the month's partition when it holds nothing else,
+otherwise (or on databases without partitions) by deleting the archived
+rows in batches. index.json in the archive directory lists each archived
+month with its files, row counts and actions, so the logs viewer can page
+and filter an archived month without touching the database.
+"""
+from app import db
+from app.models import AuditLog, User
+from app.services.keyset import Keyset, KeysetPage
+from flask import current_app
+from sqlalchemy import func, or_, select, text
+from datetime import date, datetime
+from itertools import islice
+from types import SimpleNamespace
+import gzip
+import heapq
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(day):
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def months_back(day, count):
+    """First day of the month count months before day's month."""
+    index = day.year * 12 + day.month - 1 - count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class ArchivedAuditLog:
+    """An archived audit record with the attributes the logs template reads."""
+
+    def __init__(self, record):
+        self.id = record['id']
+        self.user_id = record['user_id']
+        self.user = SimpleNamespace(username=record['username']) if record.get('username') else None
+        self.action = record['action']
+        self.target_type = record['target_type']
+        self.target_id = record['target_id']
+        self.details = record['details']
+        self.ip_address = record['ip_address']
+        self.user_agent = record['user_agent']
+        self.created_at = datetime.fromisoformat(record['created_at'])
+
+
+class AuditArchiveIndex:
+    """index.json of an archive directory: {'months': {'YYYY-MM': entry}}."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, 'index.json')
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {'months': {}}
+
+    def save(self, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(data, fh, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+class AuditArchive:
+    COLUMNS = (
+        AuditLog.id,
+        AuditLog.user_id,
+        User.username,
+        AuditLog.action,
+        AuditLog.target_type,
+        AuditLog.target_id,
+        AuditLog.details,
+        AuditLog.ip_address,
+        AuditLog.user_agent,
+        AuditLog.created_at,
+    )
+
+    @staticmethod
+    def _config(key, default):
+        return current_app.config.get(key, default)
+
+    @staticmethod
+    def directory():
+        directory = AuditArchive._config('AUDIT_ARCHIVE_DIR', None) or \
+            os.path.join(current_app.instance_path, 'audit_archive')
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    @staticmethod
+    def index():
+        return AuditArchiveIndex(AuditArchive.directory())
+
+    @staticmethod
+    def cutoff(today=None):
+        """Start of the oldest month that stays in the live table."""
+        today = today or datetime.utcnow().date()
+        return months_back(today, AuditArchive._config('AUDIT_RETENTION_MONTHS', 12))
+
+    # --------------------
+    # Partitions (MySQL)
+    # --------------------
+    @staticmethod
+    def partitions():
+        """
+        (name, upper bound) of each audit_log partition in bound order; the
+        bound is None for the MAXVALUE partition. Empty when the table is
+        not partitioned.
+        """
+        if db.session.get_bind().dialect.name != 'mysql':
+            return []
+        rows = db.session.execute(text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log' "
+            "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+        )).all()
+        # RANGE (TO_DAYS(created_at)): MySQL day numbers are 365 ahead of Python ordinals
+        return [(name, None if bound == 'MAXVALUE' else date.fromordinal(int(bound) - 365))
+                for name, bound in rows]
+
+    @staticmethod
+    def ensure_partitions(months_ahead=None):
+        """Split the MAXVALUE partition so the coming months have their own. Returns the new names."""
+        partitions = AuditArchive.partitions()
+        bounds = [bound for _, bound in partitions if bound is not None]
+        if not bounds:
+            return []
+
+        if months_ahead is None:
+            months_ahead = AuditArchive._config('AUDIT_PARTITION_MONTHS_AHEAD', 3)
+        target = month_start(datetime.utcnow())
+        for _ in range(months_ahead + 1):
+            target = next_month(target)
+
+        added = []
+        month = max(bounds)
+        while month < target:
+            added.append((f"p{month:%Y%m}", next_month(month)))
+            month = next_month(month)
+        if not added:
+            return []
+
+        definitions = [f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{bound:%Y-%m-%d}'))" for name, bound in added]
+        if any(bound is None for _, bound in partitions):
+            maxvalue = next(name for name, bound in partitions if bound is None)
+            definitions.append(f"PARTITION {maxvalue} VALUES LESS THAN MAXVALUE")
+            db.session.execute(text(
+                f"ALTER TABLE audit_log REORGANIZE PARTITION {maxvalue} INTO ({', '.join(definitions)})"
+            ))
+        else:
+            db.session.execute(text(f"ALTER TABLE audit_log ADD PARTITION ({', '.join(definitions)})"))
+        return [name for name, _ in added]
+
+    # --------------------
+    # Archival
+    # --------------------
+    @staticmethod
+    def archive(cutoff=None, batch_size=None):
+        """
+        Move every month before cutoff out of the live table, oldest first.
+
+        Args:
+            cutoff (date, optional): First month to keep; defaults to the retention policy.
+            batch_size (int, optional): Rows per read and per DELETE.
+
+        Returns:
+            list: One {'month', 'rows', 'file'} dict per archived month.
+        """
+        cutoff = cutoff or AuditArchive.cutoff()
+        batch_size = batch_size or AuditArchive._config('AUDIT_ARCHIVE_BATCH_SIZE', 5000)
+        cutoff_at = datetime.combine(cutoff, datetime.min.time())
+        index = AuditArchive.index()
+
+        archived = []
+        while True:
+            oldest = db.session.query(func.min(AuditLog.created_at)).scalar()
+            db.session.commit()
+            if oldest is None or oldest >= cutoff_at:
+                return archived
+            archived.append(AuditArchive._archive_month(index, month_start(oldest), batch_size))
+
+    @staticmethod
+    def _archive_month(index, month, batch_size):
+        """Archive every live row before the end of month (nothing older is left)."""
+        key = f"{month:%Y-%m}"
+        end = datetime.combine(next_month(month), datetime.min.time())
+        data = index.load()
+        entry = data['months'].setdefault(key, {'files': [], 'rows': 0, 'actions': []})
+
+        # Rows already in an archive file are left over from an interrupted run
+        for archived_file in entry['files']:
+            AuditArchive._delete_rows(end, archived_file['min_id'], archived_file['max_id'], batch_size)
+
+        number = len(entry['files']) + 1
+        name = f"audit_{key}.jsonl.gz" if number == 1 else f"audit_{key}.{number}.jsonl.gz"
+        written = AuditArchive._write_file(index.directory, name, end, batch_size)
+        if written is None:
+            return {'month': key, 'rows': 0, 'file': None}
+
+        actions = written.pop('actions')
+        entry['files'].append(dict(written, name=name))
+        entry['rows'] += written['rows']
+        entry['actions'] = sorted(set(entry['actions']) | actions)
+        index.save(data)
+
+        AuditArchive._remove_archived(end, written['min_id'], written['max_id'], batch_size)
+        logger.info("Archived %d audit rows of %s to %s", written['rows'], key, name)
+        return {'month': key, 'rows': written['rows'], 'file': name}
+
+    @staticmethod
+    def _write_file(directory, name, end, batch_size):
+        """Write the live rows before end, newest first. Returns the file's stats or None if there were none."""
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        stats = {'rows': 0, 'min_id': None, 'max_id': None, 'actions': set()}
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as fh:
+                last = None
+                while True:
+                    stmt = select(*AuditArchive.COLUMNS).select_from(AuditLog).outerjoin(
+                        User, User.id == AuditLog.user_id
+                    ).where(AuditLog.created_at < end)
+                    if last is not None:
+                        stmt = stmt.where(Keyset.seek((AuditLog.created_at, AuditLog.id), last))
+                    rows = db.session.execute(
+                        stmt.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(batch_size)
+                    ).all()
+                    for row in rows:
+                        record = row._asdict()
+                        record['created_at'] = row.created_at.isoformat()
+                        fh.write((json.dumps(record, default=str) + '\n').encode('utf-8'))
+                        stats['rows'] += 1
+                        stats['min_id'] = row.id if stats['min_id'] is None else min(stats['min_id'], row.id)
+                        stats['max_id'] = row.id if stats['max_id'] is None else max(stats['max_id'], row.id)
+                        stats['actions'].add(row.action)
+                    if len(rows) < batch_size:
+                        break
+                    last = (rows[-1].created_at, rows[-1].id)
+            db.session.commit()
+            if not stats['rows']:
+                os.remove(tmp_path)
+                return None
+            os.replace(tmp_path, os.path.join(directory, name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return stats
+
+    @staticmethod
+    def _remove_archived(end, min_id, max_id, batch_size):
+        """Drop the oldest partition if it holds exactly the archived rows, else delete them in batches."""
+        partitions = AuditArchive.partitions()
+        if len(partitions) > 1 and partitions[0][1] is not None and \
+                datetime.combine(partitions[0][1], datetime.min.time()) == end:
+            # Rows that arrived after the file was written stay for the next run
+            late = db.session.query(func.count(AuditLog.id)).filter(
+                AuditLog.created_at < end,
+                or_(AuditLog.id < min_id, AuditLog.id > max_id)
+            ).scalar()
+            if not late:
+                db.session.execute(text(f"ALTER TABLE audit_log DROP PARTITION {partitions[0][0]}"))
+                return
+        AuditArchive._delete_rows(end, min_id, max_id, batch_size)
+
+    @staticmethod
+    def _delete_rows(end, min_id, max_id, batch_size):
+        deleted = 0
+        while True:
+            ids = [row.id for row in db.session.query(AuditLog.id).filter(
+                AuditLog.created_at < end,
+                AuditLog.id.between(min_id, max_id)
+            ).limit(batch_size)]
+            if not ids:
+                return deleted
+            db.session.query(AuditLog).filter(
+                AuditLog.created_at < end,
+                AuditLog.id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+
+    # --------------------
+    # Viewer
+    # --------------------
+    @staticmethod
+    def months():
+        """Archived months ('YYYY-MM'), newest first."""
+        return sorted(AuditArchive.index().load()['months'], reverse=True)
+
+    @staticmethod
+    def _records(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                yield json.loads(line)
+
+    @staticmethod
+    def search(month, action=None, cursor=None, per_page=50):
+        """
+        One page of an archived month, newest first.
+
+        Months whose index entry does not list the action are answered
+        without opening a file. The cursor is the number of matching
+        records before the page.
+
+        Returns:
+            KeysetPage: items are ArchivedAuditLog records.
+        """
+        index = AuditArchive.index()
+        entry = index.load()['months'].get(month)
+        if entry is None or (action and action not in entry['actions']):
+            return KeysetPage([], per_page, total=0)
+
+        try:
+            offset = max(int(cursor or 0), 0)
+        except ValueError:
+            offset = 0
+
+        streams = [AuditArchive._records(os.path.join(index.directory, f['name'])) for f in entry['files']]
+        merged = heapq.merge(*streams, key=lambda r: (r['created_at'], r['id']), reverse=True)
+        matches = (r for r in merged if not action or r['action'] == action)
+        page = list(islice(matches, offset, offset + per_page + 1))
+
+        return KeysetPage(
+            [ArchivedAuditLog(record) for record in page[:per_page]],
+            per_page,
+            next_cursor=str(offset + per_page) if len(page) > per_page else None,
+            prev_cursor=str(max(offset - per_page, 0)) if offset else None,
+            total=None if action else entry['rows']
+        )
@@ -1,15 +1,203 @@
 from app import db
 from app.models import AuditLog
-from flask import request
+from app.services.keyset import Keyset
+from flask import request, current_app, has_request_context
 from flask_login import current_user
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from datetime import date, datetime
+import atexit
+import glob
 import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Wakes the flusher thread when the writer is closing
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Buffered, batched writer for audit events.
+
+    Events are pushed onto a bounded in-memory queue and a background thread
+    writes them as multi-row AuditLog INSERTs once batch_size events are
+    waiting or flush_interval seconds have passed. When the database is
+    unavailable the batch is appended to a local JSONL file instead, and
+    events that do not fit in the queue are counted as dropped.
+    """
+
+    def __init__(self, app, max_queue=10000, batch_size=200, flush_interval=2.0,
+                 fallback_path=None, use_thread=True):
+        self.app = app
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fallback_path = fallback_path
+        self.use_thread = use_thread
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.fallback = 0
+        self.batches = 0
+
+    def _ensure_started(self):
+        """Start the flusher thread, or restart it in a freshly forked worker."""
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Events buffered by the parent belong to the parent
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, event):
+        """Queue an event for writing. Returns False if it had to be dropped."""
+        if not self.use_thread:
+            self._write_batch([event])
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def _collect(self):
+        """Wait for up to batch_size events or flush_interval seconds."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if event is _STOP:
+                break
+            batch.append(event)
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                return batch
+            if event is not _STOP:
+                batch.append(event)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write_batch(batch)
+
+    def flush(self):
+        """Write every queued event now, in the calling thread."""
+        batch = self._drain()
+        while batch:
+            self._write_batch(batch[:self.batch_size])
+            batch = batch[self.batch_size:]
+
+    def close(self):
+        """Stop the flusher thread and write whatever is still queued."""
+        self._stop.set()
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def _write_batch(self, batch):
+        with self._write_lock:
+            try:
+                with self.app.app_context():
+                    db.session.execute(insert(AuditLog), batch)
+                    db.session.commit()
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                logger.warning("Audit batch of %d events failed, using fallback file: %s", len(batch), e)
+                self._write_fallback(batch)
+
+    def _write_fallback(self, batch):
+        try:
+            with open(self.fallback_path, 'a', encoding='utf-8') as fh:
+                for event in batch:
+                    fh.write(json.dumps(event, default=str) + '\n')
+            self.fallback += len(batch)
+        except OSError as e:
+            logger.error("Audit fallback file unavailable, dropping %d events: %s", len(batch), e)
+            self.dropped += len(batch)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'capacity': self.max_queue,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'fallback': self.fallback,
+            'dropped': self.dropped
+        }
+
 
 class AuditService:
+    @staticmethod
+    def init_app(app):
+        """Create the per-process audit writer and flush it on shutdown."""
+        fallback_path = app.config.get('AUDIT_FALLBACK_PATH') or \
+            os.path.join(app.instance_path, 'audit_fallback.jsonl')
+        os.makedirs(os.path.dirname(fallback_path), exist_ok=True)
+
+        writer = AuditWriter(
+            app,
+            max_queue=app.config.get('AUDIT_QUEUE_SIZE', 10000),
+            batch_size=app.config.get('AUDIT_BATCH_SIZE', 200),
+            flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL', 2.0),
+            fallback_path=fallback_path,
+            use_thread=app.config.get('AUDIT_ASYNC', True)
+        )
+        app.extensions['audit_writer'] = writer
+        atexit.register(writer.close)
+        return writer
+
     @staticmethod
     def log_action(action, target_type=None, target_id=None, details=None):
         """
         Log an audit event.
-        
+
+        The event is captured immediately but written asynchronously, so the
+        caller's request never waits on the audit commit.
+
         Args:
             action (str): The action performed (e.g., 'LOGIN', 'CREATE', 'UPDATE').
             target_type (str, optional): The type of entity affected (e.g., 'User', 'Product').
@@ -17,29 +205,117 @@ class AuditService:
             details (dict, optional): Additional structured details about the event.
         """
         try:
-            user_id = current_user.id if current_user.is_authenticated else None
-            ip_address = request.remote_addr if request else None
-            user_agent = request.user_agent.string if request and request.user_agent else None
-            
-            log_entry = AuditLog(
-                user_id=user_id,
-                action=action,
-                target_type=target_type,
-                target_id=str(target_id) if target_id else None,
-                details=details,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-            
-            db.session.add(log_entry)
-            db.session.commit()
+            user_id = current_user.id if has_request_context() and current_user.is_authenticated else None
+            ip_address = request.remote_addr if has_request_context() else None
+            user_agent = request.user_agent.string if has_request_context() and request.user_agent else None
+
+            event = {
+                'user_id': user_id,
+                'action': action,
+                'target_type': target_type,
+                'target_id': str(target_id) if target_id else None,
+                'details': details,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'created_at': datetime.utcnow()
+            }
+
+            current_app.extensions['audit_writer'].enqueue(event)
         except Exception as e:
-            # Fallback logger if DB logging fails
-            # In a real production system, this should go to a file logger or Sentry
-            print(f"Failed to create audit log: {e}")
+            logger.error(f"Failed to create audit log: {e}")
+
+    @staticmethod
+    def flush():
+        """Write all buffered events for this process now."""
+        current_app.extensions['audit_writer'].flush()
+
+    @staticmethod
+    def stats():
+        """Counters for the buffered writer of this process."""
+        return current_app.extensions['audit_writer'].stats()
+
+    @staticmethod
+    def replay_fallback(path=None):
+        """
+        Re-insert events from the fallback file into AuditLog.
+
+        The file is renamed before reading so new fallback events written
+        meanwhile are kept for the next replay. Lines that do not parse (e.g.
+        torn by a crash mid-append) are moved to <path>.bad and the rest are
+        inserted. If the replay fails, or a previous one was interrupted, the
+        renamed file's events are appended back to the fallback file. Returns
+        the number of events inserted.
+        """
+        writer = current_app.extensions['audit_writer']
+        path = path or writer.fallback_path
+        for leftover in sorted(glob.glob(f'{glob.escape(path)}.*.replaying')):
+            AuditService._restore_fallback(leftover, path)
+        if not os.path.exists(path):
+            return 0
+
+        replay_path = f"{path}.{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.replaying"
+        os.replace(path, replay_path)
+
+        batch = []
+        bad = []
+        inserted = 0
+        try:
+            with open(replay_path, encoding='utf-8') as fh:
+                for line in fh:
+                    if not line.strip():
+                        continue
+                    try:
+                        event = json.loads(line)
+                        if event.get('created_at'):
+                            event['created_at'] = datetime.fromisoformat(event['created_at'])
+                    except (ValueError, TypeError, AttributeError):
+                        bad.append(line if line.endswith('\n') else line + '\n')
+                        continue
+                    batch.append(event)
+                    if len(batch) >= writer.batch_size:
+                        db.session.execute(insert(AuditLog), batch)
+                        inserted += len(batch)
+                        batch = []
+            if batch:
+                db.session.execute(insert(AuditLog), batch)
+                inserted += len(batch)
+            db.session.commit()
+        except Exception:
             db.session.rollback()
+            AuditService._restore_fallback(replay_path, path)
+            raise
+        if bad:
+            logger.warning("Moved %d unreadable audit fallback lines to %s.bad", len(bad), path)
+            with open(f'{path}.bad', 'a', encoding='utf-8') as fh:
+                fh.writelines(bad)
+        os.remove(replay_path)
+        return inserted
 
     @staticmethod
-    def get_logs(page=1, per_page=20):
-        """Retrieve paginated audit logs"""
-        return AuditLog.query.order_by(AuditLog.created_at.desc()).paginate(page=page, per_page=per_page)
+    def _restore_fallback(replay_path, path):
+        """Append a renamed fallback file back to the fallback file and remove it."""
+        with open(replay_path, 'rb') as src, open(path, 'ab') as dst:
+            shutil.copyfileobj(src, dst)
+            # A torn last line must not absorb the next event appended
+            if src.tell():
+                src.seek(-1, os.SEEK_END)
+                if src.read(1) != b'\n':
+                    dst.write(b'\n')
+        os.remove(replay_path)
+
+    @staticmethod
+    def get_logs(cursor=None, per_page=20, month=None, action=None):
+        """
+        Retrieve a keyset page of live audit logs, newest first (no total: the table is large)
+
+        Args:
+            month (date, optional): Only this month (first day), which MySQL reads from one partition.
+            action (str, optional): Only this action.
+        """
+        query = AuditLog.query.options(joinedload(AuditLog.user))
+        if month:
+            end = date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+            query = query.filter(AuditLog.created_at >= month, AuditLog.created_at < end)
+        if action:
+            query = query.filter(AuditLog.action == action)
+        return Keyset.paginate(query, (AuditLog.created_at, AuditLog.id), cursor=cursor, per_page=per_page)
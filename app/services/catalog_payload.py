@@ -0,0 +1,101 @@
+from app import db
+from app.models import Product
+from app.services.catalog_service import CatalogService
+import gzip
+import json
+import threading
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+
+class CatalogPayload:
+    """
+    Full POS catalog as one precompressed, columnar JSON document.
+
+    Products are sent as parallel arrays (products.id[i], products.name[i],
+    ...) instead of one object per product, so key names are not repeated.
+    The document is built once per catalog version and kept in memory in
+    identity, gzip and (with the brotli package) brotli encodings; requests
+    only run the version query and copy the bytes out.
+    """
+
+    # Arrays of the products object, in order
+    FIELDS = ('id', 'name', 'price', 'stock', 'category_id', 'sku', 'barcode')
+
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 9
+
+    _current = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def encode(tax_rate, categories, rows):
+        """Serialize the catalog; rows carry CatalogService.PRODUCT_COLUMNS."""
+        ids, names, prices, stock, category_ids, skus, barcodes = [], [], [], [], [], [], []
+        for r in rows:
+            ids.append(r.id)
+            names.append(r.name)
+            prices.append(float(r.selling_price))
+            stock.append(r.quantity_in_stock)
+            category_ids.append(r.category_id)
+            skus.append(r.sku)
+            barcodes.append(r.barcode)
+
+        document = {
+            'success': True,
+            'tax_rate': tax_rate,
+            'categories': categories,
+            'products': dict(zip(CatalogPayload.FIELDS, (
+                ids, names, prices, stock, category_ids, skus, barcodes
+            )))
+        }
+        return json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode()
+
+    @staticmethod
+    def build(etag, tax_rate, categories):
+        """Read the active products and return {'etag', 'bodies': {encoding: bytes}}."""
+        rows = db.session.query(*CatalogService.PRODUCT_COLUMNS).filter(
+            Product.is_active == True
+        ).order_by(Product.id).all()
+        raw = CatalogPayload.encode(tax_rate, categories, rows)
+
+        bodies = {'identity': raw, 'gzip': gzip.compress(raw, CatalogPayload.GZIP_LEVEL)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(raw, quality=CatalogPayload.BROTLI_QUALITY)
+        return {'etag': etag, 'bodies': bodies}
+
+    @staticmethod
+    def current():
+        """
+        Payload for the current catalog version, rebuilt by the first request
+        after the version changes.
+        """
+        version = CatalogService.version()
+        categories = CatalogService.categories()
+        tax_rate = CatalogService.tax_rate()
+        etag = CatalogService.etag(version, categories, tax_rate)
+
+        payload = CatalogPayload._current
+        if payload is not None and payload['etag'] == etag:
+            return payload
+        with CatalogPayload._lock:
+            payload = CatalogPayload._current
+            if payload is None or payload['etag'] != etag:
+                payload = CatalogPayload._current = CatalogPayload.build(etag, tax_rate, categories)
+        return payload
+
+    @staticmethod
+    def negotiate(accept_encodings, payload):
+        """Best encoding the client accepts among those built: br, then gzip, then identity."""
+        for encoding in ('br', 'gzip'):
+            if encoding in payload['bodies'] and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+    @staticmethod
+    def clear():
+        with CatalogPayload._lock:
+            CatalogPayload._current = None
@@ -0,0 +1,299 @@
+from app import db
+from app.models import Product, Category, SystemSetting, DailyProductRollup, CacheVersion
+from app.services.keyset import Keyset
+from app.services.product_search import ProductSearch
+from flask import current_app
+from sqlalchemy import and_, case, func, or_
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import threading
+import time
+
+
+class CatalogCursorError(ValueError):
+    """Raised when a catalog cursor cannot be decoded."""
+
+
+class CatalogService:
+    """
+    Versioned product catalog for POS terminals.
+
+    Terminals keep a local copy of the catalog and ask only for rows whose
+    (updated_at, id) is past the cursor they last received. Deactivated
+    products are returned as removals so the local copy can drop them.
+    Product edits call invalidate() so the catalog version changes even
+    when updated_at does not.
+    """
+
+    VERSION_NAME = 'catalog'
+
+    # Columns shipped to the terminal; selected directly so no ORM objects are built
+    PRODUCT_COLUMNS = (
+        Product.id,
+        Product.name,
+        Product.selling_price,
+        Product.quantity_in_stock,
+        Product.category_id,
+        Product.sku,
+        Product.barcode,
+        Product.is_active,
+        Product.updated_at,
+    )
+
+    # Browse order: by name, id breaking ties
+    BROWSE_KEY = (Product.name, Product.id)
+
+    # Per-worker best-seller ids: {category_id: (expires_at, ids)}
+    _popular = {}
+    _popular_lock = threading.Lock()
+
+    @staticmethod
+    def _config(key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    @staticmethod
+    def serialize_product(p):
+        return {
+            'id': p.id,
+            'name': p.name,
+            'price': float(p.selling_price),
+            'stock': p.quantity_in_stock,
+            'category_id': p.category_id,
+            'sku': p.sku,
+            'barcode': p.barcode
+        }
+
+    @staticmethod
+    def encode_cursor(updated_at, product_id):
+        raw = f"{(updated_at or datetime.min).isoformat()}|{product_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token):
+        """Return (updated_at, product_id) for a cursor token, or None for a full sync."""
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            ts, product_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            return datetime.fromisoformat(ts), int(product_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise CatalogCursorError('Invalid catalog cursor.') from e
+
+    @staticmethod
+    def version():
+        """
+        Cheap signature of the product table.
+
+        The 'catalog' CacheVersion changes with every product write made
+        through invalidate(); the newest updated_at and the row counts catch
+        writes made elsewhere, and the stock total catches a sale within the
+        same (second-resolution) updated_at.
+        """
+        newest, total, active, stock = db.session.query(
+            func.max(Product.updated_at),
+            func.count(Product.id),
+            func.coalesce(func.sum(case((Product.is_active == True, 1), else_=0)), 0),
+            func.coalesce(func.sum(Product.quantity_in_stock), 0)
+        ).one()
+        return {
+            'catalog': CacheVersion.get(CatalogService.VERSION_NAME),
+            'updated_at': newest.isoformat() if newest else None,
+            'count': int(total),
+            'active_count': int(active),
+            'stock': int(stock)
+        }
+
+    @staticmethod
+    def listing_version():
+        """
+        Signature of the catalog without stock: the 'catalog' CacheVersion
+        and the row counts. Checkouts, which only change stock and
+        updated_at, leave it unchanged.
+        """
+        total, active = db.session.query(
+            func.count(Product.id),
+            func.coalesce(func.sum(case((Product.is_active == True, 1), else_=0)), 0)
+        ).one()
+        return {
+            'catalog': CacheVersion.get(CatalogService.VERSION_NAME),
+            'count': int(total),
+            'active_count': int(active)
+        }
+
+    @staticmethod
+    def cursor_settled(cursor_token, version, settle_seconds=2):
+        """
+        True when the cursor has reached the newest updated_at of version and
+        that timestamp is older than settle_seconds, so the terminal already
+        holds every row; a row written in the same second as a recent cursor
+        may still be missing.
+        """
+        cursor = CatalogService.decode_cursor(cursor_token)
+        if cursor is None or version['updated_at'] is None:
+            return cursor is not None
+        newest = datetime.fromisoformat(version['updated_at'])
+        return cursor[0] >= newest and newest <= datetime.utcnow() - timedelta(seconds=settle_seconds)
+
+    @staticmethod
+    def invalidate():
+        """Bump the catalog version in the current transaction; call before committing a product write."""
+        CacheVersion.bump(CatalogService.VERSION_NAME)
+
+    @staticmethod
+    def categories():
+        return [{'id': c.id, 'name': c.name} for c in Category.query.order_by(Category.id).all()]
+
+    @staticmethod
+    def etag(version, categories, tax_rate):
+        """
+        Tag for the catalog state, independent of the requesting cursor.
+
+        A terminal that finished syncing at this tag has nothing to fetch
+        while the tag is unchanged.
+        """
+        raw = repr((version, categories, tax_rate))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @staticmethod
+    def changes_since(cursor_token, limit=1000, settle_seconds=2):
+        """
+        Rows changed since the cursor, oldest first.
+
+        Args:
+            cursor_token (str): Cursor from a previous response, or None for a full sync.
+            limit (int): Maximum number of rows to return.
+            settle_seconds (int): On the last page the next cursor is never
+                newer than now - settle_seconds, so rows written in the same
+                (second-resolution) timestamp as the cursor are sent again
+                rather than skipped.
+
+        Returns:
+            dict: products (active rows), removed (ids of inactive rows),
+            cursor (token for the next call) and has_more.
+        """
+        cursor = CatalogService.decode_cursor(cursor_token)
+        query = db.session.query(*CatalogService.PRODUCT_COLUMNS)
+        if cursor:
+            since, last_id = cursor
+            query = query.filter(or_(
+                Product.updated_at > since,
+                and_(Product.updated_at == since, Product.id > last_id)
+            ))
+        else:
+            # A full sync only needs the rows that are currently sellable
+            query = query.filter(Product.is_active == True)
+
+        rows = query.order_by(Product.updated_at, Product.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        products = [CatalogService.serialize_product(r) for r in rows if r.is_active]
+        removed = [r.id for r in rows if not r.is_active]
+
+        if rows:
+            next_ts, next_id = rows[-1].updated_at, rows[-1].id
+        elif cursor:
+            next_ts, next_id = cursor
+        else:
+            next_ts, next_id = None, 0
+
+        if not has_more:
+            settled = datetime.utcnow() - timedelta(seconds=settle_seconds)
+            if next_ts is None or next_ts > settled:
+                next_ts, next_id = settled, 0
+
+        return {
+            'products': products,
+            'removed': removed,
+            'cursor': CatalogService.encode_cursor(next_ts, next_id),
+            'has_more': has_more
+        }
+
+    @staticmethod
+    def tax_rate():
+        return float(SystemSetting.get('tax_rate', 0.08))
+
+    # --------------------
+    # Browsing (large stores)
+    # --------------------
+    @staticmethod
+    def paged():
+        """Whether terminals should browse page by page instead of holding the whole catalog."""
+        mode = CatalogService._config('POS_CATALOG_MODE', 'auto')
+        if mode != 'auto':
+            return mode == 'paged'
+        limit = CatalogService._config('POS_FULL_CATALOG_MAX', 2000)
+        active = Keyset.capped_count(Product.query.filter(Product.is_active == True), limit + 1)
+        return active > limit
+
+    @staticmethod
+    def browse(category_id=None, search=None, cursor=None, per_page=60):
+        """
+        One page of active products in name order.
+
+        Args:
+            category_id (int, optional): Only this category.
+            search (str, optional): Name/SKU/barcode filter, through the search index.
+            cursor (str, optional): next_cursor of the previous page.
+            per_page (int): Products per page.
+
+        Returns:
+            KeysetPage: rows with the PRODUCT_COLUMNS.
+        """
+        query = db.session.query(*CatalogService.PRODUCT_COLUMNS).filter(Product.is_active == True)
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        if search:
+            query = query.filter(ProductSearch.criterion(search))
+        return Keyset.paginate(query, CatalogService.BROWSE_KEY, cursor=cursor, per_page=per_page, ascending=True)
+
+    @staticmethod
+    def popular_ids(category_id=None):
+        """
+        Ids of the best-selling active products over the last POS_POPULAR_DAYS,
+        most units first, from the daily product rollups. Cached per worker
+        for POS_POPULAR_TTL seconds.
+        """
+        now = time.monotonic()
+        cached = CatalogService._popular.get(category_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        since = datetime.utcnow().date() - timedelta(days=CatalogService._config('POS_POPULAR_DAYS', 30))
+        query = db.session.query(DailyProductRollup.product_id).join(
+            Product, DailyProductRollup.product_id == Product.id
+        ).filter(
+            DailyProductRollup.business_date >= since,
+            Product.is_active == True
+        )
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        rows = query.group_by(DailyProductRollup.product_id).order_by(
+            func.sum(DailyProductRollup.quantity).desc(), DailyProductRollup.product_id
+        ).limit(CatalogService._config('POS_POPULAR_LIMIT', 24)).all()
+        ids = [r.product_id for r in rows]
+
+        with CatalogService._popular_lock:
+            CatalogService._popular[category_id] = (now + CatalogService._config('POS_POPULAR_TTL', 300), ids)
+        return ids
+
+    @staticmethod
+    def popular(category_id=None):
+        """Best sellers (see popular_ids) with current price and stock, serialized."""
+        ids = CatalogService.popular_ids(category_id)
+        if not ids:
+            return []
+        rows = {r.id: r for r in db.session.query(*CatalogService.PRODUCT_COLUMNS).filter(
+            Product.id.in_(ids), Product.is_active == True
+        ).all()}
+        return [CatalogService.serialize_product(rows[i]) for i in ids if i in rows]
+
+    @staticmethod
+    def clear():
+        with CatalogService._popular_lock:
+            CatalogService._popular.clear()
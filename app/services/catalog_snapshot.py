@@ -0,0 +1,428 @@
+"""
+Product snapshot shared by every worker on the host.
+
+One worker writes the catalog to a flat, array-backed file per catalog
+version; every worker maps the current file read-only, so the product
+data is held once in the page cache however many workers there are.
+"""
+from app import db
+from app.models import Product
+from app.services.catalog_service import CatalogService
+from app.services.product_search import ProductSearch
+from flask import current_app
+from array import array
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class MappedCatalog:
+    """
+    One snapshot file, read in place.
+
+    The file is a header followed by typed column arrays, rows in name
+    order:
+
+      id, price (cents)       int64 per row
+      id_sorted, id_row       ids ascending and their rows, for lookups by id
+      stock, category         int32 per row (category -1 for none)
+      slots                   open-addressing hash table over barcode and SKU
+      text                    uint32 offsets of name, sku, barcode per row into blob
+      active                  uint8 per row
+      blob                    UTF-8 strings
+
+    Columns are memoryviews over the mapping; reading a product copies only
+    that product's fields.
+    """
+
+    MAGIC = b'POSCAT01'
+    # magic, rows, hash slots, blob bytes, catalog tag (sha1 hex)
+    HEADER = struct.Struct('=8sIIQ40s')
+    NAME, SKU, BARCODE = range(3)
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, self.rows, slots, blob_size, tag = MappedCatalog.HEADER.unpack_from(view)
+        if magic != MappedCatalog.MAGIC:
+            raise ValueError(f'Not a catalog snapshot: {path}')
+        self.tag = tag.decode('ascii')
+
+        sections, _ = MappedCatalog.layout(self.rows, slots, blob_size)
+        self._columns = {
+            name: view[offset:offset + struct.calcsize(code) * count].cast(code)
+            for name, (offset, code, count) in sections.items()
+        }
+
+    @staticmethod
+    def layout(rows, slots, blob_size):
+        """{section: (offset, typecode, count)} after the header, and the file size."""
+        sections = (
+            ('id', 'q', rows),
+            ('price', 'q', rows),
+            ('id_sorted', 'q', rows),
+            ('id_row', 'i', rows),
+            ('stock', 'i', rows),
+            ('category', 'i', rows),
+            ('slots', 'i', slots),
+            ('text', 'I', 3 * rows + 1),
+            ('active', 'B', rows),
+            ('blob', 'B', blob_size),
+        )
+        result = {}
+        offset = MappedCatalog.HEADER.size
+        for name, code, count in sections:
+            offset = (offset + 7) & ~7
+            result[name] = (offset, code, count)
+            offset += struct.calcsize(code) * count
+        return result, offset
+
+    @staticmethod
+    def key(code):
+        return ProductSearch.normalize(code).encode('utf-8')
+
+    @staticmethod
+    def write(path, tag, rows):
+        """
+        Write a snapshot of rows (CatalogService.PRODUCT_COLUMNS) to path.
+
+        The file is written beside path and renamed over it, so readers
+        only ever map complete files.
+        """
+        rows = sorted(rows, key=lambda r: ((r.name or '').casefold(), r.id))
+        count = len(rows)
+
+        blob = bytearray()
+        text = array('I', [0])
+        for r in rows:
+            for value in (r.name, r.sku, r.barcode):
+                blob += (value or '').encode('utf-8')
+                text.append(len(blob))
+
+        # Power of two with at most 50% load; barcodes go in first so they win over SKUs
+        slots = 8
+        while slots < 4 * count:
+            slots *= 2
+        table = array('i', bytes(4 * slots))
+        for field in (MappedCatalog.BARCODE, MappedCatalog.SKU):
+            for row, r in enumerate(rows):
+                key = MappedCatalog._field_key(r, field)
+                if not key:
+                    continue
+                slot = zlib.crc32(key) & (slots - 1)
+                while table[slot]:
+                    other_row, other_field = MappedCatalog._entry(table[slot])
+                    if MappedCatalog._field_key(rows[other_row], other_field) == key:
+                        break
+                    slot = (slot + 1) & (slots - 1)
+                else:
+                    table[slot] = row * 2 + (field == MappedCatalog.SKU) + 1
+
+        by_id = sorted(range(count), key=lambda row: rows[row].id)
+        columns = {
+            'id': array('q', [r.id for r in rows]),
+            'price': array('q', [int(round(r.selling_price * 100)) for r in rows]),
+            'id_sorted': array('q', [rows[row].id for row in by_id]),
+            'id_row': array('i', by_id),
+            'stock': array('i', [r.quantity_in_stock or 0 for r in rows]),
+            'category': array('i', [r.category_id if r.category_id is not None else -1 for r in rows]),
+            'slots': table,
+            'text': text,
+            'active': array('B', [1 if r.is_active else 0 for r in rows]),
+            'blob': blob,
+        }
+
+        sections, size = MappedCatalog.layout(count, slots, len(blob))
+        buffer = bytearray(size)
+        MappedCatalog.HEADER.pack_into(buffer, 0, MappedCatalog.MAGIC, count, slots, len(blob), tag.encode('ascii'))
+        for name, (offset, _, _) in sections.items():
+            data = bytes(columns[name]) if name == 'blob' else columns[name].tobytes()
+            buffer[offset:offset + len(data)] = data
+
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as fh:
+            fh.write(buffer)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _entry(value):
+        """(row, field) of a non-empty hash slot."""
+        row, is_sku = divmod(value - 1, 2)
+        return row, MappedCatalog.SKU if is_sku else MappedCatalog.BARCODE
+
+    @staticmethod
+    def _field_key(r, field):
+        return MappedCatalog.key(r.barcode if field == MappedCatalog.BARCODE else r.sku)
+
+    # --------------------
+    # Reads
+    # --------------------
+    def _text(self, row, field):
+        text = self._columns['text']
+        i = 3 * row + field
+        return str(self._columns['blob'][text[i]:text[i + 1]], 'utf-8')
+
+    def is_active(self, row):
+        return bool(self._columns['active'][row])
+
+    def record(self, row):
+        """Product at row, shaped like CatalogService.serialize_product."""
+        category_id = self._columns['category'][row]
+        return {
+            'id': self._columns['id'][row],
+            'name': self._text(row, MappedCatalog.NAME),
+            'price': self._columns['price'][row] / 100,
+            'stock': self._columns['stock'][row],
+            'category_id': category_id if category_id >= 0 else None,
+            'sku': self._text(row, MappedCatalog.SKU),
+            'barcode': self._text(row, MappedCatalog.BARCODE) or None
+        }
+
+    def find(self, code):
+        """Row of the product with this barcode (or, failing that, SKU), or None."""
+        key = MappedCatalog.key(code)
+        slots = self._columns['slots']
+        if not key or not len(slots):
+            return None
+        mask = len(slots) - 1
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            row, field = MappedCatalog._entry(slots[slot])
+            if MappedCatalog.key(self._text(row, field)) == key:
+                return row
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, product_id):
+        """Row of the product with this id, or None."""
+        id_sorted = self._columns['id_sorted']
+        i = bisect.bisect_left(id_sorted, product_id)
+        if i < len(id_sorted) and id_sorted[i] == product_id:
+            return self._columns['id_row'][i]
+        return None
+
+    def scan(self, category_id=None, active_only=True):
+        """Rows in name order."""
+        category = self._columns['category']
+        active = self._columns['active']
+        for row in range(self.rows):
+            if active_only and not active[row]:
+                continue
+            if category_id and category[row] != category_id:
+                continue
+            yield row
+
+
+class CatalogSnapshot:
+    """
+    Keeps each worker mapped to the current snapshot file.
+
+    Every CATALOG_SNAPSHOT_REFRESH_SECONDS a worker compares the catalog
+    listing version (which ignores stock, so checkouts do not trigger a
+    rebuild) with its mapping. When they differ, the first worker to take
+    the builder lock writes catalog-<tag>.bin and points CURRENT at it; the
+    others keep reading their old mapping until CURRENT names the new file,
+    then swap to it in one assignment. Readers therefore trail the table by
+    a few seconds; stock is always read from the table.
+    """
+
+    POINTER = 'CURRENT'
+
+    _mapped = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+    builds = 0
+    swaps = 0
+
+    @staticmethod
+    def _config(key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    @staticmethod
+    def directory():
+        directory = CatalogSnapshot._config('CATALOG_SNAPSHOT_DIR', None) or \
+            os.path.join(current_app.instance_path, 'catalog_snapshot')
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    @staticmethod
+    def tag():
+        """Tag of the current catalog listing version."""
+        return hashlib.sha1(repr(CatalogService.listing_version()).encode()).hexdigest()
+
+    @staticmethod
+    def current():
+        """The mapped snapshot, or None when disabled or not built yet."""
+        if not CatalogSnapshot._config('CATALOG_SNAPSHOT', True):
+            return None
+        interval = CatalogSnapshot._config('CATALOG_SNAPSHOT_REFRESH_SECONDS', 2)
+        mapped = CatalogSnapshot._mapped
+        if mapped is not None and time.monotonic() - CatalogSnapshot._checked_at < interval:
+            return mapped
+
+        with CatalogSnapshot._lock:
+            if CatalogSnapshot._mapped is not None and \
+                    time.monotonic() - CatalogSnapshot._checked_at < interval:
+                return CatalogSnapshot._mapped
+            try:
+                tag = CatalogSnapshot.tag()
+                if CatalogSnapshot._mapped is None or CatalogSnapshot._mapped.tag != tag:
+                    CatalogSnapshot._swap(CatalogSnapshot._load(tag))
+            except (OSError, ValueError) as e:
+                logger.warning("Catalog snapshot unavailable: %s", e)
+            CatalogSnapshot._checked_at = time.monotonic()
+            return CatalogSnapshot._mapped
+
+    @staticmethod
+    def _swap(path):
+        if path is None:
+            return
+        mapped = CatalogSnapshot._mapped
+        if mapped is None or mapped.path != path:
+            # Readers holding the old mapping keep using it until they drop it
+            CatalogSnapshot._mapped = MappedCatalog(path)
+            CatalogSnapshot.swaps += 1
+
+    @staticmethod
+    def _pointed(directory):
+        """Path named by CURRENT, or None."""
+        try:
+            with open(os.path.join(directory, CatalogSnapshot.POINTER), encoding='ascii') as fh:
+                name = fh.read().strip()
+        except FileNotFoundError:
+            return None
+        return os.path.join(directory, name) if name else None
+
+    @staticmethod
+    def _load(tag):
+        """Path of the snapshot to map for tag, building it if no other worker is."""
+        directory = CatalogSnapshot.directory()
+        path = os.path.join(directory, f'catalog-{tag}.bin')
+        if CatalogSnapshot._pointed(directory) == path:
+            return path
+
+        with open(os.path.join(directory, 'build.lock'), 'a') as lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker is building; keep the last published file meanwhile
+                    return CatalogSnapshot._pointed(directory)
+            try:
+                if CatalogSnapshot._pointed(directory) != path:
+                    CatalogSnapshot._build(directory, path, tag)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return path
+
+    @staticmethod
+    def _build(directory, path, tag):
+        rows = db.session.query(*CatalogService.PRODUCT_COLUMNS).all()
+        MappedCatalog.write(path, tag, rows)
+
+        previous = CatalogSnapshot._pointed(directory)
+        pointer = os.path.join(directory, CatalogSnapshot.POINTER)
+        with open(f'{pointer}.{os.getpid()}.tmp', 'w', encoding='ascii') as fh:
+            fh.write(os.path.basename(path))
+        os.replace(f'{pointer}.{os.getpid()}.tmp', pointer)
+        CatalogSnapshot.builds += 1
+
+        # Workers still on the previous file may not have swapped yet
+        keep = {os.path.basename(path), os.path.basename(previous or '')}
+        for name in os.listdir(directory):
+            if name.startswith('catalog-') and name.endswith('.bin') and name not in keep:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    # --------------------
+    # Reads
+    # --------------------
+    @staticmethod
+    def find_by_code(code):
+        """
+        Active product for a scanned barcode or SKU, with stock read live,
+        or None when the snapshot cannot answer (disabled, not built, code
+        unknown or reassigned since the snapshot was written).
+        """
+        snapshot = CatalogSnapshot.current()
+        row = snapshot.find(code) if snapshot is not None else None
+        if row is None or not snapshot.is_active(row):
+            return None
+
+        product = snapshot.record(row)
+        live = db.session.query(
+            Product.quantity_in_stock, Product.sku, Product.barcode, Product.is_active
+        ).filter(Product.id == product['id']).first()
+        key = MappedCatalog.key(code)
+        if live is None or not live.is_active or key not in (MappedCatalog.key(live.sku), MappedCatalog.key(live.barcode)):
+            return None
+        product['stock'] = live.quantity_in_stock
+        return product
+
+    @staticmethod
+    def products(ids=None, category_id=None, limit=None):
+        """
+        Active products as serialize_product dicts with live stock, or None
+        without a snapshot.
+
+        With ids, those products in the same order; otherwise the products
+        of category_id (or all) in name order.
+        """
+        snapshot = CatalogSnapshot.current()
+        if snapshot is None:
+            return None
+        if ids is not None:
+            rows = (snapshot.get(product_id) for product_id in ids)
+            rows = [row for row in rows if row is not None and snapshot.is_active(row)]
+        else:
+            rows = snapshot.scan(category_id=category_id)
+        products = []
+        for row in rows:
+            if limit and len(products) >= limit:
+                break
+            products.append(snapshot.record(row))
+
+        if products:
+            stock = dict(db.session.query(Product.id, Product.quantity_in_stock).filter(
+                Product.id.in_([p['id'] for p in products])
+            ).all())
+            for product in products:
+                product['stock'] = stock.get(product['id'], product['stock'])
+        return products
+
+    @staticmethod
+    def clear():
+        with CatalogSnapshot._lock:
+            CatalogSnapshot._mapped = None
+            CatalogSnapshot._checked_at = 0.0
+
+    @staticmethod
+    def stats():
+        mapped = CatalogSnapshot._mapped
+        return {
+            'mapped': os.path.basename(mapped.path) if mapped is not None else None,
+            'products': mapped.rows if mapped is not None else 0,
+            'builds': CatalogSnapshot.builds,
+            'swaps': CatalogSnapshot.swaps
+        }
@@ -0,0 +1,401 @@
+from app import db
+from app.models import Product, Sale, SaleItem, SystemSetting, PaymentMethod, SaleStatus
+from app.services.idempotency_service import IdempotencyService, IdempotentSale
+from app.services.rollup_service import RollupService
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+
+CheckoutResult = namedtuple(
+    'CheckoutResult',
+    ['sale_id', 'grand_total', 'items_count', 'stock_levels', 'replayed'],
+    defaults=(False,)
+)
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be turned into a sale."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class CheckoutService:
+    @staticmethod
+    def payment_method_from_string(payment_method_str):
+        """Map the payment method label sent by the POS terminal to the DB enum."""
+        if payment_method_str == 'Cash':
+            return PaymentMethod.CASH
+        return PaymentMethod.MOBILE_MONEY
+
+    @staticmethod
+    def normalize_items(items):
+        """
+        Validate cart lines and sum the requested quantity per product.
+
+        Returns:
+            tuple: (lines, quantities) where lines is the cleaned list of
+            {'product_id', 'quantity', 'price'} dicts in cart order and
+            quantities maps product_id -> total quantity requested.
+        """
+        lines = []
+        quantities = {}
+        for item in items:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item['quantity'])
+                price = float(item['price'])
+            except (KeyError, TypeError, ValueError):
+                raise CheckoutError('Invalid cart item.')
+            if quantity <= 0:
+                raise CheckoutError('Item quantity must be positive.')
+
+            lines.append({'product_id': product_id, 'quantity': quantity, 'price': price})
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        return lines, quantities
+
+    @staticmethod
+    def lock_products(product_ids):
+        """
+        Load every product in one SELECT ... FOR UPDATE.
+
+        Rows are locked in primary key order so two terminals checking out
+        overlapping carts always acquire locks in the same sequence and
+        cannot deadlock each other.
+        """
+        products = Product.query.filter(
+            Product.id.in_(sorted(product_ids))
+        ).order_by(Product.id).with_for_update().populate_existing().all()
+        return {p.id: p for p in products}
+
+    @staticmethod
+    def decrement_stock(quantities, now=None):
+        """
+        Decrement stock for all products with a single guarded UPDATE.
+
+        The WHERE clause only matches rows that still hold enough stock, so
+        the statement can never drive quantity_in_stock below zero. If fewer
+        rows match than were requested the whole checkout is rejected.
+        """
+        if not quantities:
+            return
+        now = now or datetime.utcnow()
+        product_table = Product.__table__
+        requested = case(quantities, value=product_table.c.id)
+
+        result = db.session.execute(
+            update(product_table)
+            .where(product_table.c.id.in_(sorted(quantities)))
+            .where(product_table.c.quantity_in_stock >= requested)
+            .values(
+                quantity_in_stock=product_table.c.quantity_in_stock - requested,
+                updated_at=now
+            )
+        )
+        if result.rowcount != len(quantities):
+            raise CheckoutError('Insufficient stock for one or more items.')
+
+    @staticmethod
+    def sale_item_rows(sale_id, lines):
+        return [
+            {
+                'sale_id': sale_id,
+                'product_id': line['product_id'],
+                'quantity_sold': line['quantity'],
+                'unit_price_at_time': line['price'],
+                'total_price': line['quantity'] * line['price']
+            }
+            for line in lines
+        ]
+
+    @staticmethod
+    def insert_sale_items(sale_id, lines):
+        """Insert all sale lines with one bulk INSERT."""
+        db.session.execute(insert(SaleItem), CheckoutService.sale_item_rows(sale_id, lines))
+
+    @staticmethod
+    def build_sale(user_id, lines, discount, payment_method_str, tax_rate, created_at):
+        """Compute totals for normalized cart lines and return an unsaved Sale."""
+        subtotal = sum(line['price'] * line['quantity'] for line in lines)
+        taxable_amount = max(0, subtotal - discount)
+        tax_amount = taxable_amount * tax_rate
+        grand_total = taxable_amount + tax_amount
+
+        return Sale(
+            user_id=user_id,
+            subtotal=subtotal,
+            tax_rate=tax_rate,
+            tax_amount=tax_amount,
+            discount=discount,
+            grand_total=grand_total,
+            payment_method=CheckoutService.payment_method_from_string(payment_method_str),
+            amount_paid=grand_total,
+            change_given=0.0,
+            sale_status=SaleStatus.COMPLETED,
+            created_at=created_at
+        )
+
+    @staticmethod
+    def replay(idempotency_key, user_id):
+        """
+        Return the original result for an idempotency key that was already used.
+
+        Nothing is read from or written to Product or SaleItem, so a retried
+        request can never decrement stock twice.
+        """
+        previous = IdempotencyService.lookup(idempotency_key)
+        if previous is None:
+            return None
+        if previous.user_id != user_id:
+            raise CheckoutError('Idempotency key already used.', 409)
+        return CheckoutResult(
+            sale_id=previous.sale_id,
+            grand_total=previous.grand_total,
+            items_count=0,
+            stock_levels={},
+            replayed=True
+        )
+
+    @staticmethod
+    def checkout(user_id, items, discount, payment_method_str, idempotency_key=None):
+        """
+        Turn a POS cart into a committed sale.
+
+        Args:
+            user_id (int): The cashier completing the sale.
+            items (list): Cart lines with product_id, quantity and price.
+            discount (float): Discount applied before tax.
+            payment_method_str (str): Payment method label from the terminal.
+            idempotency_key (str, optional): Client-generated key; a retry
+                with the same key returns the original sale.
+
+        Returns:
+            CheckoutResult: The new sale id, grand total, line count and the
+            remaining stock for every product on the cart. replayed is True
+            when the result comes from an earlier request with the same key.
+
+        Raises:
+            CheckoutError: If a product is missing or stock is insufficient.
+                The session is rolled back before the error propagates.
+        """
+        if idempotency_key:
+            previous = CheckoutService.replay(idempotency_key, user_id)
+            if previous:
+                return previous
+
+        try:
+            lines, quantities = CheckoutService.normalize_items(items)
+
+            # 1. Lock every cart product & validate stock
+            products = CheckoutService.lock_products(quantities.keys())
+            for product_id, quantity in quantities.items():
+                product = products.get(product_id)
+                if not product:
+                    raise CheckoutError(f'Product {product_id} not found.', 404)
+                if product.quantity_in_stock < quantity:
+                    raise CheckoutError(f'Insufficient stock for {product.name}.')
+
+            # 2. Calculate Totals & create Sale
+            tax_rate = float(SystemSetting.get('tax_rate', 0.08))
+            now = datetime.utcnow()
+            new_sale = CheckoutService.build_sale(
+                user_id, lines, discount, payment_method_str, tax_rate, now
+            )
+            grand_total = new_sale.grand_total
+            db.session.add(new_sale)
+            db.session.flush()
+            sale_id = new_sale.id
+
+            # 3. Decrement stock, create sale items & add to the daily rollups
+            CheckoutService.decrement_stock(quantities, now=now)
+            CheckoutService.insert_sale_items(sale_id, lines)
+            RollupService.record_sales(
+                [(new_sale, lines)],
+                {pid: p.cost_price for pid, p in products.items()}
+            )
+
+            stock_levels = {
+                product_id: products[product_id].quantity_in_stock - quantity
+                for product_id, quantity in quantities.items()
+            }
+
+            if idempotency_key:
+                IdempotencyService.record(idempotency_key, user_id, sale_id, grand_total)
+
+            # 4. Commit
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            # A concurrent request with the same key won the race
+            previous = CheckoutService.replay(idempotency_key, user_id) if idempotency_key else None
+            if previous:
+                return previous
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if idempotency_key:
+            IdempotencyService.remember(idempotency_key, IdempotentSale(user_id, sale_id, grand_total))
+
+        return CheckoutResult(
+            sale_id=sale_id,
+            grand_total=grand_total,
+            items_count=len(lines),
+            stock_levels=stock_levels
+        )
+
+    @staticmethod
+    def parse_sold_at(value, now, max_skew_seconds=300):
+        """Parse the terminal's ISO sale time; missing means now, the future is rejected."""
+        if not value:
+            return now
+        try:
+            sold_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            raise CheckoutError('Invalid sold_at timestamp.')
+        if sold_at.tzinfo is not None:
+            sold_at = sold_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if sold_at > now + timedelta(seconds=max_skew_seconds):
+            raise CheckoutError('sold_at is in the future.')
+        return sold_at
+
+    @staticmethod
+    def checkout_batch(user_id, sales):
+        """
+        Commit a batch of sales queued by a terminal while it was offline.
+
+        Products for every sale are locked once, sales are accepted in the
+        order given while stock lasts, and all accepted sales, their lines,
+        the stock decrement and the idempotency keys are written in one
+        transaction. A rejected sale never affects the others.
+
+        Args:
+            user_id (int): The cashier uploading the batch.
+            sales (list): Dicts with items, discount, payment_method and the
+                optional idempotency_key, sold_at and client_ref.
+
+        Returns:
+            tuple: (outcomes, stock_levels). outcomes has one dict per sale, in
+            request order, with status 'created', 'replayed' or 'rejected';
+            stock_levels maps product_id -> remaining stock for every product
+            touched by an accepted sale.
+        """
+        for attempt in range(2):
+            try:
+                return CheckoutService._checkout_batch(user_id, sales)
+            except IntegrityError:
+                db.session.rollback()
+                # A concurrent upload recorded one of the keys first; the
+                # retry answers those sales as replays
+                if attempt:
+                    raise
+            except Exception:
+                db.session.rollback()
+                raise
+
+    @staticmethod
+    def _checkout_batch(user_id, sales):
+        now = datetime.utcnow()
+        outcomes = [None] * len(sales)
+        pending = []
+        keys_in_batch = {}
+
+        # 1. Validate every sale and answer already-used keys
+        for index, sale in enumerate(sales):
+            outcome = {'index': index, 'client_ref': sale.get('client_ref') if isinstance(sale, dict) else None}
+            outcomes[index] = outcome
+            try:
+                if not isinstance(sale, dict):
+                    raise CheckoutError('Invalid sale.')
+                key = sale.get('idempotency_key')
+                if key and not IdempotencyService.is_valid_key(key):
+                    raise CheckoutError('Invalid idempotency key.')
+                if key in keys_in_batch:
+                    raise CheckoutError('Duplicate idempotency key in batch.', 409)
+                if key:
+                    keys_in_batch[key] = index
+                    previous = CheckoutService.replay(key, user_id)
+                    if previous:
+                        outcome.update(status='replayed', sale_id=previous.sale_id, total=previous.grand_total)
+                        continue
+
+                if not sale.get('items'):
+                    raise CheckoutError('Cart is empty.')
+                if not sale.get('payment_method'):
+                    raise CheckoutError('Payment method required.')
+                try:
+                    discount = float(sale.get('discount') or 0)
+                except (TypeError, ValueError):
+                    raise CheckoutError('Invalid discount.')
+                lines, quantities = CheckoutService.normalize_items(sale['items'])
+                sold_at = CheckoutService.parse_sold_at(sale.get('sold_at'), now)
+            except CheckoutError as e:
+                outcome.update(status='rejected', reason=e.message)
+                continue
+
+            pending.append((index, key, sale['payment_method'], discount, lines, quantities, sold_at))
+
+        # 2. Lock every product in the batch once & accept sales while stock lasts
+        product_ids = set()
+        for entry in pending:
+            product_ids.update(entry[5])
+        products = CheckoutService.lock_products(product_ids) if product_ids else {}
+        available = {pid: p.quantity_in_stock for pid, p in products.items()}
+
+        tax_rate = float(SystemSetting.get('tax_rate', 0.08))
+        accepted = []
+        sold = {}
+        for index, key, payment_method_str, discount, lines, quantities, sold_at in pending:
+            missing = [pid for pid in quantities if pid not in products]
+            short = [pid for pid, qty in quantities.items() if pid in available and available[pid] < qty]
+            if missing:
+                outcomes[index].update(status='rejected', reason='Product not found.', product_ids=missing)
+                continue
+            if short:
+                outcomes[index].update(status='rejected', reason='Insufficient stock.', product_ids=short)
+                continue
+
+            for pid, qty in quantities.items():
+                available[pid] -= qty
+                sold[pid] = sold.get(pid, 0) + qty
+            sale = CheckoutService.build_sale(user_id, lines, discount, payment_method_str, tax_rate, sold_at)
+            accepted.append((index, key, lines, sale))
+
+        if not accepted:
+            db.session.rollback()
+            return outcomes, {}
+
+        # 3. Insert sales, decrement stock once, bulk insert every line
+        db.session.add_all([sale for _, _, _, sale in accepted])
+        db.session.flush()
+        CheckoutService.decrement_stock(sold, now=now)
+        item_rows = []
+        for _, _, lines, sale in accepted:
+            item_rows.extend(CheckoutService.sale_item_rows(sale.id, lines))
+        db.session.execute(insert(SaleItem), item_rows)
+        RollupService.record_sales(
+            [(sale, lines) for _, _, lines, sale in accepted],
+            {pid: p.cost_price for pid, p in products.items()}
+        )
+
+        for index, key, lines, sale in accepted:
+            if key:
+                IdempotencyService.record(key, user_id, sale.id, sale.grand_total)
+            outcomes[index].update(
+                status='created', sale_id=sale.id,
+                total=float(sale.grand_total), items_count=len(lines)
+            )
+
+        # 4. Commit
+        db.session.commit()
+
+        for index, key, _, sale in accepted:
+            if key:
+                IdempotencyService.remember(key, IdempotentSale(user_id, sale.id, float(sale.grand_total)))
+
+        return outcomes, {pid: available[pid] for pid in sold}
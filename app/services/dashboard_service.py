@@ -0,0 +1,215 @@
+from app import db
+from app.models import (Sale, SaleItem, Product, Expense, ExpenseStatus,
+                        DailySalesRollup, DailyProductRollup)
+from app.services.rollup_service import RollupService
+from app.services.report_service import ProductSales
+from flask import current_app
+from sqlalchemy import func
+from datetime import datetime, time, timedelta
+import threading
+import time as _time
+
+
+class DashboardService:
+    """
+    Per-worker snapshot of the dashboard KPIs.
+
+    A full build reads closed days from the daily rollups and today from the
+    raw sales. While the snapshot is younger than DASHBOARD_CACHE_TTL seconds
+    it is served as is; after that only today's sales it has not counted yet
+    are read and added to it. Sale ids are assigned on insert but become
+    visible on commit, possibly out of order, so the high-water mark only
+    moves past sales older than DASHBOARD_SETTLE_SECONDS; newer sales are
+    counted by id and a lower id that commits later is still picked up.
+    A full build runs again when the UTC day changes or every
+    DASHBOARD_FULL_REFRESH_SECONDS, which also picks up rollup rebuilds and
+    cost price changes.
+    """
+
+    CHART_DAYS = 30
+    TOP_PRODUCTS = 5
+
+    _state = None
+    _checked_at = 0.0
+    _built_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _config(key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    @staticmethod
+    def snapshot():
+        """
+        Return the dashboard KPIs.
+
+        Returns:
+            dict: total_sales, total_revenue, total_cogs, total_expenses,
+            net_profit, today_sales, today_revenue, total_products,
+            low_stock_products, top_products and sales_data (30-day chart).
+        """
+        now = _time.monotonic()
+        state = DashboardService._state
+        if state is not None and now - DashboardService._checked_at < DashboardService._config('DASHBOARD_CACHE_TTL', 30):
+            return DashboardService._view(state)
+
+        with DashboardService._lock:
+            now = _time.monotonic()
+            state = DashboardService._state
+            if state is not None and now - DashboardService._checked_at < DashboardService._config('DASHBOARD_CACHE_TTL', 30):
+                return DashboardService._view(state)
+
+            today = datetime.utcnow().date()
+            full_every = DashboardService._config('DASHBOARD_FULL_REFRESH_SECONDS', 600)
+            if state is None or state['today'] != today or now - DashboardService._built_at > full_every:
+                state = DashboardService._build(today)
+                DashboardService._built_at = now
+            else:
+                DashboardService._apply_new_sales(state)
+            DashboardService._refresh_counts(state)
+
+            DashboardService._state = state
+            DashboardService._checked_at = now
+            return DashboardService._view(state)
+
+    @staticmethod
+    def clear():
+        with DashboardService._lock:
+            DashboardService._state = None
+            DashboardService._checked_at = 0.0
+            DashboardService._built_at = 0.0
+
+    @staticmethod
+    def _build(today):
+        # Closed days: sums over the rollup tables
+        count, revenue, cogs = db.session.query(
+            func.coalesce(func.sum(DailySalesRollup.sale_count), 0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0),
+            func.coalesce(func.sum(DailySalesRollup.cogs), 0)
+        ).filter(DailySalesRollup.business_date < today).one()
+
+        products = {}
+        for product_id, name, quantity, product_revenue in db.session.query(
+            Product.id,
+            Product.name,
+            func.sum(DailyProductRollup.quantity),
+            func.sum(DailyProductRollup.revenue)
+        ).join(Product, DailyProductRollup.product_id == Product.id).filter(
+            DailyProductRollup.business_date < today
+        ).group_by(Product.id, Product.name).all():
+            products[product_id] = [name, int(quantity or 0), float(product_revenue or 0)]
+
+        chart_start = today - timedelta(days=DashboardService.CHART_DAYS)
+        chart = {
+            point['date']: point['sales']
+            for point in RollupService.daily_revenue(chart_start, today - timedelta(days=1), today=today)
+        }
+        chart[today.strftime('%Y-%m-%d')] = 0.0
+
+        state = {
+            'today': today,
+            'high_water': 0,
+            'counted': set(),
+            'total_sales': int(count),
+            'total_revenue': float(revenue),
+            'total_cogs': float(cogs),
+            'today_sales': 0,
+            'today_revenue': 0.0,
+            'products': products,
+            'chart': chart
+        }
+
+        # Today from raw rows
+        DashboardService._apply_new_sales(state)
+        return state
+
+    @staticmethod
+    def _apply_new_sales(state):
+        """Add today's sales above the high-water mark that are not counted yet."""
+        today_start = datetime.combine(state['today'], time.min)
+        rows = db.session.query(Sale.id, Sale.created_at).filter(
+            Sale.created_at >= today_start, Sale.id > state['high_water']
+        ).all()
+
+        # Lower ids are assumed committed once a sale is older than the settle delay
+        settled_before = datetime.utcnow() - timedelta(seconds=DashboardService._config('DASHBOARD_SETTLE_SECONDS', 10))
+        settled = max((r.id for r in rows if r.created_at <= settled_before), default=state['high_water'])
+        counted = state['counted']
+
+        if settled > state['high_water']:
+            criteria = [Sale.created_at >= today_start, Sale.id > state['high_water'], Sale.id <= settled]
+            if counted:
+                criteria.append(Sale.id.notin_(counted))
+            DashboardService._apply_sales(state, *criteria)
+            counted = {sale_id for sale_id in counted if sale_id > settled}
+            state['high_water'] = settled
+
+        recent = [r.id for r in rows if r.id > settled and r.id not in counted]
+        if recent:
+            DashboardService._apply_sales(state, Sale.id.in_(recent))
+            counted.update(recent)
+        state['counted'] = counted
+
+    @staticmethod
+    def _apply_sales(state, *criteria):
+        """Add the sales matching criteria to the snapshot totals."""
+        today_key = state['today'].strftime('%Y-%m-%d')
+        day = func.date(Sale.created_at)
+
+        for sale_day, count, revenue in db.session.query(
+            day, func.count(Sale.id), func.coalesce(func.sum(Sale.grand_total), 0)
+        ).filter(*criteria).group_by(day).all():
+            sale_day = str(sale_day)
+            state['total_sales'] += int(count)
+            state['total_revenue'] += float(revenue)
+            if sale_day == today_key:
+                state['today_sales'] += int(count)
+                state['today_revenue'] += float(revenue)
+            if sale_day in state['chart']:
+                state['chart'][sale_day] += float(revenue)
+
+        for product_id, name, quantity, product_revenue, cogs in db.session.query(
+            Product.id,
+            Product.name,
+            func.sum(SaleItem.quantity_sold),
+            func.sum(SaleItem.total_price),
+            func.sum(SaleItem.quantity_sold * Product.cost_price)
+        ).select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id).join(
+            Product, SaleItem.product_id == Product.id
+        ).filter(*criteria).group_by(Product.id, Product.name).all():
+            entry = state['products'].setdefault(product_id, [name, 0, 0.0])
+            entry[1] += int(quantity or 0)
+            entry[2] += float(product_revenue or 0)
+            state['total_cogs'] += float(cogs or 0)
+
+    @staticmethod
+    def _refresh_counts(state):
+        """Cheap aggregates that are not derived from sales."""
+        state['total_products'] = Product.query.count()
+        state['low_stock_products'] = Product.query.filter(
+            Product.quantity_in_stock <= Product.low_stock_threshold
+        ).count()
+        state['total_expenses'] = float(db.session.query(func.coalesce(func.sum(Expense.amount), 0)).filter(
+            Expense.status == ExpenseStatus.PAID
+        ).scalar() or 0)
+
+    @staticmethod
+    def _view(state):
+        top = sorted(state['products'].values(), key=lambda p: p[1], reverse=True)[:DashboardService.TOP_PRODUCTS]
+        return {
+            'total_sales': state['total_sales'],
+            'total_revenue': state['total_revenue'],
+            'total_cogs': state['total_cogs'],
+            'total_expenses': state['total_expenses'],
+            # Net profit = Revenue - COGS - Paid Expenses
+            'net_profit': state['total_revenue'] - state['total_cogs'] - state['total_expenses'],
+            'today_sales': state['today_sales'],
+            'today_revenue': state['today_revenue'],
+            'total_products': state['total_products'],
+            'low_stock_products': state['low_stock_products'],
+            'top_products': [ProductSales(name, quantity, revenue) for name, quantity, revenue in top],
+            'sales_data': [{'date': key, 'sales': value} for key, value in sorted(state['chart'].items())]
+        }
@@ -0,0 +1,142 @@
+from app import db
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from collections import deque
+import os
+import threading
+import time
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited and whether it overflowed."""
+
+    def _do_get(self):
+        overflow = self.overflow()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            DbPool.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        # overflow() starts at -pool_size and counts every new connection;
+        # only connections beyond pool_size are overflow
+        overflowed = self.overflow() > max(overflow, 0)
+        DbPool.record_checkout(time.perf_counter() - start, overflowed=overflowed)
+        return connection
+
+
+class DbPool:
+    """
+    Connection pool profile and per-worker pool metrics.
+
+    The DB_POOL_* settings of the config class become the engine's pool
+    options. Connections are pinged before use and recycled after
+    DB_POOL_RECYCLE seconds, so connections the server dropped overnight are
+    replaced instead of failing the first request. Engines are disposed in
+    forked children, which must not share their parent's sockets.
+    """
+
+    _engines = []
+    _fork_hook = False
+    _lock = threading.Lock()
+
+    checkouts = 0
+    overflows = 0
+    timeouts = 0
+    peak_in_use = 0
+    _waits = deque(maxlen=1000)
+    _max_wait = 0.0
+
+    @staticmethod
+    def engine_options(config):
+        """SQLALCHEMY_ENGINE_OPTIONS for config; explicit SQLALCHEMY_ENGINE_OPTIONS win."""
+        options = {
+            'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        }
+        url = make_url(config.get('SQLALCHEMY_DATABASE_URI') or 'sqlite://')
+        # In-memory SQLite keeps its single-connection pool
+        if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+            options.update({
+                'poolclass': MeteredQueuePool,
+                'pool_size': config.get('DB_POOL_SIZE', 10),
+                'max_overflow': config.get('DB_POOL_MAX_OVERFLOW', 10),
+                'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+            })
+        options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        return options
+
+    @staticmethod
+    def init_app(app):
+        DbPool._waits = deque(maxlen=app.config.get('DB_POOL_SAMPLE_SIZE', 1000))
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'checkout', lambda *args: DbPool._on_checkout(engine))
+        with DbPool._lock:
+            DbPool._engines.append(engine)
+            if not DbPool._fork_hook and hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=DbPool._after_fork)
+                DbPool._fork_hook = True
+
+    @staticmethod
+    def _after_fork():
+        # Connections opened before the fork (e.g. warming caches in a
+        # preloaded app) belong to the parent; start with empty pools
+        for engine in DbPool._engines:
+            engine.dispose(close=False)
+        DbPool._lock = threading.Lock()
+        DbPool.reset()
+
+    @staticmethod
+    def _on_checkout(engine):
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            in_use = pool.checkedout()
+            if in_use > DbPool.peak_in_use:
+                DbPool.peak_in_use = in_use
+
+    @staticmethod
+    def record_checkout(seconds, overflowed=False, timed_out=False):
+        with DbPool._lock:
+            if timed_out:
+                DbPool.timeouts += 1
+            else:
+                DbPool.checkouts += 1
+                DbPool.overflows += int(overflowed)
+            DbPool._waits.append(seconds)
+            DbPool._max_wait = max(DbPool._max_wait, seconds)
+
+    @staticmethod
+    def reset():
+        with DbPool._lock:
+            DbPool.checkouts = DbPool.overflows = DbPool.timeouts = DbPool.peak_in_use = 0
+            DbPool._waits.clear()
+            DbPool._max_wait = 0.0
+
+    @staticmethod
+    def stats():
+        """Pool state and checkout counters of this worker; waits over the last DB_POOL_SAMPLE_SIZE checkouts."""
+        pool = db.engine.pool
+        with DbPool._lock:
+            waits = sorted(DbPool._waits)
+            stats = {
+                'pool': type(pool).__name__,
+                'checkouts': DbPool.checkouts,
+                'overflow_events': DbPool.overflows,
+                'timeouts': DbPool.timeouts,
+                'peak_in_use': DbPool.peak_in_use,
+                'wait_ms': {
+                    'avg': round(1000 * sum(waits) / len(waits), 3) if waits else 0.0,
+                    'p95': round(1000 * waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                    'max': round(1000 * DbPool._max_wait, 3)
+                }
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'in_use': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'timeout': pool.timeout()
+            })
+        return stats
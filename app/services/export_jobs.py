@@ -0,0 +1,347 @@
+"""
+Background jobs for report and inventory exports.
+
+An export request writes a job file and hands the job to a small pool of
+worker processes, then returns the job id right away. Workers build the
+document with ExportService inside their own app instance and store it next
+to the job file, so any gunicorn worker can answer status and download
+requests. A request identical to a job that is still queued or running gets
+that job's id instead of a new job. Finished artifacts are deleted after
+EXPORT_RETENTION_HOURS.
+"""
+from app.services.export_service import ExportService, PDF_MIMETYPE, EXCEL_MIMETYPE
+from flask import current_app, has_request_context, request
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('queued', 'running')
+
+# App instance of an export worker process, created by _init_worker
+_worker_app = None
+
+
+class ExportJobStore:
+    """
+    Job files, artifacts and dedupe markers in one directory.
+
+    <job_id>.json holds the job state, <job_id>.<ext> the finished document
+    and active_<key> the id of the running job for a dedupe key.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_atomic(self, name, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, self._path(name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def read(self, job_id):
+        try:
+            with open(self._path(f"{job_id}.json"), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, job):
+        self._write_atomic(f"{job['id']}.json", json.dumps(job).encode('utf-8'))
+
+    def discard(self, job_id):
+        try:
+            os.remove(self._path(f"{job_id}.json"))
+        except OSError:
+            pass
+
+    def write_artifact(self, job_id, ext, data):
+        """Store bytes or the contents of a binary file; returns the size."""
+        if isinstance(data, bytes):
+            self._write_atomic(f"{job_id}.{ext}", data)
+            return len(data)
+        with data:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                shutil.copyfileobj(data, fh)
+            os.replace(tmp_path, self._path(f"{job_id}.{ext}"))
+        return os.path.getsize(self._path(f"{job_id}.{ext}"))
+
+    def artifact_path(self, job):
+        return self._path(f"{job['id']}.{job['ext']}")
+
+    def claim(self, key, job_id):
+        """Mark job_id as the active job for key; False if another job holds it."""
+        try:
+            fd = os.open(self._path(f"active_{key}"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(job_id)
+        return True
+
+    def holder(self, key):
+        try:
+            with open(self._path(f"active_{key}"), encoding='utf-8') as fh:
+                return fh.read().strip()
+        except OSError:
+            return None
+
+    def release(self, key, job_id=None):
+        """Drop the active marker for key (only if job_id still holds it)."""
+        if job_id is not None and self.holder(key) != job_id:
+            return
+        try:
+            os.remove(self._path(f"active_{key}"))
+        except OSError:
+            pass
+
+    def purge(self, max_age):
+        """Delete jobs and artifacts finished more than max_age seconds ago."""
+        cutoff = time.time() - max_age
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            job = self.read(entry.name[:-len('.json')])
+            # Queued/running jobs this old died with their worker
+            if job is None or (job.get('finished_at') or job['created_at']) > cutoff:
+                continue
+            for name in (f"{job['id']}.{job['ext']}", entry.name):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+            self.release(job['dedupe_key'], job['id'])
+            removed += 1
+        return removed
+
+
+def _init_worker(config_class):
+    """Build an app for this export worker process, without the serving-side warm-up."""
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config_class, overrides=ExportJobs.WORKER_CONFIG)
+
+
+def _run_job(directory, job_id):
+    """Worker entry point: build the document for one job."""
+    store = ExportJobStore(directory)
+    job = store.read(job_id) or {}
+    # url_for(..., _external=True) in the PDF templates needs the requesting host
+    with _worker_app.test_request_context(base_url=job.get('base_url')):
+        ExportJobs.execute(store, job_id)
+
+
+class ExportJobs:
+    BUILDERS = {
+        'sales_report_pdf': (ExportService.sales_report_pdf, 'pdf', PDF_MIMETYPE),
+        'sales_report_excel': (ExportService.sales_report_excel, 'xlsx', EXCEL_MIMETYPE),
+        'inventory_pdf': (ExportService.inventory_pdf, 'pdf', PDF_MIMETYPE),
+        'inventory_excel': (ExportService.inventory_excel, 'xlsx', EXCEL_MIMETYPE)
+    }
+
+    # Worker processes only build documents: no search index, audit thread,
+    # catalog snapshot or nested export pool, and a minimal connection pool
+    WORKER_CONFIG = {
+        'PRODUCT_SEARCH_WARM': False,
+        'AUDIT_ASYNC': False,
+        'CATALOG_SNAPSHOT': False,
+        'EXPORT_JOBS_ASYNC': False,
+        'PDF_WORKERS': 1,
+        'DB_POOL_SIZE': 1,
+        'DB_POOL_MAX_OVERFLOW': 1
+    }
+
+    _executor = None
+    _executor_pid = None
+    _purged_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def init_app(app, config_class=None):
+        """
+        Prepare the job directory. Worker processes are spawned on first use
+        and rebuild the app from config_class.
+        """
+        directory = app.config.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+        os.makedirs(directory, exist_ok=True)
+        app.extensions['export_jobs'] = {
+            'store': ExportJobStore(directory),
+            'config_class': config_class,
+            'submitted': 0,
+            'deduplicated': 0
+        }
+        atexit.register(ExportJobs.shutdown)
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['export_jobs']
+
+    @staticmethod
+    def _pool():
+        """Process pool of this gunicorn worker, created lazily after fork."""
+        if ExportJobs._executor is not None and ExportJobs._executor_pid == os.getpid():
+            return ExportJobs._executor
+        with ExportJobs._lock:
+            if ExportJobs._executor is None or ExportJobs._executor_pid != os.getpid():
+                ExportJobs._executor = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('EXPORT_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(ExportJobs._state()['config_class'],)
+                )
+                ExportJobs._executor_pid = os.getpid()
+            return ExportJobs._executor
+
+    @staticmethod
+    def shutdown():
+        if ExportJobs._executor is not None and ExportJobs._executor_pid == os.getpid():
+            ExportJobs._executor.shutdown(wait=False, cancel_futures=True)
+            ExportJobs._executor = None
+
+    @staticmethod
+    def dedupe_key(kind, params):
+        payload = json.dumps([kind, params], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def _is_stale(job):
+        timeout = current_app.config.get('EXPORT_JOB_TIMEOUT', 900)
+        return job['status'] in ACTIVE and time.time() - job['created_at'] > timeout
+
+    @staticmethod
+    def enqueue(kind, args):
+        """
+        Start an export job, or join an identical one that is still running.
+
+        Args:
+            kind (str): One of BUILDERS.
+            args (Mapping): Request arguments; only the ones the export uses are kept.
+
+        Returns:
+            dict: The job.
+        """
+        state = ExportJobs._state()
+        store = state['store']
+        ExportJobs._purge_expired(store)
+
+        params = {name: args.get(name) for name in ExportService.PARAMS[kind] if args.get(name) not in (None, '')}
+        key = ExportJobs.dedupe_key(kind, params)
+        _, ext, mimetype = ExportJobs.BUILDERS[kind]
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'params': params,
+            'dedupe_key': key,
+            'status': 'queued',
+            'ext': ext,
+            'mimetype': mimetype,
+            'filename': None,
+            'size': None,
+            'error': None,
+            'base_url': request.host_url if has_request_context() else None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        # The job file exists before the marker points at it
+        store.write(job)
+
+        for _ in range(2):
+            if store.claim(key, job['id']):
+                break
+            existing = store.read(store.holder(key) or '')
+            if existing is not None and existing['status'] in ACTIVE and not ExportJobs._is_stale(existing):
+                store.discard(job['id'])
+                state['deduplicated'] += 1
+                return existing
+            # The holder finished or died without releasing its marker
+            store.release(key)
+        else:
+            raise RuntimeError("Could not register export job")
+
+        state['submitted'] += 1
+        if current_app.config.get('EXPORT_JOBS_ASYNC', True):
+            ExportJobs._pool().submit(_run_job, store.directory, job['id'])
+        else:
+            ExportJobs.execute(store, job['id'])
+        return store.read(job['id'])
+
+    @staticmethod
+    def execute(store, job_id):
+        """Build one job's document in the current app and request context."""
+        job = store.read(job_id)
+        builder, ext, _ = ExportJobs.BUILDERS[job['kind']]
+        job.update(status='running', started_at=time.time())
+        store.write(job)
+        try:
+            data, filename = builder(job['params'])
+            size = store.write_artifact(job_id, ext, data)
+            job.update(status='done', filename=filename, size=size)
+        except Exception as e:
+            logger.exception("Export job %s (%s) failed", job_id, job['kind'])
+            job.update(status='failed', error=str(e))
+        finally:
+            job['finished_at'] = time.time()
+            store.write(job)
+            store.release(job['dedupe_key'], job_id)
+        return job
+
+    @staticmethod
+    def get(job_id):
+        """Return the job, with stale queued/running jobs reported as failed."""
+        if not job_id.isalnum():
+            return None
+        job = ExportJobs._state()['store'].read(job_id)
+        if job is not None and ExportJobs._is_stale(job):
+            job.update(status='failed', error='Export did not finish in time')
+        return job
+
+    @staticmethod
+    def artifact_path(job):
+        return ExportJobs._state()['store'].artifact_path(job)
+
+    @staticmethod
+    def _purge_expired(store):
+        """Apply the retention policy, at most once a minute per process."""
+        now = time.monotonic()
+        if now - ExportJobs._purged_at < 60:
+            return
+        ExportJobs._purged_at = now
+        ExportJobs.purge(store)
+
+    @staticmethod
+    def purge(store=None):
+        store = store or ExportJobs._state()['store']
+        return store.purge(current_app.config.get('EXPORT_RETENTION_HOURS', 24) * 3600)
+
+    @staticmethod
+    def stats():
+        state = ExportJobs._state()
+        return {
+            'workers': current_app.config.get('EXPORT_WORKERS', 2),
+            'submitted': state['submitted'],
+            'deduplicated': state['deduplicated']
+        }
@@ -0,0 +1,513 @@
+"""
+Builders for the report, inventory and sales list exports.
+
+Each builder takes the export's query parameters as a plain dict and returns
+(document, download filename), where the document is bytes or a binary file
+positioned at the start, so it can run in a request or in a background
+export job.
+
+Row-level Excel exports stream: rows are read from projection queries in
+EXPORT_CHUNK_SIZE keyset chunks and written through StreamingSheet, so
+memory stays bounded however many rows match.
+"""
+from app import db
+from app.models import Product, Category, Sale, SaleItem, User
+from app.services.report_service import ReportService
+from app.services.pdf_service import PdfService
+from app.services.sale_summary import SaleSummary
+from app.services.product_search import ProductSearch
+from app.utils import format_currency
+from flask import render_template, current_app
+from sqlalchemy import or_, and_, desc, select
+from datetime import datetime, timedelta
+from io import BytesIO
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+import csv
+import io
+import json
+import pickle
+import tempfile
+import zlib
+
+PDF_MIMETYPE = 'application/pdf'
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _int(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _auto_width(ws):
+    for col in ws.columns:
+        max_length = 0
+        column = col[0].column_letter
+        for cell in col:
+            try:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = (max_length + 2)
+        ws.column_dimensions[column].width = adjusted_width
+
+
+def _workbook_bytes(wb):
+    excel_io = BytesIO()
+    wb.save(excel_io)
+    return excel_io.getvalue()
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _enum_value(value):
+    try:
+        return value.value
+    except Exception:
+        return str(value)
+
+
+def sales_filters(params):
+    """
+    Criteria for the sales list filters, inclusive of both dates.
+
+    Args:
+        params (Mapping): start_date / end_date (YYYY-MM-DD) and user_id;
+            invalid values are ignored.
+    """
+    criteria = []
+    if params.get('start_date'):
+        try:
+            criteria.append(Sale.created_at >= datetime.strptime(params.get('start_date'), '%Y-%m-%d'))
+        except ValueError:
+            pass
+    if params.get('end_date'):
+        try:
+            end_date = datetime.strptime(params.get('end_date'), '%Y-%m-%d') + timedelta(days=1)
+            criteria.append(Sale.created_at < end_date)
+        except ValueError:
+            pass
+    user_id = _int(params.get('user_id'))
+    if user_id:
+        criteria.append(Sale.user_id == user_id)
+    return criteria
+
+
+def iter_newest_first(query, created_at, id_column, chunk_size=None):
+    """
+    Yield the rows of a projection query newest first, one SELECT per chunk.
+
+    Chunks continue after the last (created_at, id) seen instead of using
+    OFFSET, so every chunk is an index range scan. The query must select
+    created_at and id_column under the names 'created_at' and 'id'.
+    """
+    chunk_size = chunk_size or _config('EXPORT_CHUNK_SIZE', 1000)
+    last = None
+    while True:
+        chunk_query = query
+        if last is not None:
+            chunk_query = chunk_query.filter(or_(
+                created_at < last[0],
+                and_(created_at == last[0], id_column < last[1])
+            ))
+        rows = chunk_query.order_by(created_at.desc(), id_column.desc()).limit(chunk_size).all()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1].created_at, rows[-1].id)
+
+
+class StreamingSheet:
+    """
+    Single-sheet workbook written in openpyxl write-only mode.
+
+    A write-only sheet needs its column widths before the first row, so
+    appended rows are pickled to a spooled temp file while the widest value
+    of each column is tracked, and save() then writes the header and rows
+    in one pass. Both the row spool and the returned workbook stay in memory
+    up to EXPORT_SPOOL_MAX_MEMORY bytes and move to disk beyond that.
+    """
+
+    HEADER_FONT = Font(bold=True, color="FFFFFF")
+    HEADER_FILL = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+
+    def __init__(self, title, headers):
+        self.title = title
+        self.headers = headers
+        self.widths = [len(str(h)) for h in headers]
+        self.rows = 0
+        self._spool_size = _config('EXPORT_SPOOL_MAX_MEMORY', 8 * 1024 * 1024)
+        self._spool = tempfile.SpooledTemporaryFile(max_size=self._spool_size)
+
+    def append(self, row):
+        for index, value in enumerate(row):
+            if value is not None:
+                self.widths[index] = max(self.widths[index], len(str(value)))
+        pickle.dump(row, self._spool, pickle.HIGHEST_PROTOCOL)
+        self.rows += 1
+
+    def _spooled_rows(self):
+        self._spool.seek(0)
+        for _ in range(self.rows):
+            yield pickle.load(self._spool)
+
+    def save(self):
+        """Return the workbook as a spooled binary file positioned at the start."""
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(self.title)
+        for index, width in enumerate(self.widths, start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width + 2
+
+        header = []
+        for value in self.headers:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = self.HEADER_FONT
+            cell.fill = self.HEADER_FILL
+            cell.alignment = Alignment(horizontal="center")
+            header.append(cell)
+        ws.append(header)
+
+        for row in self._spooled_rows():
+            ws.append(row)
+        self._spool.close()
+
+        output = tempfile.SpooledTemporaryFile(max_size=self._spool_size)
+        wb.save(output)
+        output.seek(0)
+        return output
+
+
+def _plain(value):
+    """Cell value for CSV/NDJSON: ISO datetimes, enum values, decimals as-is."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'value'):
+        return value.value
+    return value
+
+
+def _json_default(value):
+    # Decimal columns
+    return float(value)
+
+
+def gzip_chunks(chunks, level=6):
+    """gzip-compress a stream of byte chunks."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ExportService:
+    # Row sets of /sales/export/stream: (name, column) in output order
+    STREAM_COLUMNS = {
+        'sales': [
+            ('id', Sale.id),
+            ('created_at', Sale.created_at),
+            ('user_id', Sale.user_id),
+            ('cashier', User.username),
+            ('subtotal', Sale.subtotal),
+            ('tax_rate', Sale.tax_rate),
+            ('tax_amount', Sale.tax_amount),
+            ('discount', Sale.discount),
+            ('grand_total', Sale.grand_total),
+            ('payment_method', Sale.payment_method),
+            ('amount_paid', Sale.amount_paid),
+            ('change_given', Sale.change_given),
+            ('status', Sale.sale_status)
+        ],
+        'items': [
+            ('id', SaleItem.id),
+            ('sale_id', SaleItem.sale_id),
+            ('sale_created_at', Sale.created_at),
+            ('product_id', SaleItem.product_id),
+            ('product_name', Product.name),
+            ('sku', Product.sku),
+            ('quantity', SaleItem.quantity_sold),
+            ('unit_price', SaleItem.unit_price_at_time),
+            ('total_price', SaleItem.total_price)
+        ]
+    }
+    STREAM_FLUSH_BYTES = 64 * 1024
+
+    # Query parameters each export depends on
+    PARAMS = {
+        'sales_report_pdf': ('type', 'start_date', 'end_date'),
+        'sales_report_excel': ('type', 'start_date', 'end_date'),
+        'inventory_pdf': ('search', 'category_id'),
+        'inventory_excel': ('search', 'category_id')
+    }
+
+    @staticmethod
+    def sales_report_pdf(params):
+        """Reports page as PDF."""
+        period, _ = ReportService.resolve_period(
+            params.get('type', 'daily'),
+            params.get('start_date'),
+            params.get('end_date')
+        )
+        report = ReportService.build(period, top_limit=10)
+
+        html = render_template(
+            'sales/reports_pdf.html',
+            generated_at=datetime.now().strftime('%Y-%m-%d %H:%M'),
+            period_expenses=ReportService.period_expenses(period),
+            format_currency=format_currency,
+            **report
+        )
+
+        pdf_bytes = PdfService.render(html)
+        return pdf_bytes, f"sales_report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+
+    @staticmethod
+    def sales_report_excel(params):
+        """Reports page as a workbook with summary, daily, product and cashier sheets."""
+        period, _ = ReportService.resolve_period(
+            params.get('type', 'daily'),
+            params.get('start_date'),
+            params.get('end_date')
+        )
+        report = ReportService.build(period, top_limit=20)
+        start_date, end_date = period.start_date, period.end_date
+
+        # Create Excel Workbook
+        wb = openpyxl.Workbook()
+    
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+
+        # Sheet 1: Summary
+        ws_summary = wb.active
+        ws_summary.title = "Summary"
+    
+        ws_summary.append(["Sales Report Summary"])
+        ws_summary['A1'].font = Font(bold=True, size=14)
+        ws_summary.append([f"Period: {start_date} to {end_date}"])
+        ws_summary.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+        ws_summary.append([])
+    
+        summary_data = [
+            ["Metric", "Value"],
+            ["Total Transactions", int(report['total_sales'])],
+            ["Total Revenue", float(report['total_revenue'])],
+            ["Total Items Sold", int(report['total_items'])],
+            ["Cost of Goods Sold (COGS)", float(report['cogs'])],
+            ["Gross Profit", float(report['gross_profit'])],
+            ["Average Order Value", float(report['avg_order_value'])],
+            ["Paid Expenses", float(report['paid_expenses'])],
+            ["Pending Expenses", float(report['pending_expenses'])],
+            ["Net Profit", float(report['net_profit'])]
+        ]
+    
+        for row in summary_data:
+            ws_summary.append(row)
+    
+        for cell in ws_summary[5]:
+            cell.font = header_font
+            cell.fill = header_fill
+
+        # Sheet 2: Daily Sales
+        ws_daily = wb.create_sheet("Daily Sales")
+        ws_daily.append(["Date", "Revenue"])
+        for cell in ws_daily[1]:
+            cell.font = header_font
+            cell.fill = header_fill
+    
+        for d in report['daily_sales']:
+            ws_daily.append([d['date'], d['sales']])
+
+        # Sheet 3: Top Products
+        ws_products = wb.create_sheet("Top Products")
+        ws_products.append(["Product Name", "Quantity Sold", "Revenue"])
+        for cell in ws_products[1]:
+            cell.font = header_font
+            cell.fill = header_fill
+    
+        for p in report['top_products']:
+            ws_products.append([p[0], int(p[1]), float(p[2])])
+
+        # Sheet 4: Cashier Performance
+        ws_cashiers = wb.create_sheet("Cashier Performance")
+        ws_cashiers.append(["Cashier", "Transactions", "Total Revenue"])
+        for cell in ws_cashiers[1]:
+            cell.font = header_font
+            cell.fill = header_fill
+    
+        for u in report['user_sales']:
+            ws_cashiers.append([u[0], int(u[1]), float(u[2])])
+
+        # Auto-width for all sheets
+        for ws in wb.worksheets:
+            _auto_width(ws)
+
+        return _workbook_bytes(wb), f"sales_report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+
+    @staticmethod
+    def inventory_pdf(params):
+        """Filtered product list as PDF."""
+        # Get filters
+        search = params.get('search', '')
+        category_id = _int(params.get('category_id'))
+
+        # Build query
+        query = Product.query
+        if search:
+            query = query.filter(ProductSearch.criterion(search))
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+
+        products = query.order_by(desc(Product.created_at)).all()
+
+        # Context for template
+        category_name = None
+        if category_id:
+            cat = Category.query.get(category_id)
+            if cat:
+                category_name = cat.name
+
+        html = render_template(
+            'products/pdf_export.html',
+            products=products,
+            generated_at=datetime.now().strftime('%Y-%m-%d %H:%M'),
+            category_filter=category_name,
+            search_query=search,
+            format_currency=format_currency
+        )
+
+        pdf_bytes = PdfService.render(html)
+        return pdf_bytes, f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+
+    @staticmethod
+    def inventory_excel(params):
+        """Filtered product list as a streamed workbook."""
+        search = params.get('search', '')
+        category_id = _int(params.get('category_id'))
+
+        query = db.session.query(
+            Product.id,
+            Product.created_at,
+            Product.name,
+            Category.name.label('category_name'),
+            Product.sku,
+            Product.barcode,
+            Product.cost_price,
+            Product.selling_price,
+            Product.quantity_in_stock,
+            Product.low_stock_threshold
+        ).outerjoin(Category, Product.category_id == Category.id)
+        if search:
+            query = query.filter(ProductSearch.criterion(search))
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+
+        sheet = StreamingSheet("Inventory", [
+            'ID', 'Name', 'Category', 'SKU', 'Barcode', 'Cost Price', 'Selling Price',
+            'Stock', 'Low Stock Threshold', 'Status'
+        ])
+        for p in iter_newest_first(query, Product.created_at, Product.id):
+            status = "Low Stock" if p.quantity_in_stock <= p.low_stock_threshold else "In Stock"
+            sheet.append([
+                p.id,
+                p.name,
+                p.category_name or '-',
+                p.sku,
+                p.barcode,
+                float(p.cost_price) if p.cost_price is not None else None,
+                float(p.selling_price) if p.selling_price is not None else None,
+                p.quantity_in_stock,
+                p.low_stock_threshold,
+                status
+            ])
+
+        return sheet.save(), f"inventory_export_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+
+    @staticmethod
+    def sales_excel(params):
+        """Sales list (same filters as the sales page) as a streamed workbook, newest first."""
+        sheet = StreamingSheet("Sales", [
+            'ID', 'Date', 'Cashier', 'Items', 'Subtotal', 'Tax', 'Discount', 'Total', 'Payment', 'Status'
+        ])
+        chunk_size = _config('EXPORT_CHUNK_SIZE', 1000)
+        for sale in SaleSummary.iter_rows(sales_filters(params), chunk_size=chunk_size):
+            sheet.append([
+                sale.id,
+                sale.created_at.strftime('%Y-%m-%d %H:%M'),
+                sale.cashier or '-',
+                int(sale.item_count or 0),
+                float(sale.subtotal or 0),
+                float(sale.tax_amount or 0),
+                float(sale.discount or 0),
+                float(sale.grand_total or 0),
+                _enum_value(sale.payment_method),
+                _enum_value(sale.sale_status)
+            ])
+
+        return sheet.save(), f"sales_export_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+
+    @staticmethod
+    def stream_sales(params, rows='sales', fmt='csv', after_id=None):
+        """
+        Yield every matching sale (or sale line) as encoded CSV/NDJSON chunks.
+
+        Rows come from one server-side cursor in id order, so memory stays
+        flat and a client can resume after the last id it received.
+
+        Args:
+            params (Mapping): The sales list filters (start_date, end_date, user_id).
+            rows (str): 'sales' or 'items'.
+            fmt (str): 'csv' or 'ndjson'.
+            after_id (int, optional): Only rows with a greater id.
+        """
+        columns = ExportService.STREAM_COLUMNS[rows]
+        names = [name for name, _ in columns]
+        id_column = columns[0][1]
+
+        stmt = select(*[column.label(name) for name, column in columns])
+        if rows == 'items':
+            stmt = stmt.select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id).join(
+                Product, SaleItem.product_id == Product.id
+            )
+        else:
+            stmt = stmt.select_from(Sale).outerjoin(User, Sale.user_id == User.id)
+        stmt = stmt.where(*sales_filters(params))
+        if after_id:
+            stmt = stmt.where(id_column > after_id)
+        stmt = stmt.order_by(id_column).execution_options(stream_results=True)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(names)
+
+        result = db.session.execute(stmt)
+        try:
+            for partition in result.partitions(_config('EXPORT_CHUNK_SIZE', 1000)):
+                for row in partition:
+                    values = [_plain(value) for value in row]
+                    if writer:
+                        writer.writerow(values)
+                    else:
+                        buffer.write(json.dumps(dict(zip(names, values)), default=_json_default,
+                                                separators=(',', ':')))
+                        buffer.write('\n')
+                if buffer.tell() >= ExportService.STREAM_FLUSH_BYTES:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+        finally:
+            result.close()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
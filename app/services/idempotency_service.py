@@ -0,0 +1,97 @@
+from app import db
+from app.models import CheckoutIdempotencyKey
+from flask import current_app
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+import re
+import threading
+
+
+IdempotentSale = namedtuple('IdempotentSale', ['user_id', 'sale_id', 'grand_total'])
+
+_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class IdempotencyService:
+    """
+    Remembers which checkout idempotency keys already produced a sale.
+
+    Keys live in the indexed checkout_idempotency_key table, which is written
+    in the same transaction as the sale, and in a bounded per-process LRU so
+    retries hitting the same worker never reach the database.
+    """
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_key(key):
+        return bool(key) and bool(_KEY_PATTERN.match(key))
+
+    @staticmethod
+    def _cache_size():
+        try:
+            return current_app.config.get('IDEMPOTENCY_CACHE_SIZE', 1024)
+        except RuntimeError:
+            return 1024
+
+    @staticmethod
+    def remember(key, entry):
+        """Store a key in the in-process LRU, evicting the oldest entries."""
+        with IdempotencyService._lock:
+            IdempotencyService._cache[key] = entry
+            IdempotencyService._cache.move_to_end(key)
+            while len(IdempotencyService._cache) > IdempotencyService._cache_size():
+                IdempotencyService._cache.popitem(last=False)
+
+    @staticmethod
+    def lookup(key):
+        """
+        Find the sale previously recorded for a key.
+
+        Returns:
+            IdempotentSale or None if the key has not been used yet.
+        """
+        with IdempotencyService._lock:
+            entry = IdempotencyService._cache.get(key)
+            if entry is not None:
+                IdempotencyService._cache.move_to_end(key)
+                return entry
+
+        row = CheckoutIdempotencyKey.query.filter_by(key=key).first()
+        if row is None:
+            return None
+
+        entry = IdempotentSale(row.user_id, row.sale_id, float(row.grand_total))
+        IdempotencyService.remember(key, entry)
+        return entry
+
+    @staticmethod
+    def record(key, user_id, sale_id, grand_total):
+        """
+        Add the key row to the current session.
+
+        The caller commits it together with the sale, so a key can never
+        point at a sale that was rolled back.
+        """
+        db.session.add(CheckoutIdempotencyKey(
+            key=key,
+            user_id=user_id,
+            sale_id=sale_id,
+            grand_total=grand_total
+        ))
+
+    @staticmethod
+    def prune(older_than_days=7):
+        """Delete keys older than the retry window. Returns the number removed."""
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        removed = CheckoutIdempotencyKey.query.filter(
+            CheckoutIdempotencyKey.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+    @staticmethod
+    def clear_cache():
+        with IdempotencyService._lock:
+            IdempotencyService._cache.clear()
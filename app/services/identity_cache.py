@@ -0,0 +1,137 @@
+from app import db
+from app.models import User, Role, CacheVersion
+from flask import current_app
+from collections import namedtuple
+import threading
+import time
+
+
+RoleView = namedtuple('RoleView', ['id', 'name'])
+
+
+class UserIdentity:
+    """
+    Read-only view of a logged-in user, used as current_user.
+
+    Holds what authorization and the page chrome read (id, username, email,
+    role and the set of role names), so has_role() is a set lookup and no
+    request lazy-loads the User or its Role. To change a user, update the
+    User row and call IdentityCache.invalidate().
+    """
+
+    __slots__ = ('id', 'username', 'email', 'role_id', 'role', 'roles', 'is_active')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, email, role_id, role_name, is_active):
+        role = RoleView(role_id, role_name) if role_name else None
+        values = {
+            'id': id,
+            'username': username,
+            'email': email,
+            'role_id': role_id,
+            'role': role,
+            'roles': frozenset([role_name] if role_name else []),
+            'is_active': bool(is_active)
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserIdentity is read-only; update the User row and invalidate it')
+
+    def get_id(self):
+        return str(self.id)
+
+    def has_role(self, role_name):
+        return role_name in self.roles
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
+
+class IdentityCache:
+    """
+    Per-worker cache of UserIdentity by user id, for the login manager.
+
+    An identity is reused for IDENTITY_CACHE_TTL seconds. Every
+    IDENTITY_CACHE_CHECK_SECONDS the next lookup reads the 'identity'
+    CacheVersion row and drops all identities when another worker bumped it,
+    so an edit or deactivation reaches every worker within that interval
+    while most requests run no query at all. Deactivated users resolve to
+    None, which logs them out.
+    """
+
+    VERSION_NAME = 'identity'
+
+    _entries = {}
+    _version = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def _config(key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    @staticmethod
+    def _revalidate(now):
+        """Drop every identity when the shared version moved; call with the lock held."""
+        if now - IdentityCache._checked_at < IdentityCache._config('IDENTITY_CACHE_CHECK_SECONDS', 5):
+            return
+        version = CacheVersion.get(IdentityCache.VERSION_NAME)
+        if version != IdentityCache._version:
+            IdentityCache._entries = {}
+            IdentityCache._version = version
+        IdentityCache._checked_at = now
+
+    @staticmethod
+    def get(user_id):
+        """UserIdentity for user_id, or None for unknown or deactivated users."""
+        now = time.monotonic()
+        with IdentityCache._lock:
+            IdentityCache._revalidate(now)
+            cached = IdentityCache._entries.get(user_id)
+            if cached is not None and cached[0] > now:
+                IdentityCache.hits += 1
+                return cached[1]
+            IdentityCache.misses += 1
+
+        row = db.session.query(
+            User.id, User.username, User.email, User.role_id, Role.name, User.is_active
+        ).outerjoin(Role, User.role_id == Role.id).filter(User.id == user_id).first()
+        identity = UserIdentity(*row) if row is not None and row.is_active else None
+
+        with IdentityCache._lock:
+            IdentityCache._entries[user_id] = (now + IdentityCache._config('IDENTITY_CACHE_TTL', 60), identity)
+        return identity
+
+    @staticmethod
+    def invalidate(user_id):
+        """
+        Bump the shared version in the current transaction and drop the
+        user's local identity. Call before committing a change to the user.
+        """
+        CacheVersion.bump(IdentityCache.VERSION_NAME)
+        with IdentityCache._lock:
+            IdentityCache._entries.pop(user_id, None)
+
+    @staticmethod
+    def clear():
+        with IdentityCache._lock:
+            IdentityCache._entries = {}
+            IdentityCache._version = None
+            IdentityCache._checked_at = 0.0
+
+    @staticmethod
+    def stats():
+        return {
+            'entries': len(IdentityCache._entries),
+            'hits': IdentityCache.hits,
+            'misses': IdentityCache.misses
+        }
@@ -0,0 +1,199 @@
+from flask import current_app
+from sqlalchemy import and_, or_, func
+from datetime import date, datetime
+from urllib.parse import quote, unquote
+import base64
+import threading
+import time
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated listing.
+
+    next_cursor / prev_cursor are opaque tokens for the following and
+    preceding pages (None when there is none). total is the number of
+    matching rows, None when counting was skipped; when total_capped is set
+    there are at least that many.
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None, total_capped=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_capped = total_capped
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class Keyset:
+    """
+    Cursor pagination on a unique sort key such as (created_at, id).
+
+    A page is read with "key < last key seen" (or "> first key seen" going
+    back; the other way round for ascending listings) and LIMIT per_page + 1, so its cost does not depend on how deep
+    the page is. Totals are a COUNT capped at PAGINATION_COUNT_LIMIT rows,
+    cached per worker for PAGINATION_COUNT_TTL seconds under the caller's
+    count_key; without a count_key no COUNT runs at all.
+    """
+
+    _counts = {}
+    _lock = threading.Lock()
+    MAX_CACHED_COUNTS = 512
+
+    @staticmethod
+    def _config(key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    @staticmethod
+    def encode_cursor(direction, values):
+        raw = '|'.join([direction] + [
+            quote(v.isoformat() if isinstance(v, (date, datetime)) else str(v), safe='') for v in values
+        ])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token, columns):
+        """Return (direction, values) for a cursor token, or None for the first page."""
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            direction, *raw = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            if direction not in ('next', 'prev') or len(raw) != len(columns):
+                return None
+            values = []
+            for column, value in zip(columns, raw):
+                value = unquote(value)
+                python_type = column.type.python_type
+                if python_type is datetime:
+                    values.append(datetime.fromisoformat(value))
+                elif python_type is date:
+                    values.append(date.fromisoformat(value))
+                else:
+                    values.append(python_type(value))
+            return direction, values
+        except (ValueError, TypeError, UnicodeDecodeError, NotImplementedError):
+            # A mangled link starts over rather than failing the page
+            return None
+
+    @staticmethod
+    def seek(columns, values, ahead=False):
+        """
+        Criterion for rows past values in descending order of columns.
+
+        ahead=True selects the rows before values instead (greater keys).
+        """
+        clauses = []
+        for i, column in enumerate(columns):
+            bound = column > values[i] if ahead else column < values[i]
+            clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], bound))
+        return or_(*clauses)
+
+    @staticmethod
+    def page(fetch, columns, cursor=None, per_page=20, count=None, count_key=None, ascending=False):
+        """
+        Read one page through fetch.
+
+        Args:
+            fetch (callable): fetch(criteria, ascending, limit) returns rows
+                matching the extra criteria, ordered by columns ascending or
+                descending.
+            columns (tuple): Sort key columns; together unique (end with the id).
+            cursor (str, optional): Token from a previous page.
+            per_page (int): Rows per page.
+            count (callable, optional): count(limit) returns the number of
+                matching rows, counting at most limit.
+            count_key (hashable, optional): Cache key of the listing and its
+                filters; the total is skipped without it.
+            ascending (bool): List in ascending key order (default newest first).
+
+        Returns:
+            KeysetPage
+        """
+        names = [column.key for column in columns]
+        decoded = Keyset.decode_cursor(cursor, columns)
+        direction = decoded[0] if decoded else None
+        # Going back reads the listing in reverse
+        reverse = (direction == 'prev') != ascending
+
+        criteria = []
+        if decoded:
+            criteria.append(Keyset.seek(columns, decoded[1], ahead=reverse))
+
+        rows = fetch(criteria, reverse, per_page + 1)
+        more = len(rows) > per_page
+        rows = list(rows[:per_page])
+        if direction == 'prev':
+            rows.reverse()
+
+        def key_of(row):
+            return [getattr(row, name) for name in names]
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if more or direction == 'prev':
+                next_cursor = Keyset.encode_cursor('next', key_of(rows[-1]))
+            if direction == 'next' or (direction == 'prev' and more):
+                prev_cursor = Keyset.encode_cursor('prev', key_of(rows[0]))
+
+        total, capped = (None, False)
+        if count is not None and count_key is not None:
+            total, capped = Keyset.total(count_key, count)
+        return KeysetPage(rows, per_page, next_cursor, prev_cursor, total, capped)
+
+    @staticmethod
+    def paginate(query, columns, cursor=None, per_page=20, count_key=None, ascending=False):
+        """Keyset page of an unordered ORM query, newest first by columns (or ascending)."""
+        def fetch(criteria, asc, limit):
+            order = [c.asc() if asc else c.desc() for c in columns]
+            return query.filter(*criteria).order_by(*order).limit(limit).all()
+
+        return Keyset.page(
+            fetch, columns, cursor=cursor, per_page=per_page,
+            count=lambda limit: Keyset.capped_count(query, limit), count_key=count_key,
+            ascending=ascending
+        )
+
+    @staticmethod
+    def capped_count(query, limit):
+        """COUNT over at most limit rows of query."""
+        bounded = query.enable_eagerloads(False).order_by(None).limit(limit).subquery()
+        return query.session.query(func.count()).select_from(bounded).scalar() or 0
+
+    @staticmethod
+    def total(count_key, count):
+        """Return (total, capped) for a listing, from the per-worker cache when fresh."""
+        now = time.monotonic()
+        cached = Keyset._counts.get(count_key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        limit = Keyset._config('PAGINATION_COUNT_LIMIT', 10000)
+        counted = count(limit + 1)
+        result = (min(counted, limit), counted > limit)
+
+        with Keyset._lock:
+            if len(Keyset._counts) >= Keyset.MAX_CACHED_COUNTS:
+                Keyset._counts.clear()
+            Keyset._counts[count_key] = (now + Keyset._config('PAGINATION_COUNT_TTL', 60), result)
+        return result
+
+    @staticmethod
+    def clear():
+        with Keyset._lock:
+            Keyset._counts.clear()
@@ -0,0 +1,334 @@
+"""
+Bounded pool of long-lived wkhtmltopdf renderers.
+
+Each gunicorn worker owns PDF_WORKERS renderers. A renderer keeps one
+wkhtmltopdf process running in --read-args-from-stdin mode and feeds it one
+document per line, so a reprint no longer pays for a fresh wkhtmltopdf
+start. Requests take a free renderer from the pool, waiting at most
+PDF_QUEUE_TIMEOUT seconds, and a document that takes longer than
+PDF_RENDER_TIMEOUT seconds kills its process, which is restarted on the next
+render. With PDF_PERSISTENT_RENDERERS off each render runs a one-shot
+wkhtmltopdf instead, still under the same concurrency cap.
+"""
+from flask import current_app
+import atexit
+import logging
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PdfRenderError(Exception):
+    """wkhtmltopdf could not produce the document."""
+
+
+class PdfTimeoutError(PdfRenderError):
+    """The document took longer than the render timeout."""
+
+
+class PdfBusyError(PdfRenderError):
+    """No renderer became free within the queue timeout."""
+
+
+def _quote(arg):
+    """Quote one argument for wkhtmltopdf's stdin argument parser."""
+    return '"' + str(arg).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class PdfRenderer:
+    """One wkhtmltopdf process, restarted whenever it dies or times out."""
+
+    def __init__(self, binary, work_dir, persistent=True):
+        self.binary = binary
+        self.work_dir = work_dir
+        self.persistent = persistent
+        self._proc = None
+        self._lines = None
+        self.starts = 0
+
+    def _start(self):
+        try:
+            self._proc = subprocess.Popen(
+                [self.binary, '--read-args-from-stdin'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            )
+        except OSError as e:
+            self._proc = None
+            raise PdfRenderError(f"wkhtmltopdf could not be started ({self.binary}): {e}")
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=self._pump, args=(self._proc, self._lines), name='pdf-renderer-stderr', daemon=True
+        ).start()
+        self.starts += 1
+
+    @staticmethod
+    def _pump(proc, lines):
+        for line in proc.stderr:
+            lines.put(line)
+        lines.put(None)
+
+    def stop(self, kill=False):
+        proc, self._proc = self._proc, None
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            if kill:
+                raise TimeoutError
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+            proc.wait()
+
+    def render(self, html, args, timeout):
+        """Render html with wkhtmltopdf args and return the PDF bytes."""
+        fd, source = tempfile.mkstemp(suffix='.html', dir=self.work_dir)
+        target = source[:-len('.html')] + '.pdf'
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                fh.write(html)
+            if self.persistent:
+                self._render_persistent(args, source, target, timeout)
+            else:
+                self._render_once(args, source, target, timeout)
+            try:
+                with open(target, 'rb') as fh:
+                    pdf_bytes = fh.read()
+            except OSError:
+                pdf_bytes = b''
+            if not pdf_bytes:
+                raise PdfRenderError("wkhtmltopdf produced no output")
+            return pdf_bytes
+        finally:
+            for path in (source, target):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _render_persistent(self, args, source, target, timeout):
+        if self._proc is None or self._proc.poll() is not None:
+            self._start()
+
+        try:
+            self._proc.stdin.write(' '.join(_quote(a) for a in [*args, source, target]) + '\n')
+            self._proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.stop()
+            raise PdfRenderError(f"wkhtmltopdf process is gone: {e}")
+
+        # wkhtmltopdf reports "Done" (or "Exit with code ...") on stderr after each document
+        output = []
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stop(kill=True)
+                raise PdfTimeoutError(f"PDF rendering timed out after {timeout}s")
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if line is None:
+                self._proc = None
+                raise PdfRenderError("wkhtmltopdf exited: " + ' '.join(output[-3:]))
+            line = line.strip()
+            if line == 'Done':
+                return
+            if line.startswith('Exit with code'):
+                # Start clean for the next document
+                self.stop()
+                raise PdfRenderError(line)
+            if line:
+                output.append(line)
+
+    def _render_once(self, args, source, target, timeout):
+        try:
+            result = subprocess.run(
+                [self.binary, '--quiet', *args, source, target],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            raise PdfTimeoutError(f"PDF rendering timed out after {timeout}s")
+        except OSError as e:
+            raise PdfRenderError(f"wkhtmltopdf could not be started ({self.binary}): {e}")
+        if result.returncode != 0:
+            raise PdfRenderError(result.stderr.decode('utf-8', 'replace').strip() or
+                                 f"wkhtmltopdf exited with code {result.returncode}")
+
+
+class PdfRendererPool:
+    """
+    Fixed set of PdfRenderers shared by the threads of one process.
+
+    Callers queue for a free renderer; the number of waiting callers, wait
+    and render times and failure counts are kept for the metrics endpoint.
+    """
+
+    def __init__(self, binary, size=2, queue_timeout=10, render_timeout=60,
+                 persistent=True, work_dir=None):
+        self.binary = binary
+        self.size = max(1, size)
+        self.queue_timeout = queue_timeout
+        self.render_timeout = render_timeout
+        self.persistent = persistent
+        self.work_dir = work_dir or tempfile.gettempdir()
+
+        self._lock = threading.Lock()
+        self._renderers = []
+        self._idle = None
+        self._pid = None
+
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.render_seconds = 0.0
+        self.max_render_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def _ensure_started(self):
+        """Create the renderers, or fresh ones in a newly forked worker."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Processes started by the parent belong to the parent
+            self._renderers = [
+                PdfRenderer(self.binary, self.work_dir, self.persistent) for _ in range(self.size)
+            ]
+            self._idle = queue.LifoQueue()
+            for renderer in self._renderers:
+                self._idle.put(renderer)
+            self._pid = os.getpid()
+
+    @staticmethod
+    def _args(options):
+        args = []
+        for key, value in (options or {}).items():
+            args.append(key if key.startswith('-') else f'--{key}')
+            if value not in (None, '', True):
+                args.append(str(value))
+        return args
+
+    def render(self, html, options=None):
+        """Render html to PDF bytes, waiting for a free renderer if needed."""
+        self._ensure_started()
+
+        queued_at = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            renderer = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.rejected += 1
+            raise PdfBusyError("All PDF renderers are busy, please try again shortly")
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        started = time.monotonic()
+        try:
+            pdf_bytes = renderer.render(html, self._args(options), self.render_timeout)
+        except PdfTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+                self.failed += 1
+            raise
+        except PdfRenderError:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            self._idle.put(renderer)
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.rendered += 1
+            self.render_seconds += elapsed
+            self.max_render_seconds = max(self.max_render_seconds, elapsed)
+            self.wait_seconds += started - queued_at
+        return pdf_bytes
+
+    def close(self):
+        """Stop every renderer process started by this process."""
+        if self._pid != os.getpid():
+            return
+        for renderer in self._renderers:
+            renderer.stop()
+
+    def stats(self):
+        rendered = self.rendered or 1
+        return {
+            'workers': self.size,
+            'persistent': self.persistent,
+            'busy': self.size - self._idle.qsize() if self._idle is not None else 0,
+            'queue_depth': self.waiting,
+            'peak_queue_depth': self.peak_waiting,
+            'rendered': self.rendered,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'rejected': self.rejected,
+            'process_starts': sum(r.starts for r in self._renderers),
+            'avg_render_ms': round(self.render_seconds * 1000 / rendered, 1),
+            'max_render_ms': round(self.max_render_seconds * 1000, 1),
+            'avg_wait_ms': round(self.wait_seconds * 1000 / rendered, 1)
+        }
+
+
+class PdfService:
+    @staticmethod
+    def init_app(app):
+        """Create the per-process renderer pool and stop it on shutdown."""
+        work_dir = app.config.get('PDF_WORK_DIR') or os.path.join(app.instance_path, 'pdf_work')
+        os.makedirs(work_dir, exist_ok=True)
+
+        pool = PdfRendererPool(
+            app.config.get('WKHTMLTOPDF_PATH') or 'wkhtmltopdf',
+            size=app.config.get('PDF_WORKERS', 2),
+            queue_timeout=app.config.get('PDF_QUEUE_TIMEOUT', 10),
+            render_timeout=app.config.get('PDF_RENDER_TIMEOUT', 60),
+            persistent=app.config.get('PDF_PERSISTENT_RENDERERS', True),
+            work_dir=work_dir
+        )
+        app.extensions['pdf_renderer'] = pool
+        atexit.register(pool.close)
+        return pool
+
+    @staticmethod
+    def render(html, options=None):
+        """
+        Render an HTML document to PDF.
+
+        Args:
+            html (str): The complete HTML document.
+            options (dict, optional): wkhtmltopdf options, e.g. {'orientation': 'Landscape'}.
+
+        Returns:
+            bytes: The PDF document.
+
+        Raises:
+            PdfRenderError: wkhtmltopdf failed, timed out, or every renderer stayed busy.
+        """
+        return current_app.extensions['pdf_renderer'].render(html, options)
+
+    @staticmethod
+    def stats():
+        """Counters for the renderer pool of this process."""
+        return current_app.extensions['pdf_renderer'].stats()
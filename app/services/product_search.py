@@ -0,0 +1,326 @@
+from app import db
+from app.models import Product
+from flask import current_app
+from sqlalchemy import false, func, or_
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import timedelta
+import logging
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+class ProductSearch:
+    """
+    Per-worker trigram index over product name, SKU and barcode, plus
+    exact barcode/SKU maps for scanner lookups.
+
+    Matches have the same meaning as the old case-insensitive
+    contains() filters: terms of three or more characters are answered
+    from the trigram postings and checked against the candidates, shorter
+    terms scan the in-memory rows. The index is built at startup (or on
+    first use) and kept current by the product routes in this worker; other workers pick
+    up changes after PRODUCT_SEARCH_REFRESH_SECONDS by re-reading rows from
+    PRODUCT_SEARCH_SETTLE_SECONDS before their newest updated_at (an edit
+    stamped earlier may commit after a newer one), and rebuild when the row
+    count no longer matches (a product was deleted elsewhere).
+    """
+
+    # Ranks: exact SKU/barcode, prefix of a field, prefix of a name word, anywhere
+    EXACT, PREFIX, WORD, CONTAINS = range(4)
+
+    _docs = {}
+    _grams = {}
+    _barcodes = {}
+    _skus = {}
+    _watermark = None
+    _built = False
+    _checked_at = 0.0
+    _lock = threading.RLock()
+
+    COLUMNS = (
+        Product.id,
+        Product.name,
+        Product.sku,
+        Product.barcode,
+        Product.category_id,
+        Product.is_active,
+        Product.updated_at,
+    )
+
+    @staticmethod
+    def _config(key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            return default
+
+    @staticmethod
+    def normalize(text):
+        """Case- and accent-insensitive form, like the default MySQL collation."""
+        if not text:
+            return ''
+        decomposed = unicodedata.normalize('NFKD', str(text).casefold())
+        return ''.join(c for c in decomposed if not unicodedata.combining(c)).strip()
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    # --------------------
+    # Index maintenance
+    # --------------------
+    @staticmethod
+    def _put(row):
+        ProductSearch._discard(row.id)
+        fields = (ProductSearch.normalize(row.name), ProductSearch.normalize(row.sku),
+                  ProductSearch.normalize(row.barcode))
+        ProductSearch._docs[row.id] = {
+            'fields': fields,
+            'name': row.name or '',
+            'category_id': row.category_id,
+            'is_active': bool(row.is_active)
+        }
+        for gram in set().union(*[ProductSearch._trigrams(f) for f in fields]):
+            ProductSearch._grams.setdefault(gram, set()).add(row.id)
+        if fields[1]:
+            ProductSearch._skus[fields[1]] = row.id
+        if fields[2]:
+            ProductSearch._barcodes[fields[2]] = row.id
+
+        if row.updated_at is not None:
+            key = (row.updated_at, row.id)
+            if ProductSearch._watermark is None or key > ProductSearch._watermark:
+                ProductSearch._watermark = key
+
+    @staticmethod
+    def _discard(product_id):
+        doc = ProductSearch._docs.pop(product_id, None)
+        if doc is None:
+            return
+        for gram in set().union(*[ProductSearch._trigrams(f) for f in doc['fields']]):
+            postings = ProductSearch._grams.get(gram)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del ProductSearch._grams[gram]
+        _, sku, barcode = doc['fields']
+        if ProductSearch._skus.get(sku) == product_id:
+            del ProductSearch._skus[sku]
+        if ProductSearch._barcodes.get(barcode) == product_id:
+            del ProductSearch._barcodes[barcode]
+
+    @staticmethod
+    def init_app(app):
+        """Build the index at startup when PRODUCT_SEARCH_WARM is set; otherwise on first search."""
+        if not app.config.get('PRODUCT_SEARCH_WARM', True):
+            return
+        with app.app_context():
+            try:
+                ProductSearch.build()
+            except SQLAlchemyError as e:
+                # Database not migrated or not reachable yet
+                logger.warning("Product search index not built at startup: %s", e)
+                ProductSearch.clear()
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def build():
+        """Index every product with one query."""
+        with ProductSearch._lock:
+            ProductSearch._docs = {}
+            ProductSearch._grams = {}
+            ProductSearch._barcodes = {}
+            ProductSearch._skus = {}
+            ProductSearch._watermark = None
+            for row in db.session.query(*ProductSearch.COLUMNS).all():
+                ProductSearch._put(row)
+            ProductSearch._built = True
+            ProductSearch._checked_at = time.monotonic()
+
+    @staticmethod
+    def refresh():
+        """Build the index, or apply rows changed since the watermark once the refresh interval has passed."""
+        interval = ProductSearch._config('PRODUCT_SEARCH_REFRESH_SECONDS', 5)
+        if ProductSearch._built and time.monotonic() - ProductSearch._checked_at < interval:
+            return
+        with ProductSearch._lock:
+            if not ProductSearch._built:
+                ProductSearch.build()
+                return
+            if time.monotonic() - ProductSearch._checked_at < interval:
+                return
+
+            query = db.session.query(*ProductSearch.COLUMNS)
+            if ProductSearch._watermark is not None:
+                # Rows stamped shortly before the watermark may have committed since the last refresh
+                settle = timedelta(seconds=ProductSearch._config('PRODUCT_SEARCH_SETTLE_SECONDS', 2))
+                query = query.filter(Product.updated_at >= ProductSearch._watermark[0] - settle)
+            for row in query.all():
+                ProductSearch._put(row)
+
+            if db.session.query(func.count(Product.id)).scalar() != len(ProductSearch._docs):
+                ProductSearch.build()
+                return
+            ProductSearch._checked_at = time.monotonic()
+
+    @staticmethod
+    def upsert(product):
+        """Index a product added or edited in this worker."""
+        with ProductSearch._lock:
+            if ProductSearch._built:
+                ProductSearch._put(product)
+
+    @staticmethod
+    def remove(product_id):
+        with ProductSearch._lock:
+            ProductSearch._discard(product_id)
+
+    @staticmethod
+    def clear():
+        with ProductSearch._lock:
+            ProductSearch._docs = {}
+            ProductSearch._grams = {}
+            ProductSearch._barcodes = {}
+            ProductSearch._skus = {}
+            ProductSearch._watermark = None
+            ProductSearch._built = False
+            ProductSearch._checked_at = 0.0
+
+    # --------------------
+    # Queries
+    # --------------------
+    @staticmethod
+    def _matches(term):
+        """{product_id: rank} of every product whose name, SKU or barcode contains term."""
+        ProductSearch.refresh()
+        with ProductSearch._lock:
+            docs = ProductSearch._docs
+            if len(term) >= 3:
+                postings = sorted((ProductSearch._grams.get(g, set()) for g in ProductSearch._trigrams(term)), key=len)
+                candidates = set.intersection(*postings) if postings else set()
+            else:
+                candidates = docs.keys()
+
+            ranks = {}
+            for product_id in candidates:
+                name, sku, barcode = docs[product_id]['fields']
+                if term == sku or term == barcode:
+                    ranks[product_id] = ProductSearch.EXACT
+                elif name.startswith(term) or sku.startswith(term) or barcode.startswith(term):
+                    ranks[product_id] = ProductSearch.PREFIX
+                elif any(word.startswith(term) for word in name.split()):
+                    ranks[product_id] = ProductSearch.WORD
+                elif term in name or term in sku or term in barcode:
+                    ranks[product_id] = ProductSearch.CONTAINS
+            return ranks
+
+    @staticmethod
+    def search(term, limit=None, category_id=None, active_only=False):
+        """
+        Product ids matching term, best first.
+
+        Exact SKU/barcode hits come first, then prefix matches, then any
+        other substring match; ties are ordered by name.
+
+        Args:
+            term (str): Search text.
+            limit (int, optional): Maximum number of ids.
+            category_id (int, optional): Only this category.
+            active_only (bool): Skip deactivated products.
+        """
+        term = ProductSearch.normalize(term)
+        if not term:
+            return []
+        ranks = ProductSearch._matches(term)
+        with ProductSearch._lock:
+            docs = ProductSearch._docs
+            ids = [product_id for product_id in ranks
+                   if product_id in docs
+                   and (not category_id or docs[product_id]['category_id'] == category_id)
+                   and (not active_only or docs[product_id]['is_active'])]
+            ids.sort(key=lambda product_id: (ranks[product_id], docs[product_id]['name'].casefold(), product_id))
+        return ids[:limit] if limit else ids
+
+    @staticmethod
+    def criterion(term):
+        """
+        SQL filter for products matching term, for queries with their own
+        ordering and pagination.
+
+        Up to PRODUCT_SEARCH_MAX_IDS matches become an id IN (...) list; a
+        term matching more than that (one or two characters, usually) keeps
+        the LIKE filter, which is no slower than a list that long.
+        """
+        ranks = ProductSearch._matches(ProductSearch.normalize(term))
+        if len(ranks) > ProductSearch._config('PRODUCT_SEARCH_MAX_IDS', 1000):
+            return or_(
+                Product.name.contains(term),
+                Product.sku.contains(term),
+                Product.barcode.contains(term)
+            )
+        if not ranks:
+            return false()
+        return Product.id.in_(sorted(ranks))
+
+    @staticmethod
+    def lookup(code):
+        """Id of the product with this barcode (or, failing that, SKU), or None."""
+        code = ProductSearch.normalize(code)
+        if not code:
+            return None
+        ProductSearch.refresh()
+        with ProductSearch._lock:
+            return ProductSearch._barcodes.get(code) or ProductSearch._skus.get(code)
+
+    @staticmethod
+    def find_by_code(code):
+        """
+        Product for a scanned barcode or SKU, with current stock.
+
+        Normally one hash lookup and one primary-key read. A code missing
+        from this worker's index (added in another worker within the
+        refresh interval) or an entry that no longer matches its row is
+        resolved with the unique barcode/SKU indexes and re-indexed.
+        """
+        normalized = ProductSearch.normalize(code)
+        if not normalized:
+            return None
+
+        product_id = ProductSearch.lookup(normalized)
+        product = db.session.get(Product, product_id) if product_id else None
+        if product is not None and normalized in (ProductSearch.normalize(product.barcode),
+                                                  ProductSearch.normalize(product.sku)):
+            return product
+
+        if product is not None:
+            ProductSearch.upsert(product)
+        elif product_id:
+            ProductSearch.remove(product_id)
+        code = code.strip()
+        product = (Product.query.filter(Product.barcode == code).first()
+                   or Product.query.filter(Product.sku == code).first())
+        if product is not None:
+            ProductSearch.upsert(product)
+        return product
+
+    @staticmethod
+    def load(ids, *options):
+        """Products for ranked ids, in the same order."""
+        if not ids:
+            return []
+        products = {p.id: p for p in Product.query.options(*options).filter(Product.id.in_(ids)).all()}
+        return [products[product_id] for product_id in ids if product_id in products]
+
+    @staticmethod
+    def stats():
+        with ProductSearch._lock:
+            return {
+                'built': ProductSearch._built,
+                'products': len(ProductSearch._docs),
+                'trigrams': len(ProductSearch._grams),
+                'codes': len(ProductSearch._barcodes) + len(ProductSearch._skus)
+            }
@@ -0,0 +1,201 @@
+"""
+On-disk cache of rendered receipt documents.
+
+A receipt only depends on its sale, the sale status and the receipt-related
+settings, so the rendered HTML and PDF are stored under a key built from the
+sale id, the status and a hash of those settings. A reprint of a cached
+receipt is a plain file send. Changing a setting changes the key, so stale
+entries are never served and are evicted by size like any other. A status
+change (refund or void) removes the sale's entries right away.
+"""
+from app.models import Sale, SaleStatus
+from app.services.pdf_service import PdfService
+from app.services.settings_cache import SettingsCache
+from flask import current_app
+from io import BytesIO
+from sqlalchemy import event
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptStore:
+    """Size-bounded directory of receipt HTML/PDF files, least recently used evicted first."""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def open(self, key, ext):
+        """Open a cached file for reading, or return None."""
+        path = self._path(key, ext)
+        try:
+            fh = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            # Recency for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return fh
+
+    def write(self, key, ext, data):
+        """Store data atomically and evict old entries if over the size limit."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, self._path(key, ext))
+        except OSError as e:
+            logger.warning("Could not store receipt %s.%s: %s", key, ext, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.evictions += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def invalidate(self, prefix):
+        """Remove every file whose name starts with prefix."""
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(prefix):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        self.invalidations += removed
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'files': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+class ReceiptCache:
+    # Settings rendered into sales/receipt_pdf.html
+    SETTING_KEYS = ('receipt_header', 'receipt_footer', 'company_logo', 'company_name', 'currency_symbol')
+
+    @staticmethod
+    def init_app(app):
+        """Create the receipt store and drop a sale's entries when its status changes."""
+        directory = app.config.get('RECEIPT_CACHE_DIR') or os.path.join(app.instance_path, 'receipt_cache')
+        os.makedirs(directory, exist_ok=True)
+
+        store = ReceiptStore(directory, max_bytes=app.config.get('RECEIPT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+        app.extensions['receipt_cache'] = store
+
+        if not event.contains(Sale.sale_status, 'set', ReceiptCache._on_status_change):
+            event.listen(Sale.sale_status, 'set', ReceiptCache._on_status_change)
+        return store
+
+    @staticmethod
+    def _on_status_change(target, value, oldvalue, initiator):
+        if target.id is not None and value != oldvalue:
+            ReceiptCache.invalidate(target.id)
+
+    @staticmethod
+    def key(sale):
+        """sale id, status and a hash of the receipt settings."""
+        settings = {name: SettingsCache.get(name) for name in ReceiptCache.SETTING_KEYS}
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        status = sale.sale_status.value if isinstance(sale.sale_status, SaleStatus) else str(sale.sale_status)
+        return f"receipt_{sale.id}_{status.lower()}_{digest}"
+
+    @staticmethod
+    def html(sale, render):
+        """Return the receipt HTML, calling render() to build it on a miss."""
+        store = current_app.extensions['receipt_cache']
+        key = ReceiptCache.key(sale)
+        fh = store.open(key, 'html')
+        if fh is not None:
+            with fh:
+                return fh.read().decode('utf-8')
+        html = render()
+        store.write(key, 'html', html.encode('utf-8'))
+        return html
+
+    @staticmethod
+    def open_pdf(sale, render):
+        """
+        Return a binary file object with the receipt PDF.
+
+        Args:
+            sale (Sale): The sale whose receipt is requested.
+            render (callable): Builds the receipt HTML; only called on a miss.
+
+        Raises:
+            PdfRenderError: The PDF was not cached and could not be rendered.
+        """
+        store = current_app.extensions['receipt_cache']
+        key = ReceiptCache.key(sale)
+        fh = store.open(key, 'pdf')
+        if fh is not None:
+            store.hits += 1
+            return fh
+
+        store.misses += 1
+        pdf_bytes = PdfService.render(ReceiptCache.html(sale, render))
+        store.write(key, 'pdf', pdf_bytes)
+        return BytesIO(pdf_bytes)
+
+    @staticmethod
+    def invalidate(sale_id):
+        """Remove every cached document of a sale."""
+        try:
+            store = current_app.extensions['receipt_cache']
+        except (RuntimeError, KeyError):
+            return 0
+        return store.invalidate(f"receipt_{sale_id}_")
+
+    @staticmethod
+    def stats():
+        return current_app.extensions['receipt_cache'].stats()
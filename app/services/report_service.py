@@ -0,0 +1,179 @@
+from app import db
+from app.models import Expense, ExpenseCategory, ExpenseStatus
+from app.services.rollup_service import RollupService
+from sqlalchemy import func
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+
+ProductSales = namedtuple('ProductSales', ['name', 'total_sold', 'total_revenue'])
+CashierSales = namedtuple('CashierSales', ['username', 'count', 'total'])
+
+
+class ReportPeriod(namedtuple('ReportPeriod', ['report_type', 'start_date', 'end_date'])):
+    """
+    Inclusive calendar dates of a report and the matching half-open
+    [start, end) datetime range, which lets filters on Sale.created_at
+    use its index instead of wrapping the column in DATE().
+    """
+    __slots__ = ()
+
+    @property
+    def start(self):
+        return datetime.combine(self.start_date, time.min)
+
+    @property
+    def end(self):
+        return datetime.combine(self.end_date + timedelta(days=1), time.min)
+
+    def days(self):
+        day = self.start_date
+        while day <= self.end_date:
+            yield day
+            day += timedelta(days=1)
+
+
+class ReportService:
+    @staticmethod
+    def resolve_period(report_type='daily', start_date_str=None, end_date_str=None, today=None):
+        """
+        Turn the report query args into a ReportPeriod.
+
+        'daily' is today, 'weekly' the last 7 days and 'monthly' the current
+        month; explicit dates override either end. Without a usable range the
+        last 30 days are used.
+
+        Returns:
+            tuple: (ReportPeriod, invalid) where invalid lists the names of
+            date arguments that could not be parsed.
+        """
+        today = today or datetime.utcnow().date()
+        start_date = end_date = None
+        invalid = []
+
+        if report_type == 'daily':
+            start_date = end_date = today
+        elif report_type == 'weekly':
+            end_date = today
+            start_date = today - timedelta(days=7)
+        elif report_type == 'monthly':
+            end_date = today
+            start_date = today.replace(day=1)
+
+        if start_date_str:
+            try:
+                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                invalid.append('start_date')
+        if end_date_str:
+            try:
+                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                invalid.append('end_date')
+
+        if not start_date or not end_date:
+            end_date = today
+            start_date = today - timedelta(days=30)
+
+        return ReportPeriod(report_type, start_date, end_date), invalid
+
+    @staticmethod
+    def build(period, top_limit=10, today=None):
+        """
+        Compute every KPI of the sales report for a period.
+
+        Closed days are read from the daily rollup tables and only today's
+        sales from the raw Sale/SaleItem rows (see RollupService). Expenses
+        come from one query grouped by status and category.
+
+        Returns:
+            dict: Keys match the variables of the report templates
+            (total_sales, total_revenue, daily_sales, top_products, ...).
+        """
+        # 1. Sale headers by day, payment method and cashier
+        daily_totals = {}
+        payment_totals = {}
+        cashier_totals = {}
+        total_sales = 0
+        total_revenue = 0.0
+        for b in RollupService.sales_buckets(period.start_date, period.end_date, today):
+            daily_totals[b.day] = daily_totals.get(b.day, 0.0) + b.revenue
+            label = b.payment_method.value if hasattr(b.payment_method, 'value') else str(b.payment_method)
+            payment_totals[label] = payment_totals.get(label, 0.0) + b.revenue
+            count, total = cashier_totals.get(b.username, (0, 0.0))
+            cashier_totals[b.username] = (count + b.count, total + b.revenue)
+            total_sales += b.count
+            total_revenue += b.revenue
+
+        daily_sales = []
+        for d in period.days():
+            key = d.strftime('%Y-%m-%d')
+            daily_sales.append({'date': key, 'sales': daily_totals.get(key, 0.0)})
+
+        user_sales = sorted(
+            (CashierSales(name, count, total) for name, (count, total) in cashier_totals.items()),
+            key=lambda u: u.total, reverse=True
+        )
+
+        # 2. Sale lines by product: items sold, revenue and cost of goods
+        product_rows = RollupService.product_buckets(period.start_date, period.end_date, today)
+        total_items = sum(p.quantity for p in product_rows)
+        cogs = sum(p.cogs for p in product_rows)
+        top_products = [
+            ProductSales(p.name, p.quantity, p.revenue)
+            for p in sorted(product_rows, key=lambda p: p.quantity, reverse=True)[:top_limit]
+        ]
+
+        # 3. Expenses by status and category (Expense.date is a DATE column)
+        expense_rows = db.session.query(
+            Expense.status,
+            ExpenseCategory.name,
+            ExpenseCategory.color,
+            func.coalesce(func.sum(Expense.amount), 0).label('total')
+        ).join(ExpenseCategory, Expense.category_id == ExpenseCategory.id).filter(
+            Expense.date >= period.start_date,
+            Expense.date <= period.end_date
+        ).group_by(Expense.status, ExpenseCategory.id, ExpenseCategory.name, ExpenseCategory.color).all()
+
+        paid_expenses = sum(float(r.total) for r in expense_rows if r.status == ExpenseStatus.PAID)
+        pending_expenses = sum(float(r.total) for r in expense_rows if r.status == ExpenseStatus.PENDING)
+        paid_by_category = [r for r in expense_rows if r.status == ExpenseStatus.PAID]
+
+        gross_profit = total_revenue - cogs
+        # Only PAID expenses count towards net profit (matches dashboard formula)
+        net_profit = total_revenue - cogs - paid_expenses
+
+        return {
+            'report_type': period.report_type,
+            'start_date': period.start_date,
+            'end_date': period.end_date,
+            'total_sales': total_sales,
+            'total_revenue': total_revenue,
+            'total_items': total_items,
+            'cogs': cogs,
+            'gross_profit': gross_profit,
+            'avg_order_value': total_revenue / total_sales if total_sales > 0 else 0,
+            'paid_expenses': paid_expenses,
+            'pending_expenses': pending_expenses,
+            'total_expenses': paid_expenses + pending_expenses,
+            'net_profit': net_profit,
+            'daily_sales': daily_sales,
+            'payment_method_labels': list(payment_totals.keys()),
+            'payment_method_values': list(payment_totals.values()),
+            'expense_labels': [r.name for r in paid_by_category],
+            'expense_values': [float(r.total) for r in paid_by_category],
+            'expense_colors': [r.color for r in paid_by_category],
+            'top_products': top_products,
+            'user_sales': user_sales
+        }
+
+    @staticmethod
+    def period_expenses(period, limit=None):
+        """Expenses of every status in the period, newest first."""
+        query = Expense.query.filter(
+            Expense.date >= period.start_date,
+            Expense.date <= period.end_date
+        ).order_by(Expense.date.desc())
+        if limit:
+            query = query.limit(limit)
+        return query.all()
@@ -0,0 +1,286 @@
+from app import db
+from app.models import (Sale, SaleItem, Product, User,
+                        DailySalesRollup, DailyProductRollup)
+from sqlalchemy import and_, func, insert, select
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+
+SalesBucket = namedtuple('SalesBucket', ['day', 'payment_method', 'username', 'count', 'revenue'])
+ProductBucket = namedtuple('ProductBucket', ['product_id', 'name', 'quantity', 'revenue', 'cogs'])
+
+SALES_MEASURES = ('sale_count', 'revenue', 'tax', 'discount', 'items', 'cogs')
+PRODUCT_MEASURES = ('sale_count', 'quantity', 'revenue', 'cogs')
+
+
+class RollupService:
+    """
+    Daily rollups of committed sales.
+
+    daily_sales_rollup holds one row per business (UTC) date, payment method
+    and cashier; daily_product_rollup one row per business date and product.
+    Checkout adds to them in its own transaction, so closed days never need
+    the raw sale rows again. COGS uses the product cost price at the time the
+    sale was recorded (or rebuilt).
+    """
+
+    @staticmethod
+    def _upsert(model, key_columns, measures, rows):
+        """Add the measures of each row to the existing rollup row, creating it if needed."""
+        if not rows:
+            return
+        table = model.__table__
+        rows = sorted(rows, key=lambda r: tuple(str(r[k]) for k in key_columns))
+        dialect = db.session.get_bind().dialect.name
+
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            stmt = mysql_insert(table)
+            stmt = stmt.on_duplicate_key_update({m: table.c[m] + stmt.inserted[m] for m in measures})
+            db.session.execute(stmt, rows)
+        elif dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as upsert_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as upsert_insert
+            stmt = upsert_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={m: table.c[m] + stmt.excluded[m] for m in measures}
+            )
+            db.session.execute(stmt, rows)
+        else:
+            for row in rows:
+                key = and_(*[table.c[k] == row[k] for k in key_columns])
+                result = db.session.execute(
+                    table.update().where(key).values({m: table.c[m] + row[m] for m in measures})
+                )
+                if not result.rowcount:
+                    db.session.execute(insert(table).values(**row))
+
+    @staticmethod
+    def record_sales(entries, cost_prices):
+        """
+        Add new sales to the rollups inside the caller's transaction.
+
+        Args:
+            entries (list): (sale, lines) pairs where sale is a flushed Sale
+                and lines are the normalized cart lines of that sale.
+            cost_prices (dict): product_id -> cost price at checkout time.
+        """
+        sales_rows = {}
+        product_rows = {}
+        for sale, lines in entries:
+            day = sale.created_at.date()
+            items = sum(line['quantity'] for line in lines)
+            cogs = sum(line['quantity'] * float(cost_prices.get(line['product_id'], 0)) for line in lines)
+
+            key = (day, sale.payment_method, sale.user_id)
+            row = sales_rows.setdefault(key, {
+                'business_date': day, 'payment_method': sale.payment_method, 'user_id': sale.user_id,
+                **{m: 0 for m in SALES_MEASURES}
+            })
+            row['sale_count'] += 1
+            row['revenue'] += float(sale.grand_total or 0)
+            row['tax'] += float(sale.tax_amount or 0)
+            row['discount'] += float(sale.discount or 0)
+            row['items'] += items
+            row['cogs'] += cogs
+
+            seen = set()
+            for line in lines:
+                key = (day, line['product_id'])
+                row = product_rows.setdefault(key, {
+                    'business_date': day, 'product_id': line['product_id'],
+                    **{m: 0 for m in PRODUCT_MEASURES}
+                })
+                if key not in seen:
+                    row['sale_count'] += 1
+                    seen.add(key)
+                row['quantity'] += line['quantity']
+                row['revenue'] += line['quantity'] * line['price']
+                row['cogs'] += line['quantity'] * float(cost_prices.get(line['product_id'], 0))
+
+        RollupService._upsert(DailySalesRollup, ('business_date', 'payment_method', 'user_id'),
+                              SALES_MEASURES, list(sales_rows.values()))
+        RollupService._upsert(DailyProductRollup, ('business_date', 'product_id'),
+                              PRODUCT_MEASURES, list(product_rows.values()))
+
+    @staticmethod
+    def rebuild(start_date, end_date):
+        """
+        Recompute the rollups for [start_date, end_date] from the raw sale rows.
+
+        Returns:
+            tuple: (sales rows, product rows) written.
+        """
+        start = datetime.combine(start_date, time.min)
+        end = datetime.combine(end_date + timedelta(days=1), time.min)
+        day = func.date(Sale.created_at)
+
+        DailySalesRollup.query.filter(
+            DailySalesRollup.business_date >= start_date,
+            DailySalesRollup.business_date <= end_date
+        ).delete(synchronize_session=False)
+        DailyProductRollup.query.filter(
+            DailyProductRollup.business_date >= start_date,
+            DailyProductRollup.business_date <= end_date
+        ).delete(synchronize_session=False)
+
+        per_sale = select(
+            SaleItem.sale_id,
+            func.sum(SaleItem.quantity_sold).label('items'),
+            func.sum(SaleItem.quantity_sold * Product.cost_price).label('cogs')
+        ).join(Product, SaleItem.product_id == Product.id).group_by(SaleItem.sale_id).subquery()
+
+        sales_select = select(
+            day,
+            Sale.payment_method,
+            Sale.user_id,
+            func.count(Sale.id),
+            func.coalesce(func.sum(Sale.grand_total), 0),
+            func.coalesce(func.sum(Sale.tax_amount), 0),
+            func.coalesce(func.sum(Sale.discount), 0),
+            func.coalesce(func.sum(per_sale.c['items']), 0),
+            func.coalesce(func.sum(per_sale.c.cogs), 0)
+        ).outerjoin(per_sale, per_sale.c.sale_id == Sale.id).filter(
+            Sale.created_at >= start,
+            Sale.created_at < end
+        ).group_by(day, Sale.payment_method, Sale.user_id)
+
+        product_select = select(
+            day,
+            SaleItem.product_id,
+            func.count(func.distinct(SaleItem.sale_id)),
+            func.sum(SaleItem.quantity_sold),
+            func.sum(SaleItem.total_price),
+            func.sum(SaleItem.quantity_sold * Product.cost_price)
+        ).select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id).join(
+            Product, SaleItem.product_id == Product.id
+        ).filter(
+            Sale.created_at >= start,
+            Sale.created_at < end
+        ).group_by(day, SaleItem.product_id)
+
+        sales_written = db.session.execute(insert(DailySalesRollup.__table__).from_select(
+            ['business_date', 'payment_method', 'user_id', *SALES_MEASURES], sales_select
+        )).rowcount
+        products_written = db.session.execute(insert(DailyProductRollup.__table__).from_select(
+            ['business_date', 'product_id', *PRODUCT_MEASURES], product_select
+        )).rowcount
+        db.session.commit()
+        return sales_written, products_written
+
+    @staticmethod
+    def _split(start_date, end_date, today):
+        """Return the last closed day to read from rollups and the datetime raw rows start at."""
+        yesterday = today - timedelta(days=1)
+        closed_end = min(end_date, yesterday) if end_date else yesterday
+        if start_date and closed_end < start_date:
+            closed_end = None
+        raw_start = None
+        if end_date is None or end_date >= today:
+            raw_start = datetime.combine(max(start_date, today) if start_date else today, time.min)
+        return closed_end, raw_start
+
+    @staticmethod
+    def sales_buckets(start_date=None, end_date=None, today=None):
+        """
+        Sale header totals by (day, payment method, cashier) for a date range.
+
+        Closed days come from daily_sales_rollup, today from the raw Sale
+        rows. Either bound may be None for an open range.
+        """
+        today = today or datetime.utcnow().date()
+        closed_end, raw_start = RollupService._split(start_date, end_date, today)
+        buckets = []
+
+        if closed_end is not None:
+            query = db.session.query(
+                DailySalesRollup.business_date,
+                DailySalesRollup.payment_method,
+                User.username,
+                DailySalesRollup.sale_count,
+                DailySalesRollup.revenue
+            ).join(User, DailySalesRollup.user_id == User.id).filter(
+                DailySalesRollup.business_date <= closed_end
+            )
+            if start_date:
+                query = query.filter(DailySalesRollup.business_date >= start_date)
+            buckets.extend(
+                SalesBucket(str(r[0]), r[1], r[2], int(r[3]), float(r[4])) for r in query.all()
+            )
+
+        if raw_start is not None:
+            day = func.date(Sale.created_at)
+            query = db.session.query(
+                day,
+                Sale.payment_method,
+                User.username,
+                func.count(Sale.id),
+                func.coalesce(func.sum(Sale.grand_total), 0)
+            ).join(User, Sale.user_id == User.id).filter(Sale.created_at >= raw_start)
+            if end_date:
+                query = query.filter(Sale.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+            buckets.extend(
+                SalesBucket(str(r[0]), r[1], r[2], int(r[3]), float(r[4]))
+                for r in query.group_by(day, Sale.payment_method, User.id, User.username).all()
+            )
+        return buckets
+
+    @staticmethod
+    def product_buckets(start_date=None, end_date=None, today=None):
+        """Sale line totals per product for a date range (rollups for closed days, raw rows for today)."""
+        today = today or datetime.utcnow().date()
+        closed_end, raw_start = RollupService._split(start_date, end_date, today)
+        totals = {}
+
+        def add(rows):
+            for product_id, name, quantity, revenue, cogs in rows:
+                _, q, r, c = totals.get(product_id, (name, 0, 0.0, 0.0))
+                totals[product_id] = (name, q + int(quantity or 0), r + float(revenue or 0), c + float(cogs or 0))
+
+        if closed_end is not None:
+            query = db.session.query(
+                Product.id,
+                Product.name,
+                func.sum(DailyProductRollup.quantity),
+                func.sum(DailyProductRollup.revenue),
+                func.sum(DailyProductRollup.cogs)
+            ).join(Product, DailyProductRollup.product_id == Product.id).filter(
+                DailyProductRollup.business_date <= closed_end
+            )
+            if start_date:
+                query = query.filter(DailyProductRollup.business_date >= start_date)
+            add(query.group_by(Product.id, Product.name).all())
+
+        if raw_start is not None:
+            query = db.session.query(
+                Product.id,
+                Product.name,
+                func.sum(SaleItem.quantity_sold),
+                func.sum(SaleItem.total_price),
+                func.sum(SaleItem.quantity_sold * Product.cost_price)
+            ).select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id).join(
+                Product, SaleItem.product_id == Product.id
+            ).filter(Sale.created_at >= raw_start)
+            if end_date:
+                query = query.filter(Sale.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+            add(query.group_by(Product.id, Product.name).all())
+
+        return [ProductBucket(pid, *values) for pid, values in totals.items()]
+
+    @staticmethod
+    def daily_revenue(start_date, end_date, today=None):
+        """Revenue per day for [start_date, end_date] as [{date, sales}], zero-filled."""
+        totals = {}
+        for bucket in RollupService.sales_buckets(start_date, end_date, today):
+            totals[bucket.day] = totals.get(bucket.day, 0.0) + bucket.revenue
+
+        series = []
+        day = start_date
+        while day <= end_date:
+            key = day.strftime('%Y-%m-%d')
+            series.append({'date': key, 'sales': totals.get(key, 0.0)})
+            day += timedelta(days=1)
+        return series
@@ -0,0 +1,111 @@
+from app import db
+from app.models import Sale, SaleItem, User
+from app.services.keyset import Keyset
+from sqlalchemy import select, func
+
+
+class SaleSummary:
+    """
+    One-statement sale listings.
+
+    rows() selects the requested page of sales in a derived table, then joins
+    the cashier and a grouped item count restricted to that page's sale ids,
+    so a listing costs one query however many rows it shows and the count
+    never aggregates more than the page. Each row has id, created_at,
+    cashier, item_count, subtotal, tax_amount, discount, grand_total,
+    payment_method and sale_status.
+    """
+
+    @staticmethod
+    def statement(criteria=(), limit=None, offset=None, ascending=False):
+        if ascending:
+            order = (Sale.created_at.asc(), Sale.id.asc())
+        else:
+            order = (Sale.created_at.desc(), Sale.id.desc())
+        page = select(
+            Sale.id,
+            Sale.user_id,
+            Sale.created_at,
+            Sale.subtotal,
+            Sale.tax_amount,
+            Sale.discount,
+            Sale.grand_total,
+            Sale.payment_method,
+            Sale.sale_status
+        ).where(*criteria).order_by(*order)
+        if limit is not None:
+            page = page.limit(limit)
+        if offset:
+            page = page.offset(offset)
+        page = page.subquery('page')
+
+        counts = select(
+            SaleItem.sale_id,
+            func.count(SaleItem.id).label('item_count')
+        ).where(SaleItem.sale_id.in_(select(page.c.id))).group_by(SaleItem.sale_id).subquery('counts')
+
+        return select(
+            page.c.id,
+            page.c.created_at,
+            User.username.label('cashier'),
+            func.coalesce(counts.c.item_count, 0).label('item_count'),
+            page.c.subtotal,
+            page.c.tax_amount,
+            page.c.discount,
+            page.c.grand_total,
+            page.c.payment_method,
+            page.c.sale_status
+        ).select_from(page).outerjoin(
+            User, User.id == page.c.user_id
+        ).outerjoin(
+            counts, counts.c.sale_id == page.c.id
+        ).order_by(*[
+            column.asc() if ascending else column.desc()
+            for column in (page.c.created_at, page.c.id)
+        ])
+
+    @staticmethod
+    def rows(criteria=(), limit=None, offset=None, ascending=False):
+        """
+        Newest-first sale summaries matching criteria.
+
+        Args:
+            criteria (iterable): SQL criteria on Sale columns.
+            limit (int, optional): Page size.
+            offset (int, optional): Rows to skip.
+            ascending (bool): Oldest first instead.
+        """
+        return db.session.execute(SaleSummary.statement(criteria, limit, offset, ascending)).all()
+
+    @staticmethod
+    def recent(limit=10):
+        return SaleSummary.rows(limit=limit)
+
+    @staticmethod
+    def paginate(criteria=(), cursor=None, per_page=10, count_key=None):
+        """Keyset page of summaries on (created_at, id); see Keyset.page."""
+        criteria = list(criteria)
+        return Keyset.page(
+            lambda seek, ascending, limit: SaleSummary.rows(criteria + seek, limit=limit, ascending=ascending),
+            (Sale.created_at, Sale.id),
+            cursor=cursor,
+            per_page=per_page,
+            count=lambda limit: Keyset.capped_count(db.session.query(Sale.id).filter(*criteria), limit),
+            count_key=count_key
+        )
+
+    @staticmethod
+    def iter_rows(criteria=(), chunk_size=1000):
+        """Yield every matching summary newest first, one keyset chunk per query."""
+        criteria = list(criteria)
+        last = None
+        while True:
+            chunk_criteria = criteria
+            if last is not None:
+                chunk_criteria = criteria + [Keyset.seek((Sale.created_at, Sale.id), last)]
+            rows = SaleSummary.rows(chunk_criteria, limit=chunk_size)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last = (rows[-1].created_at, rows[-1].id)
+
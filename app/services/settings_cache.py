@@ -0,0 +1,73 @@
+from app import db
+from app.models import SystemSetting, CacheVersion
+from flask import current_app
+from types import MappingProxyType
+import threading
+import time
+
+
+class SettingsCache:
+    """
+    Per-worker snapshot of every SystemSetting row.
+
+    All rows are loaded with one query into a read-only mapping. Once the
+    snapshot is older than SETTINGS_CACHE_TTL seconds, the next read checks
+    the 'settings' CacheVersion row and reloads only when another worker
+    bumped it, so a page costs at most one settings query.
+    """
+
+    VERSION_NAME = 'settings'
+
+    _snapshot = None
+    _version = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _ttl():
+        try:
+            return current_app.config.get('SETTINGS_CACHE_TTL', 5)
+        except RuntimeError:
+            return 5
+
+    @staticmethod
+    def all():
+        """Return the current read-only {key: value} mapping."""
+        now = time.monotonic()
+        snapshot = SettingsCache._snapshot
+        if snapshot is not None and now - SettingsCache._checked_at < SettingsCache._ttl():
+            return snapshot
+
+        with SettingsCache._lock:
+            if SettingsCache._snapshot is not None and \
+                    now - SettingsCache._checked_at < SettingsCache._ttl():
+                return SettingsCache._snapshot
+
+            version = CacheVersion.get(SettingsCache.VERSION_NAME)
+            if SettingsCache._snapshot is None or version != SettingsCache._version:
+                rows = db.session.query(SystemSetting.key, SystemSetting.value).all()
+                SettingsCache._snapshot = MappingProxyType({key: value for key, value in rows})
+                SettingsCache._version = version
+            SettingsCache._checked_at = time.monotonic()
+            return SettingsCache._snapshot
+
+    @staticmethod
+    def get(key, default=None):
+        return SettingsCache.all().get(key, default)
+
+    @staticmethod
+    def invalidate():
+        """
+        Bump the shared version in the current transaction and drop the local
+        snapshot. Call before committing a settings change.
+        """
+        CacheVersion.bump(SettingsCache.VERSION_NAME)
+        SettingsCache.clear()
+
+    @staticmethod
+    def clear():
+        """Drop this worker's snapshot so the next read reloads it."""
+        with SettingsCache._lock:
+            SettingsCache._snapshot = None
+            SettingsCache._version = None
+            SettingsCache._checked_at = 0.0
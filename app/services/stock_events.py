@@ -0,0 +1,214 @@
+"""
+Publish/subscribe hub for live stock levels.
+
+Checkout and product edits publish compact {product_id, stock} events after
+they commit; every open SSE stream on the worker receives them through its
+own bounded queue.
+
+Two brokers are available:
+  - LocalBroker fans events out inside one process (single gunicorn worker).
+  - FileBroker is a stand-in for a real message broker when several workers
+    run on one host: publishers append to a shared spool file and each
+    worker runs one thread that tails it and fans events out locally.
+"""
+from flask import current_app
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """In-process fan-out to subscriber queues."""
+
+    def __init__(self, subscriber_queue_size=100):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(self):
+        subscription = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, message):
+        self.published += 1
+        self._fanout(message)
+
+    def _fanout(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                # A slow terminal missed events: tell it to resync instead
+                self.overflows += 1
+                self._reset(subscription)
+
+    def _reset(self, subscription):
+        while True:
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            subscription.put_nowait({'event': 'resync', 'data': {}})
+        except queue.Full:
+            pass
+
+    def _broadcast_resync(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self._reset(subscription)
+
+
+class FileBroker(LocalBroker):
+    """
+    Cross-worker broker backed by an append-only spool file.
+
+    Each event is one JSON line. Lines are small enough for O_APPEND writes
+    to be atomic, and the file is truncated by the publisher once it grows
+    past max_bytes; readers that notice the truncation ask their terminals
+    to resync.
+    """
+
+    def __init__(self, path, subscriber_queue_size=100, poll_interval=0.25, max_bytes=1024 * 1024):
+        super().__init__(subscriber_queue_size)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+        self._tail_thread = None
+        self._tail_pid = None
+        open(self.path, 'a').close()
+
+    def subscribe(self):
+        self._ensure_tailing()
+        return super().subscribe()
+
+    def publish(self, message):
+        self.published += 1
+        line = json.dumps(message, separators=(',', ':')) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                if fh.tell() > self.max_bytes:
+                    fh.truncate(0)
+                fh.write(line)
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _ensure_tailing(self):
+        if self._tail_pid == os.getpid() and self._tail_thread and self._tail_thread.is_alive():
+            return
+        with self._lock:
+            if self._tail_pid == os.getpid() and self._tail_thread and self._tail_thread.is_alive():
+                return
+            self._tail_pid = os.getpid()
+            # Start from the current end so only events published after subscribing are seen
+            offset = os.path.getsize(self.path)
+            self._tail_thread = threading.Thread(
+                target=self._tail, args=(offset,), name='stock-events-tail', daemon=True)
+            self._tail_thread.start()
+
+    def _tail(self, offset):
+        buffer = ''
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                size = os.path.getsize(self.path)
+                if size < offset:
+                    # Spool was truncated; some events may have been missed
+                    offset, buffer = 0, ''
+                    self._broadcast_resync()
+                if size == offset:
+                    continue
+                with open(self.path, encoding='utf-8') as fh:
+                    fh.seek(offset)
+                    chunk = fh.read()
+                    offset = fh.tell()
+            except OSError as e:
+                logger.warning("Stock event spool unavailable: %s", e)
+                continue
+
+            buffer += chunk
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                if not line:
+                    continue
+                try:
+                    self._fanout(json.loads(line))
+                except ValueError:
+                    continue
+
+
+class StockEvents:
+    @staticmethod
+    def init_app(app):
+        """Create the broker selected by STOCK_EVENTS_BROKER ('local' or 'file')."""
+        queue_size = app.config.get('STOCK_EVENTS_QUEUE_SIZE', 100)
+        if app.config.get('STOCK_EVENTS_BROKER', 'local') == 'file':
+            path = app.config.get('STOCK_EVENTS_SPOOL') or \
+                os.path.join(app.instance_path, 'stock_events.spool')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            broker = FileBroker(path, subscriber_queue_size=queue_size)
+        else:
+            broker = LocalBroker(subscriber_queue_size=queue_size)
+        app.extensions['stock_events'] = broker
+        return broker
+
+    @staticmethod
+    def broker():
+        return current_app.extensions['stock_events']
+
+    @staticmethod
+    def publish_stock(stock_levels):
+        """
+        Publish new stock levels after a commit.
+
+        Args:
+            stock_levels (dict): product_id -> quantity_in_stock
+        """
+        if not stock_levels:
+            return
+        try:
+            StockEvents.broker().publish({
+                'event': 'stock',
+                'data': [{'product_id': pid, 'stock': stock} for pid, stock in stock_levels.items()]
+            })
+        except Exception as e:
+            # Terminals recover through catalog sync; never fail the sale
+            logger.warning("Failed to publish stock events: %s", e)
+
+    @staticmethod
+    def stats():
+        broker = StockEvents.broker()
+        return {
+            'broker': type(broker).__name__,
+            'subscribers': broker.subscriber_count(),
+            'published': broker.published,
+            'overflows': broker.overflows
+        }
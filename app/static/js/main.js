@@ -86,6 +86,24 @@ async function apiRequest(url, options = {}) {
     }
 }
 
+// Background Export
+// Starts an export job, polls its status and downloads the file when ready.
+async function runExport(url, onError) {
+    try {
+        let job = await apiRequest(url);
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise(resolve => setTimeout(resolve, 1500));
+            job = await apiRequest(job.status_url);
+        }
+        if (job.status !== 'done') {
+            throw new Error(job.error || 'Export failed');
+        }
+        window.location.href = job.download_url;
+    } catch (error) {
+        if (onError) onError(error.message);
+    }
+}
+
 // Search Auto-complete
 function setupSearchAutoComplete(inputId, resultsId, searchUrl) {
     const input = document.getElementById(inputId);
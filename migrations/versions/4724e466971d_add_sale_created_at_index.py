@@ -0,0 +1,26 @@
+"""Add sale created_at index for report ranges
+
+Revision ID: 4724e466971d
+Revises: 8c71c912024d
+Create Date: 2026-10-16 12:20:54.803117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4724e466971d'
+down_revision = '8c71c912024d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sale_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sale_created_at'))
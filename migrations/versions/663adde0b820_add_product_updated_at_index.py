@@ -0,0 +1,26 @@
+"""Add product (updated_at, id) index for catalog sync
+
+Revision ID: 663adde0b820
+Revises: a0dc9f856a24
+Create Date: 2026-10-16 10:03:18.551907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '663adde0b820'
+down_revision = 'a0dc9f856a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_updated_at_id', ['updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_updated_at_id')
@@ -0,0 +1,33 @@
+"""Add cache_version table for cross-worker cache invalidation
+
+Revision ID: 8c71c912024d
+Revises: 663adde0b820
+Create Date: 2026-10-16 11:42:07.214386
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = '8c71c912024d'
+down_revision = '663adde0b820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    cache_version = op.create_table('cache_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(cache_version, [
+        {'name': 'settings', 'version': 1, 'updated_at': datetime.utcnow()}
+    ])
+
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,41 @@
+"""Add checkout idempotency keys
+
+Revision ID: a0dc9f856a24
+Revises: 75f0a284fd55
+Create Date: 2026-10-16 09:12:41.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a0dc9f856a24'
+down_revision = '75f0a284fd55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('checkout_idempotency_key',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('sale_id', sa.Integer(), nullable=False),
+    sa.Column('grand_total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['sale_id'], ['sale.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('checkout_idempotency_key', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_checkout_idempotency_key_created_at'), ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_checkout_idempotency_key_key'), ['key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('checkout_idempotency_key', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_checkout_idempotency_key_key'))
+        batch_op.drop_index(batch_op.f('ix_checkout_idempotency_key_created_at'))
+
+    op.drop_table('checkout_idempotency_key')
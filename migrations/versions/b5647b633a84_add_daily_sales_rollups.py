@@ -0,0 +1,76 @@
+"""Add daily sales and product rollup tables
+
+Revision ID: b5647b633a84
+Revises: 4724e466971d
+Create Date: 2026-10-16 13:05:39.618250
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5647b633a84'
+down_revision = '4724e466971d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('business_date', sa.Date(), nullable=False),
+    sa.Column('payment_method', sa.Enum('CASH', 'CARD', 'MOBILE_MONEY', name='paymentmethod'), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('sale_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('tax', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('discount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('items', sa.Integer(), nullable=False),
+    sa.Column('cogs', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('business_date', 'payment_method', 'user_id')
+    )
+    op.create_table('daily_product_rollup',
+    sa.Column('business_date', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('sale_count', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('cogs', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('business_date', 'product_id')
+    )
+
+    # Backfill from existing sales (COGS at the current product cost price)
+    op.execute("""
+        INSERT INTO daily_sales_rollup
+            (business_date, payment_method, user_id, sale_count, revenue, tax, discount, items, cogs)
+        SELECT DATE(s.created_at), s.payment_method, s.user_id, COUNT(s.id),
+               COALESCE(SUM(s.grand_total), 0), COALESCE(SUM(s.tax_amount), 0),
+               COALESCE(SUM(s.discount), 0), COALESCE(SUM(i.items), 0), COALESCE(SUM(i.cogs), 0)
+        FROM sale s
+        LEFT JOIN (
+            SELECT si.sale_id, SUM(si.quantity_sold) AS items,
+                   SUM(si.quantity_sold * p.cost_price) AS cogs
+            FROM sale_item si JOIN product p ON p.id = si.product_id
+            GROUP BY si.sale_id
+        ) i ON i.sale_id = s.id
+        WHERE s.created_at IS NOT NULL
+        GROUP BY DATE(s.created_at), s.payment_method, s.user_id
+    """)
+    op.execute("""
+        INSERT INTO daily_product_rollup
+            (business_date, product_id, sale_count, quantity, revenue, cogs)
+        SELECT DATE(s.created_at), si.product_id, COUNT(DISTINCT si.sale_id),
+               SUM(si.quantity_sold), SUM(si.total_price), SUM(si.quantity_sold * p.cost_price)
+        FROM sale_item si
+        JOIN sale s ON s.id = si.sale_id
+        JOIN product p ON p.id = si.product_id
+        WHERE s.created_at IS NOT NULL
+        GROUP BY DATE(s.created_at), si.product_id
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_product_rollup')
+    op.drop_table('daily_sales_rollup')
@@ -0,0 +1,26 @@
+"""Add expense (date, id) index for keyset pagination
+
+Revision ID: c3e81f5d2a47
+Revises: b5647b633a84
+Create Date: 2026-10-16 14:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e81f5d2a47'
+down_revision = 'b5647b633a84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_date_id', ['date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_date_id')
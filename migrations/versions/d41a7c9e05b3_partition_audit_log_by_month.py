@@ -0,0 +1,66 @@
+"""Partition audit_log by month (MySQL)
+
+Revision ID: d41a7c9e05b3
+Revises: c3e81f5d2a47
+Create Date: 2026-10-16 15:02:11.740862
+
+MySQL requires the partitioning column in every unique key and does not
+allow foreign keys on partitioned tables, so the primary key becomes
+(id, created_at) and the user_id foreign key is dropped (its index stays).
+Other databases keep the plain table; AuditArchive deletes archived months
+from it in batches instead of dropping partitions.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7c9e05b3'
+down_revision = 'c3e81f5d2a47'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _next_month(day):
+    return day.replace(year=day.year + 1, month=1) if day.month == 12 else day.replace(month=day.month + 1)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    for fk in sa.inspect(bind).get_foreign_keys('audit_log'):
+        op.drop_constraint(fk['name'], 'audit_log', type_='foreignkey')
+
+    op.execute("UPDATE audit_log SET created_at = UTC_TIMESTAMP() WHERE created_at IS NULL")
+    op.execute("ALTER TABLE audit_log MODIFY created_at DATETIME NOT NULL, "
+               "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)")
+
+    oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM audit_log")).scalar()
+    month = (oldest or datetime.utcnow()).date().replace(day=1)
+    last = datetime.utcnow().date().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+
+    partitions = []
+    while month <= last:
+        bound = _next_month(month)
+        partitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{bound:%Y-%m-%d}'))")
+        month = bound
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    op.execute("ALTER TABLE audit_log PARTITION BY RANGE (TO_DAYS(created_at)) (" + ", ".join(partitions) + ")")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    op.execute("ALTER TABLE audit_log REMOVE PARTITIONING")
+    op.execute("ALTER TABLE audit_log DROP PRIMARY KEY, ADD PRIMARY KEY (id), MODIFY created_at DATETIME NULL")
+    op.create_foreign_key(None, 'audit_log', 'user', ['user_id'], ['id'])
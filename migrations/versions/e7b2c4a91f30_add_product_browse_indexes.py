@@ -0,0 +1,30 @@
+"""Add product (is_active, [category_id,] name, id) indexes for catalog browsing
+
+Revision ID: e7b2c4a91f30
+Revises: d41a7c9e05b3
+Create Date: 2026-10-16 16:05:12.540917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2c4a91f30'
+down_revision = 'd41a7c9e05b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_is_active_category')
+        batch_op.create_index('ix_product_is_active_category', ['is_active', 'category_id', 'name', 'id'], unique=False)
+        batch_op.create_index('ix_product_is_active_name', ['is_active', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_is_active_name')
+        batch_op.drop_index('ix_product_is_active_category')
+        batch_op.create_index('ix_product_is_active_category', ['is_active', 'category_id'], unique=False)
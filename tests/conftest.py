@@ -13,6 +13,15 @@ os.environ.setdefault('ADMIN_PASSWORD', 'test-admin-password')
 
 from app import create_app, db
 from app.models import User, Role, Product, Category, Sale, SaleItem
+from app.services.settings_cache import SettingsCache
+from app.services.dashboard_service import DashboardService
+from app.services.keyset import Keyset
+from app.services.product_search import ProductSearch
+from app.services.catalog_service import CatalogService
+from app.services.catalog_payload import CatalogPayload
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.identity_cache import IdentityCache
+from app.services.db_pool import DbPool
 
 
 @pytest.fixture(scope='session')
@@ -40,6 +49,15 @@ def db_session(app):
         for table in reversed(db.metadata.sorted_tables):
             db.session.execute(table.delete())
         db.session.commit()
+        SettingsCache.clear()
+        DashboardService.clear()
+        Keyset.clear()
+        ProductSearch.clear()
+        CatalogService.clear()
+        CatalogPayload.clear()
+        CatalogSnapshot.clear()
+        IdentityCache.clear()
+        DbPool.reset()
         
         yield db.session
         
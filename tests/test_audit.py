@@ -0,0 +1,165 @@
+"""
+Tests for the buffered audit log writer and audit archival
+"""
+import json
+import os
+import pytest
+from datetime import date, datetime
+from app import db
+from app.models import AuditLog
+from app.services.audit_service import AuditWriter
+from app.services.audit_archive import AuditArchive
+
+
+def _event(action='TEST'):
+    from datetime import datetime
+    return {
+        'user_id': None,
+        'action': action,
+        'target_type': 'Test',
+        'target_id': None,
+        'details': {'n': 1},
+        'ip_address': None,
+        'user_agent': None,
+        'created_at': datetime.utcnow()
+    }
+
+
+class TestAuditWriter:
+    """Tests for batching, fallback and drop accounting"""
+    
+    @pytest.mark.integration
+    def test_login_is_audited(self, client, admin_user, db_session):
+        """Login should produce an audit row"""
+        client.post('/auth/login', data={
+            'username': 'testadmin',
+            'password': 'adminpass123'
+        })
+        
+        assert AuditLog.query.filter_by(action='LOGIN').count() == 1
+    
+    @pytest.mark.integration
+    def test_events_written_in_one_batch_on_close(self, app, db_session, tmp_path):
+        """Queued events should be written together when the writer closes"""
+        writer = AuditWriter(app, batch_size=50, flush_interval=30,
+                             fallback_path=str(tmp_path / 'audit.jsonl'))
+        for i in range(3):
+            assert writer.enqueue(_event(f'BATCH_{i}')) is True
+        
+        writer.close()
+        
+        assert AuditLog.query.filter(AuditLog.action.like('BATCH_%')).count() == 3
+        assert writer.stats()['written'] == 3
+    
+    @pytest.mark.integration
+    def test_failed_batch_goes_to_fallback_file(self, app, db_session, tmp_path, monkeypatch):
+        """Events should be appended to the fallback file when the DB write fails"""
+        fallback = tmp_path / 'audit.jsonl'
+        writer = AuditWriter(app, use_thread=False, fallback_path=str(fallback))
+        
+        def broken_execute(*args, **kwargs):
+            raise RuntimeError('database unavailable')
+        monkeypatch.setattr(db.session, 'execute', broken_execute)
+        
+        writer.enqueue(_event('OFFLINE'))
+        
+        lines = fallback.read_text().splitlines()
+        assert json.loads(lines[0])['action'] == 'OFFLINE'
+        assert writer.stats()['fallback'] == 1
+    
+    @pytest.mark.unit
+    def test_full_queue_counts_dropped_events(self, app, tmp_path, monkeypatch):
+        """Events beyond the queue capacity should be counted as dropped"""
+        writer = AuditWriter(app, max_queue=1, fallback_path=str(tmp_path / 'audit.jsonl'))
+        monkeypatch.setattr(writer, '_ensure_started', lambda: None)
+        
+        assert writer.enqueue(_event()) is True
+        assert writer.enqueue(_event()) is False
+        assert writer.stats()['dropped'] == 1
+
+    
+    @pytest.mark.integration
+    def test_failed_replay_keeps_fallback_events(self, app, db_session, tmp_path, monkeypatch):
+        """A replay that fails puts its events back in the fallback file for the next one"""
+        from app.services.audit_service import AuditService
+        fallback = tmp_path / 'audit.jsonl'
+        good = json.dumps(_event('REPLAYED'), default=str)
+        fallback.write_text(good + '\n')
+        
+        def broken_execute(*args, **kwargs):
+            raise RuntimeError('database unavailable')
+        with monkeypatch.context() as m:
+            m.setattr(db.session, 'execute', broken_execute)
+            with pytest.raises(RuntimeError):
+                AuditService.replay_fallback(str(fallback))
+        
+        assert fallback.read_text().splitlines() == [good]
+        assert list(tmp_path.glob('*.replaying')) == []
+        assert AuditLog.query.filter_by(action='REPLAYED').count() == 0
+        
+        # An interrupted replay's renamed file is picked up by the next one
+        fallback.replace(tmp_path / 'audit.jsonl.20240101000000.replaying')
+        
+        assert AuditService.replay_fallback(str(fallback)) == 1
+        assert AuditLog.query.filter_by(action='REPLAYED').count() == 1
+        assert list(tmp_path.glob('*.replaying')) == []
+    
+    @pytest.mark.integration
+    def test_replay_quarantines_corrupt_lines(self, app, db_session, tmp_path):
+        """A torn line is moved to the .bad file and the events around it are inserted"""
+        from app.services.audit_service import AuditService
+        fallback = tmp_path / 'audit.jsonl'
+        first = json.dumps(_event('BEFORE_TEAR'), default=str)
+        last = json.dumps(_event('AFTER_TEAR'), default=str)
+        fallback.write_text(first + '\n{"action": "TORN", "us\n' + last + '\n')
+        
+        assert AuditService.replay_fallback(str(fallback)) == 2
+        
+        assert AuditLog.query.filter(AuditLog.action.in_(['BEFORE_TEAR', 'AFTER_TEAR'])).count() == 2
+        assert (tmp_path / 'audit.jsonl.bad').read_text() == '{"action": "TORN", "us\n'
+        assert not fallback.exists()
+        assert list(tmp_path.glob('*.replaying')) == []
+
+class TestAuditArchive:
+    """Tests for moving old months into archive files"""
+    
+    @pytest.fixture
+    def archive_dir(self, app, tmp_path, monkeypatch):
+        monkeypatch.setitem(app.config, 'AUDIT_ARCHIVE_DIR', str(tmp_path / 'archive'))
+        return tmp_path / 'archive'
+    
+    @pytest.mark.integration
+    def test_old_months_move_to_archive_files(self, app, db_session, archive_dir):
+        """Rows before the cutoff are archived per month and leave the live table"""
+        for created_at, action in [(datetime(2024, 1, 5), 'LOGIN'), (datetime(2024, 1, 20), 'UPDATE_PRODUCT'),
+                                   (datetime(2024, 2, 3), 'LOGIN'), (datetime(2024, 3, 1), 'LOGIN')]:
+            db_session.add(AuditLog(action=action, target_type='Test', created_at=created_at))
+        db_session.commit()
+        
+        archived = AuditArchive.archive(cutoff=date(2024, 3, 1), batch_size=1)
+        
+        assert [(m['month'], m['rows']) for m in archived] == [('2024-01', 2), ('2024-02', 1)]
+        assert AuditLog.query.count() == 1
+        assert sorted(os.listdir(archive_dir)) == ['audit_2024-01.jsonl.gz', 'audit_2024-02.jsonl.gz', 'index.json']
+        assert AuditArchive.months() == ['2024-02', '2024-01']
+        
+        page = AuditArchive.search('2024-01', per_page=1)
+        assert [log.created_at for log in page.items] == [datetime(2024, 1, 20)]
+        assert page.total == 2
+        older = AuditArchive.search('2024-01', cursor=page.next_cursor, per_page=1)
+        assert [log.action for log in older.items] == ['LOGIN'] and not older.has_next
+        assert AuditArchive.search('2024-02', action='UPDATE_PRODUCT').items == []
+    
+    @pytest.mark.integration
+    def test_logs_viewer_reads_archived_month(self, app, authenticated_admin_client, db_session, archive_dir):
+        """Choosing an archived month pages through its archive file"""
+        db_session.add(AuditLog(action='DELETE_PRODUCT', target_type='Product', target_id='7',
+                                created_at=datetime(2023, 6, 1, 12, 0)))
+        db_session.commit()
+        AuditArchive.archive(cutoff=date(2023, 7, 1))
+        
+        response = authenticated_admin_client.get('/admin/logs?month=2023-06&action=delete_product')
+        
+        assert response.status_code == 200
+        assert b'DELETE_PRODUCT' in response.data
+        assert b'Archived month' in response.data
@@ -93,3 +93,55 @@ class TestOpenRedirectPrevention:
         assert response.status_code == 302
         location = response.headers.get('Location', '')
         assert 'evil.com' not in location
+
+
+class TestIdentityCache:
+    """Tests for the cached current_user identity"""
+    
+    @pytest.mark.unit
+    def test_identity_is_cached_and_read_only(self, db_session, admin_user):
+        """Repeat lookups reuse one frozen identity with its role set"""
+        from app.services.identity_cache import IdentityCache
+        identity = IdentityCache.get(admin_user.id)
+        
+        assert IdentityCache.get(admin_user.id) is identity
+        assert identity.has_role('Admin') and not identity.has_role('Cashier')
+        assert identity.role.name == 'Admin'
+        with pytest.raises(AttributeError):
+            identity.username = 'other'
+    
+    @pytest.mark.integration
+    def test_deactivation_logs_user_out(self, authenticated_cashier_client, db_session, cashier_user):
+        """A deactivated user is signed out on the next request"""
+        from app.services.identity_cache import IdentityCache
+        assert authenticated_cashier_client.get('/pos/').status_code == 200
+        
+        cashier_user.is_active = False
+        IdentityCache.invalidate(cashier_user.id)
+        db_session.commit()
+        
+        response = authenticated_cashier_client.get('/pos/')
+        assert response.status_code == 302
+        assert '/auth/login' in response.headers['Location']
+    
+    @pytest.mark.integration
+    def test_admin_edit_invalidates(self, authenticated_admin_client, cashier_user, manager_role):
+        """Editing a user drops their cached identity"""
+        from app.services.identity_cache import IdentityCache
+        assert IdentityCache.get(cashier_user.id).has_role('Cashier')
+        
+        authenticated_admin_client.post(f'/admin/users/{cashier_user.id}/edit', data={
+            'username': 'testcashier', 'email': 'cashier@test.com',
+            'role_id': manager_role.id, 'is_active': 'y'
+        })
+        
+        assert IdentityCache.get(cashier_user.id).has_role('Manager')
+    
+    @pytest.mark.integration
+    def test_profile_update_shows_immediately(self, authenticated_admin_client):
+        """The new username appears on the very next page"""
+        authenticated_admin_client.post('/auth/profile', data={
+            'username': 'renamedadmin', 'email': 'admin@test.com'
+        })
+        
+        assert b'renamedadmin' in authenticated_admin_client.get('/auth/profile').data
@@ -160,3 +160,121 @@ class TestUserModel:
     def test_has_role_incorrect(self, admin_user):
         """User should not have unassigned roles"""
         assert admin_user.has_role('Cashier') is False
+
+
+class TestSystemSettingCache:
+    
+    @pytest.mark.unit
+    def test_reads_are_served_from_snapshot(self, db_session):
+        """Repeated reads within the TTL should not query the database"""
+        from sqlalchemy import event
+        from app import db
+        from app.models import SystemSetting
+        
+        SystemSetting.set('currency_symbol', 'KES')
+        SystemSetting.get('currency_symbol')
+        
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            values = [SystemSetting.get('currency_symbol') for _ in range(40)]
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        
+        assert values == ['KES'] * 40
+        assert statements == []
+    
+    @pytest.mark.unit
+    def test_other_worker_change_seen_after_version_bump(self, app, db_session):
+        """A bumped cache_version should make the next revalidation reload"""
+        from app.models import SystemSetting, CacheVersion
+        from app.services.settings_cache import SettingsCache
+        
+        SystemSetting.set('company_name', 'Old Name')
+        assert SystemSetting.get('company_name') == 'Old Name'
+        
+        # Simulate another worker: change the row and bump without touching this cache
+        SystemSetting.query.filter_by(key='company_name').update({'value': 'New Name'})
+        CacheVersion.bump(SettingsCache.VERSION_NAME)
+        db_session.commit()
+        assert SystemSetting.get('company_name') == 'Old Name'
+        
+        SettingsCache._checked_at = 0.0  # TTL expired
+        assert SystemSetting.get('company_name') == 'New Name'
+
+
+class TestDbPool:
+    
+    @pytest.mark.unit
+    def test_engine_options_follow_config(self):
+        """Server databases get the metered pool sized by DB_POOL_*"""
+        from app.services.db_pool import DbPool, MeteredQueuePool
+        
+        options = DbPool.engine_options({
+            'SQLALCHEMY_DATABASE_URI': 'mysql+pymysql://pos@localhost/electronics_pos',
+            'DB_POOL_SIZE': 3,
+            'DB_POOL_MAX_OVERFLOW': 2,
+            'DB_POOL_TIMEOUT': 7,
+            'DB_POOL_RECYCLE': 600
+        })
+        
+        assert options['poolclass'] is MeteredQueuePool
+        assert (options['pool_size'], options['max_overflow'], options['pool_timeout']) == (3, 2, 7)
+        assert options['pool_recycle'] == 600
+        assert options['pool_pre_ping'] is True
+    
+    @pytest.mark.unit
+    def test_engine_options_keep_memory_sqlite_pool(self):
+        """In-memory SQLite keeps its own pool; explicit engine options win"""
+        from app.services.db_pool import DbPool
+        
+        options = DbPool.engine_options({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'pool_recycle': -1}
+        })
+        
+        assert 'poolclass' not in options
+        assert options['pool_recycle'] == -1
+    
+    @pytest.mark.unit
+    def test_checkouts_counted(self, app, db_session):
+        """Checkouts of the metered pool show up in stats"""
+        from sqlalchemy import text
+        from app import db
+        from app.services.db_pool import DbPool, MeteredQueuePool
+        
+        if not isinstance(db.engine.pool, MeteredQueuePool):
+            pytest.skip('test database uses its own pool')
+        db_session.commit()
+        db_session.close()
+        before = DbPool.stats()['checkouts']
+        
+        for _ in range(3):
+            db_session.execute(text('SELECT 1'))
+            db_session.close()
+        
+        stats = DbPool.stats()
+        assert stats['checkouts'] == before + 3
+        assert stats['size'] == app.config['DB_POOL_SIZE']
+        assert stats['peak_in_use'] >= 1
+        assert stats['wait_ms']['max'] >= stats['wait_ms']['p95'] >= 0
+    
+    @pytest.mark.unit
+    def test_filling_the_pool_is_not_overflow(self, app, tmp_path):
+        """The first pool_size connections are not overflow; the next one is"""
+        from sqlalchemy import create_engine
+        from app.services.db_pool import DbPool, MeteredQueuePool
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=MeteredQueuePool,
+                               pool_size=3, max_overflow=2)
+        DbPool.reset()
+        connections = [engine.connect() for _ in range(3)]
+        try:
+            assert DbPool.stats()['overflow_events'] == 0
+            connections.append(engine.connect())
+            assert DbPool.stats()['overflow_events'] == 1
+        finally:
+            for connection in connections:
+                connection.close()
+            engine.dispose()
@@ -0,0 +1,134 @@
+"""
+Tests for the wkhtmltopdf renderer pool
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import pytest
+from app.models import Sale, SaleItem, SaleStatus, PaymentMethod
+from app.services.pdf_service import PdfService, PdfRendererPool, PdfBusyError, PdfTimeoutError
+from app.services.receipt_cache import ReceiptCache
+
+
+# Stands in for wkhtmltopdf: one document per stdin line, "Done" on stderr,
+# output is the renderer's pid followed by the input HTML
+FAKE_WKHTMLTOPDF = '''
+import os, shlex, sys, time
+
+def render(source, target):
+    html = open(source).read()
+    if 'SLOW' in html:
+        time.sleep(2)
+    with open(target, 'w') as fh:
+        fh.write('%d:%s' % (os.getpid(), html))
+
+if sys.argv[1:] == ['--read-args-from-stdin']:
+    for line in sys.stdin:
+        args = shlex.split(line)
+        render(args[-2], args[-1])
+        sys.stderr.write('Done\\n')
+        sys.stderr.flush()
+else:
+    render(sys.argv[-2], sys.argv[-1])
+'''
+
+
+@pytest.fixture
+def fake_binary(tmp_path):
+    script = tmp_path / 'fake_wkhtmltopdf.py'
+    script.write_text(FAKE_WKHTMLTOPDF)
+    wrapper = tmp_path / 'wkhtmltopdf'
+    wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+    wrapper.chmod(0o755)
+    return str(wrapper)
+
+
+class TestPdfRendererPool:
+    """Tests for process reuse, the concurrency cap and timeouts"""
+
+    @pytest.mark.unit
+    def test_renderer_process_is_reused(self, fake_binary, tmp_path):
+        """Consecutive documents should be rendered by the same process"""
+        pool = PdfRendererPool(fake_binary, size=1, work_dir=str(tmp_path))
+        try:
+            first = pool.render('<p>one</p>', options={'orientation': 'Landscape'})
+            second = pool.render('<p>two</p>')
+        finally:
+            pool.close()
+
+        assert first.endswith(b'<p>one</p>')
+        assert first.split(b':')[0] == second.split(b':')[0]
+        assert pool.stats()['rendered'] == 2
+        assert pool.stats()['process_starts'] == 1
+
+    @pytest.mark.unit
+    def test_busy_pool_rejects_after_queue_timeout(self, fake_binary, tmp_path):
+        """A caller that cannot get a renderer in time should get PdfBusyError"""
+        pool = PdfRendererPool(fake_binary, size=1, queue_timeout=0.2, work_dir=str(tmp_path))
+        slow = threading.Thread(target=pool.render, args=('SLOW',))
+        try:
+            slow.start()
+            time.sleep(0.5)
+            with pytest.raises(PdfBusyError):
+                pool.render('<p>fast</p>')
+            slow.join()
+        finally:
+            pool.close()
+
+        assert pool.stats()['rejected'] == 1
+
+    @pytest.mark.unit
+    def test_timeout_restarts_the_renderer(self, fake_binary, tmp_path):
+        """A document past the render timeout should kill and replace the process"""
+        pool = PdfRendererPool(fake_binary, size=1, render_timeout=0.5, work_dir=str(tmp_path))
+        try:
+            with pytest.raises(PdfTimeoutError):
+                pool.render('SLOW')
+            pool.render_timeout = 10
+            assert pool.render('<p>after</p>').endswith(b'<p>after</p>')
+        finally:
+            pool.close()
+
+        assert pool.stats()['timeouts'] == 1
+        assert pool.stats()['process_starts'] == 2
+
+
+class TestReceiptCache:
+    """Tests for cached receipt reprints"""
+
+    @pytest.mark.integration
+    def test_reprint_is_served_from_cache_until_status_changes(self, app, authenticated_admin_client,
+                                                                db_session, admin_user, product, monkeypatch):
+        """Only the first print renders; a refund drops the cached receipt"""
+        store = app.extensions['receipt_cache']
+        store.invalidate('receipt_')
+        hits = store.hits
+        renders = []
+        monkeypatch.setattr(PdfService, 'render', lambda html, options=None: renders.append(html) or b'%PDF-test')
+
+        sale = Sale(
+            user_id=admin_user.id, subtotal=100, tax_rate=0, tax_amount=0, discount=0,
+            grand_total=100, payment_method=PaymentMethod.CASH, amount_paid=100, change_given=0,
+            sale_status=SaleStatus.COMPLETED, created_at=datetime.utcnow()
+        )
+        sale.sale_items.append(SaleItem(product_id=product.id, quantity_sold=1,
+                                        unit_price_at_time=100, total_price=100))
+        db_session.add(sale)
+        db_session.commit()
+
+        for _ in range(2):
+            response = authenticated_admin_client.get(f'/sales/{sale.id}/receipt/pdf')
+            assert response.data == b'%PDF-test'
+        assert len(renders) == 1
+        assert store.hits == hits + 1
+
+        sale.sale_status = SaleStatus.REFUNDED
+        db_session.commit()
+        assert not [name for name in os.listdir(store.directory)
+                    if name.startswith(f'receipt_{sale.id}_')]
+
+        authenticated_admin_client.get(f'/sales/{sale.id}/receipt/pdf')
+        assert len(renders) == 2
+        assert 'refunded' in ReceiptCache.key(sale)
@@ -159,3 +159,544 @@ class TestCheckout:
         data = json.loads(response.data)
         assert data.get('success') is True
         assert 'sale_id' in data
+
+
+class TestCheckoutAPI:
+    """Tests for the JSON checkout endpoint used by the POS terminal"""
+    
+    @pytest.mark.integration
+    def test_checkout_decrements_stock(self, authenticated_admin_client, db_session, product):
+        """Checkout should create the sale, its items and decrement stock"""
+        from app.models import Product, SaleItem
+        
+        response = authenticated_admin_client.post('/pos/api/checkout', json={
+            'items': [{'product_id': product.id, 'quantity': 2, 'price': 799.99}],
+            'discount': 0,
+            'payment_method': 'Cash'
+        })
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data.get('success') is True
+        
+        items = SaleItem.query.filter_by(sale_id=data['sale_id']).all()
+        assert len(items) == 1
+        assert items[0].quantity_sold == 2
+        assert db_session.get(Product, product.id).quantity_in_stock == 8
+    
+    @pytest.mark.integration
+    def test_checkout_aggregates_duplicate_lines(self, authenticated_admin_client, db_session, product):
+        """Split lines for one product must be checked against stock together"""
+        from app.models import Product, Sale
+        
+        response = authenticated_admin_client.post('/pos/api/checkout', json={
+            'items': [
+                {'product_id': product.id, 'quantity': 6, 'price': 799.99},
+                {'product_id': product.id, 'quantity': 6, 'price': 799.99}
+            ],
+            'payment_method': 'Cash'
+        })
+        
+        assert response.status_code == 400
+        assert 'stock' in json.loads(response.data).get('message', '').lower()
+        assert Sale.query.count() == 0
+        assert db_session.get(Product, product.id).quantity_in_stock == 10
+    
+    @pytest.mark.integration
+    def test_checkout_unknown_product(self, authenticated_admin_client, db_session):
+        """Unknown products should return 404 without creating a sale"""
+        response = authenticated_admin_client.post('/pos/api/checkout', json={
+            'items': [{'product_id': 9999, 'quantity': 1, 'price': 10}],
+            'payment_method': 'Cash'
+        })
+        
+        assert response.status_code == 404
+        assert json.loads(response.data).get('success') is False
+    
+    @pytest.mark.integration
+    def test_checkout_retry_with_same_idempotency_key(self, authenticated_admin_client, db_session, product):
+        """A retried checkout should return the original sale without touching stock"""
+        from app.models import Product, Sale
+        from app.services.idempotency_service import IdempotencyService
+        
+        payload = {
+            'items': [{'product_id': product.id, 'quantity': 3, 'price': 799.99}],
+            'payment_method': 'Cash'
+        }
+        headers = {'Idempotency-Key': 'retry-test-key-0001'}
+        
+        first = json.loads(authenticated_admin_client.post('/pos/api/checkout', json=payload, headers=headers).data)
+        # Drop the in-process LRU so the retry is answered from the table
+        IdempotencyService.clear_cache()
+        second = json.loads(authenticated_admin_client.post('/pos/api/checkout', json=payload, headers=headers).data)
+        
+        assert first['success'] is True and second['success'] is True
+        assert second['sale_id'] == first['sale_id']
+        assert second.get('replayed') is True
+        assert Sale.query.count() == 1
+        assert db_session.get(Product, product.id).quantity_in_stock == 7
+
+
+class TestCatalogSync:
+    """Tests for the delta catalog endpoint"""
+    
+    @pytest.mark.integration
+    def test_full_sync_then_delta(self, authenticated_admin_client, db_session, product):
+        """A cursor should only return rows changed after it"""
+        from datetime import datetime, timedelta
+        from app.models import Product
+        
+        full = json.loads(authenticated_admin_client.get('/pos/api/catalog').data)
+        assert full['full'] is True
+        assert [p['id'] for p in full['products']] == [product.id]
+        assert full['active_count'] == 1
+        
+        # Push the change past the settle window so the cursor is behind it
+        p = db_session.get(Product, product.id)
+        p.is_active = False
+        p.updated_at = datetime.utcnow() + timedelta(seconds=10)
+        db_session.commit()
+        
+        delta = json.loads(authenticated_admin_client.get(
+            '/pos/api/catalog', query_string={'cursor': full['cursor']}).data)
+        assert delta['products'] == []
+        assert delta['removed'] == [product.id]
+        assert delta['active_count'] == 0
+    
+    @pytest.mark.integration
+    def test_unchanged_catalog_returns_304(self, authenticated_admin_client, db_session, product):
+        """A terminal already at the current catalog version should get 304"""
+        from datetime import datetime, timedelta
+        product.updated_at = datetime.utcnow() - timedelta(minutes=1)
+        db_session.commit()
+        first = authenticated_admin_client.get('/pos/api/catalog')
+        cursor = json.loads(first.data)['cursor']
+        
+        response = authenticated_admin_client.get(
+            '/pos/api/catalog',
+            query_string={'cursor': cursor},
+            headers={'If-None-Match': first.headers['ETag']}
+        )
+        
+        assert response.status_code == 304
+    
+    @pytest.mark.integration
+    def test_unsettled_cursor_is_not_revalidated(self, authenticated_admin_client, db_session, product):
+        """A cursor inside the settle window gets the rows again instead of a 304"""
+        from app.models import Product
+        first = authenticated_admin_client.get('/pos/api/catalog')
+        cursor = json.loads(first.data)['cursor']
+        
+        # Same-second price edit that leaves the version signature unchanged
+        db_session.execute(Product.__table__.update().values(selling_price=749.99, updated_at=product.updated_at))
+        db_session.commit()
+        
+        response = authenticated_admin_client.get(
+            '/pos/api/catalog',
+            query_string={'cursor': cursor},
+            headers={'If-None-Match': first.headers['ETag']}
+        )
+        
+        assert response.status_code == 200
+        assert [p['price'] for p in json.loads(response.data)['products']] == [749.99]
+    
+    @pytest.mark.integration
+    def test_invalid_cursor_rejected(self, authenticated_admin_client):
+        """Garbage cursors should return 400"""
+        response = authenticated_admin_client.get('/pos/api/catalog', query_string={'cursor': '!!'})
+        assert response.status_code == 400
+
+
+class TestCatalogPayload:
+    """Tests for the precompressed, columnar /pos/api/data"""
+    
+    @pytest.mark.integration
+    def test_columnar_gzip_payload(self, authenticated_admin_client, product):
+        """Products come back as parallel arrays, gzip-encoded when accepted"""
+        import gzip
+        response = authenticated_admin_client.get('/pos/api/data', headers={'Accept-Encoding': 'gzip'})
+        
+        assert response.headers['Content-Encoding'] == 'gzip'
+        data = json.loads(gzip.decompress(response.data))
+        assert data['products']['id'] == [product.id]
+        assert data['products']['price'] == [799.99]
+        assert data['products']['barcode'] == ['1234567890123']
+    
+    @pytest.mark.integration
+    def test_etag_follows_catalog_version(self, authenticated_admin_client, db_session, product):
+        """An unchanged catalog revalidates with 304; a stock change serves a new body"""
+        first = authenticated_admin_client.get('/pos/api/data')
+        etag = first.headers['ETag']
+        assert 'Content-Encoding' not in first.headers
+        
+        cached = authenticated_admin_client.get('/pos/api/data', headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+        
+        # Same updated_at, so only the stock total tells the versions apart
+        from app.models import Product
+        db_session.execute(Product.__table__.update().values(quantity_in_stock=3, updated_at=product.updated_at))
+        db_session.commit()
+        
+        fresh = authenticated_admin_client.get('/pos/api/data', headers={'If-None-Match': etag})
+        assert fresh.status_code == 200
+        assert json.loads(fresh.data)['products']['stock'] == [3]
+    
+    @pytest.mark.integration
+    def test_same_second_edit_changes_etag(self, authenticated_admin_client, db_session, category, product):
+        """An edit that leaves updated_at and stock unchanged still serves a new body"""
+        from app.models import Product
+        etag = authenticated_admin_client.get('/pos/api/data').headers['ETag']
+        stamped = product.updated_at
+        
+        authenticated_admin_client.post(f'/products/{product.id}/edit', data={
+            'name': product.name, 'category_id': category.id, 'sku': product.sku,
+            'barcode': product.barcode, 'cost_price': '600.00', 'selling_price': '749.99',
+            'quantity': product.quantity_in_stock, 'low_stock_threshold': 5, 'description': ''
+        })
+        # Second-resolution timestamp: the edit lands in the same second
+        db_session.execute(Product.__table__.update().values(updated_at=stamped))
+        db_session.commit()
+        
+        fresh = authenticated_admin_client.get('/pos/api/data', headers={'If-None-Match': etag})
+        assert fresh.status_code == 200
+        assert json.loads(fresh.data)['products']['price'] == [749.99]
+
+
+class TestCatalogSnapshot:
+    """Tests for the memory-mapped product snapshot shared by workers"""
+    
+    @pytest.fixture
+    def snapshots(self, app, tmp_path, monkeypatch):
+        monkeypatch.setitem(app.config, 'CATALOG_SNAPSHOT', True)
+        monkeypatch.setitem(app.config, 'CATALOG_SNAPSHOT_DIR', str(tmp_path))
+        monkeypatch.setitem(app.config, 'CATALOG_SNAPSHOT_REFRESH_SECONDS', 0)
+        return tmp_path
+    
+    @pytest.mark.unit
+    def test_hash_index_prefers_barcodes(self, tmp_path):
+        """A code that is one product's barcode and another's SKU finds the barcode"""
+        from types import SimpleNamespace
+        from decimal import Decimal
+        from app.services.catalog_snapshot import MappedCatalog
+        rows = [
+            SimpleNamespace(id=i, name=f'Item {i}', sku=f'SKU-{i}', barcode=f'BC-{i}', selling_price=Decimal('1.25'),
+                            quantity_in_stock=i, category_id=None, is_active=True, updated_at=None)
+            for i in range(1, 200)
+        ]
+        rows[0].sku = 'BC-2'
+        path = str(tmp_path / 'catalog.bin')
+        MappedCatalog.write(path, '0' * 40, rows)
+        
+        catalog = MappedCatalog(path)
+        assert catalog.record(catalog.find('bc-2'))['id'] == 2
+        assert catalog.record(catalog.find('sku-150'))['id'] == 150
+        assert catalog.find('nope') is None
+        assert catalog.record(catalog.get(77)) == {
+            'id': 77, 'name': 'Item 77', 'price': 1.25, 'stock': 77,
+            'category_id': None, 'sku': 'SKU-77', 'barcode': 'BC-77'
+        }
+    
+    @pytest.mark.integration
+    def test_workers_swap_to_new_versions(self, authenticated_admin_client, db_session, category, product, snapshots):
+        """A catalog change publishes a new file; stale files are pruned"""
+        from app.models import Product
+        from app.services.catalog_snapshot import CatalogSnapshot
+        
+        data = json.loads(authenticated_admin_client.get('/api/products').data)
+        assert [p['id'] for p in data] == [product.id]
+        first = CatalogSnapshot.current().path
+        
+        for sku in ('A-1', 'A-2'):
+            db_session.add(Product(name=sku, category_id=category.id, sku=sku,
+                                   cost_price=1, selling_price=2, quantity_in_stock=1))
+            db_session.commit()
+            CatalogSnapshot.current()
+        
+        data = json.loads(authenticated_admin_client.get('/api/products').data)
+        assert [p['sku'] for p in data] == ['A-1', 'A-2', 'LAPTOP-001']
+        assert CatalogSnapshot.stats()['builds'] == 3
+        assert first.split('/')[-1] not in [f.name for f in snapshots.iterdir()]
+    
+    @pytest.mark.integration
+    def test_barcode_lookup_reads_live_stock(self, app, authenticated_admin_client, db_session, product,
+                                             snapshots, monkeypatch):
+        """Scans resolve through the snapshot but report the table's stock"""
+        from app.models import Product
+        from app.services.catalog_snapshot import CatalogSnapshot
+        CatalogSnapshot.current()
+        monkeypatch.setitem(app.config, 'CATALOG_SNAPSHOT_REFRESH_SECONDS', 3600)
+        
+        db_session.execute(Product.__table__.update().values(quantity_in_stock=2))
+        db_session.commit()
+        
+        data = json.loads(authenticated_admin_client.get('/pos/api/barcode/1234567890123').data)
+        assert data['product']['stock'] == 2
+        assert CatalogSnapshot.current().record(CatalogSnapshot.current().get(product.id))['stock'] == 10
+    
+    @pytest.mark.integration
+    def test_stock_changes_do_not_rebuild(self, authenticated_admin_client, db_session, product, snapshots):
+        """A checkout's stock update keeps the mapping; listings still show live stock"""
+        from datetime import datetime
+        from app.services.catalog_snapshot import CatalogSnapshot
+        from app.services.checkout_service import CheckoutService
+        authenticated_admin_client.get('/api/products')
+        builds = CatalogSnapshot.stats()['builds']
+        
+        CheckoutService.decrement_stock({product.id: 3}, now=datetime.utcnow())
+        db_session.commit()
+        
+        data = json.loads(authenticated_admin_client.get('/api/products').data)
+        assert data[0]['quantity'] == 7
+        assert CatalogSnapshot.stats()['builds'] == builds
+
+
+class TestCatalogBrowse:
+    """Tests for the paged, category-scoped catalog"""
+    
+    @pytest.mark.integration
+    def test_pages_in_name_order(self, authenticated_admin_client, db_session, category, product):
+        """Pages follow on from the cursor, scoped to the category"""
+        from app.models import Category, Product
+        other = Category(name='Cables')
+        db_session.add(other)
+        db_session.flush()
+        for name in ('Mouse', 'Adapter | USB-C', 'Keyboard'):
+            db_session.add(Product(name=name, category_id=category.id, sku=name[:3].upper(),
+                                   cost_price=1, selling_price=2, quantity_in_stock=5))
+        db_session.add(Product(name='HDMI', category_id=other.id, sku='HDMI',
+                               cost_price=1, selling_price=2, quantity_in_stock=5))
+        db_session.commit()
+        
+        first = json.loads(authenticated_admin_client.get(
+            '/pos/api/catalog/browse', query_string={'category_id': category.id, 'limit': 2}).data)
+        assert [p['name'] for p in first['products']] == ['Adapter | USB-C', 'Keyboard']
+        assert first['has_more'] is True
+        assert {c['name'] for c in first['categories']} == {'Electronics', 'Cables'}
+        
+        second = json.loads(authenticated_admin_client.get(
+            '/pos/api/catalog/browse',
+            query_string={'category_id': category.id, 'limit': 2, 'cursor': first['next_cursor']}).data)
+        assert [p['name'] for p in second['products']] == ['Mouse', 'Test Laptop']
+        assert second['has_more'] is False
+        assert 'categories' not in second
+        
+        searched = json.loads(authenticated_admin_client.get(
+            '/pos/api/catalog/browse', query_string={'search': 'usb'}).data)
+        assert [p['name'] for p in searched['products']] == ['Adapter | USB-C']
+    
+    @pytest.mark.integration
+    def test_first_page_leads_with_best_sellers(self, authenticated_admin_client, db_session, category, product):
+        """Products sold recently come back as the popular list"""
+        from datetime import datetime
+        from app.models import DailyProductRollup
+        db_session.add(DailyProductRollup(business_date=datetime.utcnow().date(), product_id=product.id,
+                                          sale_count=3, quantity=7, revenue=100, cogs=50))
+        db_session.commit()
+        
+        data = json.loads(authenticated_admin_client.get(
+            '/pos/api/catalog/browse', query_string={'category_id': category.id}).data)
+        
+        assert [p['id'] for p in data['popular']] == [product.id]
+        assert data['popular'][0]['stock'] == 10
+    
+    @pytest.mark.integration
+    def test_catalog_mode(self, app, authenticated_admin_client, product, monkeypatch):
+        """Terminals page above POS_FULL_CATALOG_MAX active products"""
+        monkeypatch.setitem(app.config, 'POS_FULL_CATALOG_MAX', 1)
+        assert b'const PAGED_CATALOG = false;' in authenticated_admin_client.get('/pos/').data
+        
+        monkeypatch.setitem(app.config, 'POS_FULL_CATALOG_MAX', 0)
+        assert b'const PAGED_CATALOG = true;' in authenticated_admin_client.get('/pos/').data
+
+
+class TestStockEvents:
+    """Tests for live stock events pushed to terminals"""
+    
+    @pytest.mark.integration
+    def test_checkout_publishes_stock_levels(self, app, authenticated_admin_client, db_session, product):
+        """A committed checkout should publish the remaining stock"""
+        broker = app.extensions['stock_events']
+        subscription = broker.subscribe()
+        try:
+            authenticated_admin_client.post('/pos/api/checkout', json={
+                'items': [{'product_id': product.id, 'quantity': 4, 'price': 799.99}],
+                'payment_method': 'Cash'
+            })
+            message = subscription.get(timeout=1)
+        finally:
+            broker.unsubscribe(subscription)
+        
+        assert message == {'event': 'stock', 'data': [{'product_id': product.id, 'stock': 6}]}
+    
+    @pytest.mark.integration
+    def test_stream_delivers_events(self, app, authenticated_admin_client, product):
+        """The SSE endpoint should forward published events"""
+        from app.services.stock_events import StockEvents
+        
+        app.config['STOCK_STREAM_MAX_SECONDS'] = 0.5
+        try:
+            response = authenticated_admin_client.get('/pos/api/stock/stream', buffered=False)
+            assert response.mimetype == 'text/event-stream'
+            chunks = response.response
+            assert next(chunks).startswith(b'retry:')
+            
+            with app.test_request_context():
+                StockEvents.publish_stock({product.id: 3})
+            body = b''.join(chunks).decode()
+        finally:
+            app.config['STOCK_STREAM_MAX_SECONDS'] = 300
+        
+        assert 'event: stock' in body
+        assert f'"product_id":{product.id},"stock":3' in body
+    
+    @pytest.mark.unit
+    def test_file_broker_fans_out_between_instances(self, tmp_path):
+        """Events appended by one worker's broker should reach another worker's subscribers"""
+        from app.services.stock_events import FileBroker
+        
+        spool = str(tmp_path / 'stock_events.spool')
+        publisher = FileBroker(spool, poll_interval=0.05)
+        reader = FileBroker(spool, poll_interval=0.05)
+        subscription = reader.subscribe()
+        
+        publisher.publish({'event': 'stock', 'data': [{'product_id': 1, 'stock': 2}]})
+        
+        assert subscription.get(timeout=2) == {'event': 'stock', 'data': [{'product_id': 1, 'stock': 2}]}
+
+
+class TestBatchCheckout:
+    """Tests for uploading offline-queued sales"""
+    
+    @pytest.mark.integration
+    def test_batch_accepts_sales_while_stock_lasts(self, authenticated_admin_client, db_session, product):
+        """Sales are accepted in order; the one that runs out of stock is rejected alone"""
+        from app.models import Product, Sale, SaleItem
+        
+        line = lambda qty: [{'product_id': product.id, 'quantity': qty, 'price': 799.99}]
+        response = authenticated_admin_client.post('/pos/api/checkout/batch', json={'sales': [
+            {'items': line(4), 'payment_method': 'Cash', 'client_ref': 'a', 'sold_at': '2024-01-05T10:00:00'},
+            {'items': line(7), 'payment_method': 'Cash', 'client_ref': 'b'},
+            {'items': line(6), 'payment_method': 'Mobile Money', 'client_ref': 'c'}
+        ]})
+        
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert [r['status'] for r in data['results']] == ['created', 'rejected', 'created']
+        assert data['results'][1]['product_ids'] == [product.id]
+        assert data['created'] == 2 and data['rejected'] == 1
+        
+        assert Sale.query.count() == 2
+        assert SaleItem.query.count() == 2
+        first = db_session.get(Sale, data['results'][0]['sale_id'])
+        assert first.created_at.year == 2024
+        assert db_session.get(Product, product.id).quantity_in_stock == 0
+    
+    @pytest.mark.integration
+    def test_batch_replays_uploaded_keys(self, authenticated_admin_client, db_session, product):
+        """Re-uploading a batch must not create the sales twice"""
+        from app.models import Product, Sale
+        
+        payload = {'sales': [{
+            'items': [{'product_id': product.id, 'quantity': 2, 'price': 799.99}],
+            'payment_method': 'Cash',
+            'idempotency_key': 'offline-sale-0001'
+        }]}
+        first = json.loads(authenticated_admin_client.post('/pos/api/checkout/batch', json=payload).data)
+        second = json.loads(authenticated_admin_client.post('/pos/api/checkout/batch', json=payload).data)
+        
+        assert first['results'][0]['status'] == 'created'
+        assert second['results'][0]['status'] == 'replayed'
+        assert second['results'][0]['sale_id'] == first['results'][0]['sale_id']
+        assert Sale.query.count() == 1
+        assert db_session.get(Product, product.id).quantity_in_stock == 8
+
+
+class TestProductSearchIndex:
+    """Tests for the in-process product search index"""
+    
+    @pytest.mark.integration
+    def test_exact_sku_ranks_first(self, authenticated_admin_client, db_session, category, product):
+        """An exact SKU hit comes before products that only contain the term"""
+        from app.models import Product
+        db_session.add(Product(name='Laptop-001 Sleeve', category_id=category.id, sku='SLEEVE-9',
+                               barcode='999', cost_price=5, selling_price=10, quantity_in_stock=3))
+        db_session.commit()
+        
+        data = json.loads(authenticated_admin_client.get('/api/products?search=laptop-001').data)
+        
+        assert [p['sku'] for p in data] == ['LAPTOP-001', 'SLEEVE-9']
+    
+    @pytest.mark.integration
+    def test_index_follows_edits_and_deletes(self, authenticated_admin_client, db_session, product):
+        """Renamed and deleted products stop matching their old names"""
+        from app.services.product_search import ProductSearch
+        assert [p.id for p in ProductSearch.load(ProductSearch.search('test lap'))] == [product.id]
+        
+        product.name = 'Gaming Notebook'
+        db_session.commit()
+        ProductSearch.upsert(product)
+        assert ProductSearch.search('test lap') == []
+        assert ProductSearch.search('noteb') == [product.id]
+        
+        authenticated_admin_client.post(f'/products/{product.id}/delete')
+        assert ProductSearch.search('noteb') == []
+    
+    @pytest.mark.integration
+    def test_refresh_picks_up_late_commit(self, db_session, category, product):
+        """An edit stamped before the watermark but committed after a refresh is still applied"""
+        from datetime import timedelta
+        from app.models import Product
+        from app.services.product_search import ProductSearch
+        newer = Product(name='Tablet', category_id=category.id, sku='TAB-1', barcode='777',
+                        cost_price=5, selling_price=10, quantity_in_stock=3)
+        db_session.add(newer)
+        db_session.commit()
+        ProductSearch.build()
+        
+        # Another worker's edit, stamped a second before the newest row, commits now
+        Product.query.filter_by(id=product.id).update({
+            'name': 'Gaming Notebook',
+            'updated_at': newer.updated_at - timedelta(seconds=1)
+        })
+        db_session.commit()
+        ProductSearch._checked_at = 0.0
+        
+        assert ProductSearch.search('noteb') == [product.id]
+        assert ProductSearch.search('test lap') == []
+    
+    @pytest.mark.integration
+    def test_products_page_filters_through_index(self, authenticated_admin_client, product):
+        """The product list and quick search use the same matches"""
+        listing = authenticated_admin_client.get('/products/?search=890123')
+        quick = json.loads(authenticated_admin_client.get('/products/search?q=LAPTOP').data)
+        
+        assert b'Test Laptop' in listing.data
+        assert [p['id'] for p in quick] == [product.id]
+        assert b'Test Laptop' not in authenticated_admin_client.get('/products/?search=tablet').data
+    
+    @pytest.mark.integration
+    def test_barcode_lookup(self, authenticated_admin_client, db_session, product):
+        """Scanner lookups resolve barcodes and SKUs with live stock"""
+        by_barcode = json.loads(authenticated_admin_client.get('/pos/api/barcode/1234567890123').data)
+        assert by_barcode['product']['id'] == product.id
+        assert by_barcode['product']['stock'] == 10
+        
+        product.quantity_in_stock = 4
+        db_session.commit()
+        by_sku = json.loads(authenticated_admin_client.get('/pos/api/barcode/laptop-001').data)
+        assert by_sku['product']['stock'] == 4
+        
+        assert authenticated_admin_client.get('/pos/api/barcode/000').status_code == 404
+    
+    @pytest.mark.integration
+    def test_barcode_lookup_follows_changes(self, authenticated_admin_client, db_session, product):
+        """A code reassigned behind the index's back still resolves to the right product"""
+        from app.services.product_search import ProductSearch
+        assert ProductSearch.lookup('1234567890123') == product.id
+        
+        product.barcode = '555'
+        db_session.commit()
+        
+        assert authenticated_admin_client.get('/pos/api/barcode/1234567890123').status_code == 404
+        assert json.loads(authenticated_admin_client.get('/pos/api/barcode/555').data)['product']['id'] == product.id
+        assert ProductSearch.lookup('555') == product.id
@@ -0,0 +1,425 @@
+"""
+Tests for the shared sales report engine
+"""
+import csv
+import gzip
+import io
+import json
+import re
+import time
+import openpyxl
+import pytest
+from datetime import date, datetime, timedelta
+from html import unescape
+from urllib.parse import parse_qs, urlsplit
+from app.models import Sale, SaleItem, PaymentMethod, SaleStatus
+from app.services.report_service import ReportService, ReportPeriod
+from app.services.rollup_service import RollupService
+from app.services.dashboard_service import DashboardService
+from app.services.export_jobs import ExportJobs
+from app.services.export_service import StreamingSheet
+from app.services.sale_summary import SaleSummary
+from app.services.keyset import Keyset
+
+
+def _sale(user, product, created_at, quantity=1, method=PaymentMethod.CASH):
+    total = quantity * 100
+    sale = Sale(
+        user_id=user.id, subtotal=total, tax_rate=0, tax_amount=0, discount=0,
+        grand_total=total, payment_method=method, amount_paid=total, change_given=0,
+        sale_status=SaleStatus.COMPLETED, created_at=created_at
+    )
+    sale.sale_items.append(SaleItem(
+        product_id=product.id, quantity_sold=quantity,
+        unit_price_at_time=100, total_price=total
+    ))
+    return sale
+
+
+class TestReportService:
+    """Tests for period resolution and KPI aggregation"""
+    
+    @pytest.mark.unit
+    def test_period_is_half_open(self):
+        """The datetime range should end at midnight after end_date"""
+        period, invalid = ReportService.resolve_period('custom', '2024-03-01', '2024-03-31')
+        
+        assert invalid == []
+        assert period.start == datetime(2024, 3, 1)
+        assert period.end == datetime(2024, 4, 1)
+    
+    @pytest.mark.unit
+    def test_invalid_dates_fall_back_to_last_30_days(self):
+        """Unparseable dates are reported and the default range is used"""
+        period, invalid = ReportService.resolve_period('custom', 'bad', None, today=date(2024, 3, 31))
+        
+        assert invalid == ['start_date']
+        assert (period.start_date, period.end_date) == (date(2024, 3, 1), date(2024, 3, 31))
+    
+    @pytest.mark.integration
+    def test_build_aggregates_period(self, db_session, admin_user, product):
+        """Totals, COGS, daily buckets and breakdowns come from the same rows"""
+        db_session.add_all([
+            _sale(admin_user, product, datetime(2024, 3, 1, 0, 0), quantity=2),
+            _sale(admin_user, product, datetime(2024, 3, 2, 23, 59), quantity=1, method=PaymentMethod.MOBILE_MONEY),
+            # Midnight after the period belongs to the next day
+            _sale(admin_user, product, datetime(2024, 3, 3, 0, 0), quantity=5)
+        ])
+        db_session.commit()
+        # Rows inserted outside checkout reach the rollups through a rebuild
+        RollupService.rebuild(date(2024, 3, 1), date(2024, 3, 3))
+        
+        report = ReportService.build(ReportPeriod('custom', date(2024, 3, 1), date(2024, 3, 2)))
+        
+        assert report['total_sales'] == 2
+        assert report['total_revenue'] == 300
+        assert report['total_items'] == 3
+        assert report['cogs'] == pytest.approx(3 * float(product.cost_price))
+        assert report['daily_sales'] == [
+            {'date': '2024-03-01', 'sales': 200.0},
+            {'date': '2024-03-02', 'sales': 100.0}
+        ]
+        assert dict(zip(report['payment_method_labels'], report['payment_method_values'])) == {
+            'Cash': 200.0, 'Mobile Money': 100.0
+        }
+        assert report['top_products'][0].total_sold == 3
+        assert report['user_sales'][0].count == 2
+    
+    @pytest.mark.integration
+    def test_reports_data_uses_same_figures(self, authenticated_admin_client, db_session, admin_user, product):
+        """The JSON endpoint should expose the engine's summary"""
+        db_session.add(_sale(admin_user, product, datetime(2024, 3, 1, 12, 0), quantity=2))
+        db_session.commit()
+        RollupService.rebuild(date(2024, 3, 1), date(2024, 3, 1))
+        
+        response = authenticated_admin_client.get('/sales/reports/data', query_string={
+            'start_date': '2024-03-01', 'end_date': '2024-03-01'
+        })
+        data = json.loads(response.data)
+        
+        assert data['summary']['total_sales'] == 1
+        assert data['daily_sales'] == [{'date': '2024-03-01', 'sales': 200.0}]
+
+
+class TestRollups:
+    """Tests for the daily rollup tables"""
+    
+    @pytest.mark.integration
+    def test_checkout_updates_rollups(self, authenticated_admin_client, db_session, admin_user, product):
+        """Two checkouts by one cashier accumulate into one rollup row"""
+        from app.models import DailySalesRollup, DailyProductRollup
+        
+        for qty in (1, 2):
+            authenticated_admin_client.post('/pos/api/checkout', json={
+                'items': [{'product_id': product.id, 'quantity': qty, 'price': 100}],
+                'payment_method': 'Cash'
+            })
+        
+        rollup = DailySalesRollup.query.one()
+        assert rollup.user_id == admin_user.id
+        assert rollup.sale_count == 2
+        assert rollup.items == 3
+        assert float(rollup.cogs) == pytest.approx(3 * float(product.cost_price))
+        
+        product_rollup = DailyProductRollup.query.one()
+        assert (product_rollup.sale_count, product_rollup.quantity) == (2, 3)
+        assert float(product_rollup.revenue) == 300
+    
+    @pytest.mark.integration
+    def test_rebuild_matches_checkout_rollups(self, authenticated_admin_client, db_session, product):
+        """Rebuilding a day from raw rows reproduces what checkout recorded"""
+        from app.models import DailySalesRollup
+        
+        authenticated_admin_client.post('/pos/api/checkout', json={
+            'items': [{'product_id': product.id, 'quantity': 2, 'price': 100}],
+            'payment_method': 'Cash'
+        })
+        before = [(r.sale_count, float(r.revenue), r.items) for r in DailySalesRollup.query.all()]
+        
+        today = datetime.utcnow().date()
+        RollupService.rebuild(today, today)
+        
+        after = [(r.sale_count, float(r.revenue), r.items) for r in DailySalesRollup.query.all()]
+        assert after == before
+    
+    @pytest.mark.unit
+    def test_closed_days_read_from_rollups(self, db_session, admin_user, product):
+        """Past days come from the rollups, so raw rows without a rollup are not counted"""
+        db_session.add(_sale(admin_user, product, datetime(2024, 3, 1, 12, 0)))
+        db_session.commit()
+        
+        buckets = RollupService.sales_buckets(date(2024, 3, 1), date(2024, 3, 1), today=date(2024, 3, 5))
+        assert buckets == []
+        
+        RollupService.rebuild(date(2024, 3, 1), date(2024, 3, 1))
+        buckets = RollupService.sales_buckets(date(2024, 3, 1), date(2024, 3, 1), today=date(2024, 3, 5))
+        assert [(b.day, b.count, b.revenue) for b in buckets] == [('2024-03-01', 1, 100.0)]
+
+
+class TestDashboardSnapshot:
+    """Tests for the cached dashboard KPIs"""
+    
+    @pytest.mark.integration
+    def test_new_sales_are_added_incrementally(self, authenticated_admin_client, db_session, admin_user, product):
+        """After the TTL only sales past the high-water mark are folded in"""
+        db_session.add(_sale(admin_user, product, datetime(2024, 3, 1, 12, 0), quantity=2))
+        db_session.commit()
+        RollupService.rebuild(date(2024, 3, 1), date(2024, 3, 1))
+        
+        stats = DashboardService.snapshot()
+        assert (stats['total_sales'], stats['total_revenue'], stats['today_sales']) == (1, 200.0, 0)
+        
+        authenticated_admin_client.post('/pos/api/checkout', json={
+            'items': [{'product_id': product.id, 'quantity': 1, 'price': 100}],
+            'payment_method': 'Cash'
+        })
+        # Still within the TTL: the cached figures are served
+        assert DashboardService.snapshot()['total_sales'] == 1
+        
+        DashboardService._checked_at = 0.0
+        stats = DashboardService.snapshot()
+        assert stats['total_sales'] == 2
+        assert stats['today_sales'] == 1
+        assert stats['top_products'][0].total_sold == 3
+        assert stats['sales_data'][-1]['sales'] == stats['today_revenue']
+        assert stats['net_profit'] == pytest.approx(stats['total_revenue'] - 3 * float(product.cost_price))
+    
+    @pytest.mark.integration
+    def test_lower_id_committed_later_is_counted(self, app, db_session, admin_user, product):
+        """A sale committed after a higher id was folded in is still counted, once"""
+        now = datetime.utcnow()
+        later = _sale(admin_user, product, now, quantity=2)
+        later.id = 50
+        db_session.add(later)
+        db_session.commit()
+        
+        stats = DashboardService.snapshot()
+        assert (stats['today_sales'], stats['today_revenue']) == (1, 200.0)
+        
+        # Sale 40 was inserted first but its transaction commits only now
+        earlier = _sale(admin_user, product, now - timedelta(seconds=1), quantity=1)
+        earlier.id = 40
+        db_session.add(earlier)
+        db_session.commit()
+        
+        DashboardService._checked_at = 0.0
+        stats = DashboardService.snapshot()
+        assert (stats['today_sales'], stats['today_revenue']) == (2, 300.0)
+        assert stats['top_products'][0].total_sold == 3
+        
+        # Once both have settled the mark moves past them without counting them again
+        DashboardService._checked_at = 0.0
+        app.config['DASHBOARD_SETTLE_SECONDS'] = 0
+        try:
+            stats = DashboardService.snapshot()
+        finally:
+            app.config['DASHBOARD_SETTLE_SECONDS'] = 10
+        assert (stats['total_sales'], stats['today_revenue']) == (2, 300.0)
+        assert DashboardService._state['high_water'] == 50
+        assert DashboardService._state['counted'] == set()
+
+
+class TestExportJobs:
+    """Tests for background report exports"""
+    
+    @pytest.mark.integration
+    def test_export_job_builds_and_serves_workbook(self, authenticated_admin_client, db_session):
+        """The export request returns a job whose file can then be downloaded"""
+        response = authenticated_admin_client.get('/sales/reports/excel?type=monthly')
+        assert response.status_code == 202
+        job = response.get_json()
+        assert job['status'] == 'done'
+        
+        status = authenticated_admin_client.get(job['status_url']).get_json()
+        assert status['download_url'] == job['download_url']
+        
+        download = authenticated_admin_client.get(job['download_url'])
+        assert download.status_code == 200
+        assert download.data[:2] == b'PK'
+    
+    @pytest.mark.unit
+    def test_identical_running_export_is_joined(self, app):
+        """A request matching a queued job should get that job back"""
+        with app.test_request_context('/sales/reports/pdf?type=daily'):
+            store = app.extensions['export_jobs']['store']
+            key = ExportJobs.dedupe_key('sales_report_pdf', {'type': 'daily'})
+            running = {
+                'id': 'a' * 32, 'kind': 'sales_report_pdf', 'params': {'type': 'daily'},
+                'dedupe_key': key, 'status': 'running', 'ext': 'pdf', 'mimetype': 'application/pdf',
+                'filename': None, 'size': None, 'error': None, 'base_url': None,
+                'created_at': time.time(), 'started_at': time.time(), 'finished_at': None
+            }
+            store.write(running)
+            assert store.claim(key, running['id'])
+            try:
+                job = ExportJobs.enqueue('sales_report_pdf', {'type': 'daily', 'user_id': '7'})
+            finally:
+                store.release(key)
+                store.discard(running['id'])
+        
+        assert job['id'] == running['id']
+    
+    @pytest.mark.unit
+    def test_worker_app_skips_warm_up(self, monkeypatch):
+        """Export worker processes build their app without the serving-side warm-up"""
+        from config import TestingConfig
+        from app.services import export_jobs
+        
+        class ServingConfig(TestingConfig):
+            PRODUCT_SEARCH_WARM = True
+            AUDIT_ASYNC = True
+        monkeypatch.setattr(export_jobs, '_worker_app', None)
+        export_jobs._init_worker(ServingConfig)
+        worker = export_jobs._worker_app
+        
+        assert worker.config['PRODUCT_SEARCH_WARM'] is False
+        assert worker.extensions['audit_writer'].use_thread is False
+        assert worker.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size', 1) == 1
+
+
+class TestStreamingExcel:
+    """Tests for the chunked, write-only Excel exports"""
+    
+    @pytest.mark.unit
+    def test_streaming_sheet_sizes_columns_from_rows(self, app):
+        """Widths come from the widest value seen while streaming"""
+        with app.app_context():
+            sheet = StreamingSheet("Sales", ['ID', 'Name'])
+            sheet.append([1, 'a much longer product name'])
+            sheet.append([2, None])
+            ws = openpyxl.load_workbook(sheet.save())['Sales']
+        
+        assert [row[1].value for row in ws.iter_rows()] == ['Name', 'a much longer product name', None]
+        assert ws.column_dimensions['B'].width == len('a much longer product name') + 2
+    
+    @pytest.mark.integration
+    def test_sales_export_is_uncapped_and_chunked(self, app, authenticated_admin_client, db_session,
+                                                   admin_user, product, monkeypatch):
+        """Every matching sale is exported across several keyset chunks"""
+        monkeypatch.setitem(app.config, 'EXPORT_CHUNK_SIZE', 2)
+        for day in range(1, 6):
+            db_session.add(_sale(admin_user, product, datetime(2024, 3, day, 12, 0), quantity=day))
+        db_session.commit()
+        
+        response = authenticated_admin_client.get('/sales/export/excel?start_date=2024-03-02')
+        ws = openpyxl.load_workbook(io.BytesIO(response.data))['Sales']
+        rows = list(ws.iter_rows(min_row=2, values_only=True))
+        
+        assert [row[1] for row in rows] == [f'2024-03-0{day} 12:00' for day in (5, 4, 3, 2)]
+        assert [row[2] for row in rows] == ['testadmin'] * 4
+        assert [row[3] for row in rows] == [1, 1, 1, 1]
+
+
+class TestSalesStream:
+    """Tests for the CSV/NDJSON sales stream"""
+    
+    @pytest.mark.integration
+    def test_stream_resumes_after_id(self, authenticated_admin_client, db_session, admin_user, product):
+        """NDJSON rows come in id order and after_id skips what was received"""
+        sales = [_sale(admin_user, product, datetime(2024, 4, day, 9, 0)) for day in (1, 2, 3)]
+        db_session.add_all(sales)
+        db_session.commit()
+        
+        response = authenticated_admin_client.get(f'/sales/export/stream?format=ndjson&after_id={sales[0].id}')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        
+        assert response.mimetype == 'application/x-ndjson'
+        assert [row['id'] for row in rows] == [sales[1].id, sales[2].id]
+        assert rows[0]['cashier'] == 'testadmin'
+        assert rows[0]['grand_total'] == 100.0
+    
+    @pytest.mark.integration
+    def test_item_stream_as_gzipped_csv(self, authenticated_admin_client, db_session, admin_user, product):
+        """rows=items yields one CSV row per sale line, gzip on request"""
+        db_session.add(_sale(admin_user, product, datetime(2024, 4, 1, 9, 0), quantity=3))
+        db_session.commit()
+        
+        response = authenticated_admin_client.get('/sales/export/stream?rows=items&gzip=1&start_date=2024-04-01')
+        assert response.headers['Content-Encoding'] == 'gzip'
+        lines = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode())))
+        
+        assert lines[0][:2] == ['id', 'sale_id']
+        assert lines[1][4:7] == ['Test Laptop', 'LAPTOP-001', '3']
+
+
+class TestSaleSummary:
+    """Tests for the single-query sales listing"""
+    
+    @pytest.mark.integration
+    def test_page_rows_carry_cashier_and_item_count(self, db_session, admin_user, product):
+        """A page is newest first with the cashier and the count of its lines"""
+        for day in range(1, 5):
+            sale = _sale(admin_user, product, datetime(2024, 5, day, 9, 0))
+            for _ in range(day - 1):
+                sale.sale_items.append(SaleItem(product_id=product.id, quantity_sold=1,
+                                                unit_price_at_time=100, total_price=100))
+            db_session.add(sale)
+        db_session.commit()
+        
+        first = SaleSummary.paginate(per_page=2, count_key=('test',))
+        second = SaleSummary.paginate(cursor=first.next_cursor, per_page=2)
+        back = SaleSummary.paginate(cursor=second.prev_cursor, per_page=2)
+        
+        assert first.total == 4 and not first.has_prev
+        assert [row.created_at.day for row in second.items] == [2, 1]
+        assert [row.item_count for row in second.items] == [2, 1]
+        assert {row.cashier for row in second.items} == {'testadmin'}
+        assert not second.has_next
+        assert [row.id for row in back.items] == [row.id for row in first.items]
+        assert not back.has_prev and back.has_next
+    
+    @pytest.mark.integration
+    def test_sales_index_renders_summaries(self, authenticated_admin_client, db_session, admin_user, product):
+        """The sales list shows the cashier without loading the sale relations"""
+        db_session.add(_sale(admin_user, product, datetime(2024, 5, 1, 9, 0)))
+        db_session.commit()
+        
+        response = authenticated_admin_client.get('/sales/')
+        
+        assert response.status_code == 200
+        assert b'testadmin' in response.data
+
+
+class TestKeysetPagination:
+    """Tests for cursor pagination and capped totals"""
+    
+    @pytest.mark.unit
+    def test_cursor_round_trip_and_garbage(self):
+        """Tokens decode to typed key values; mangled tokens mean the first page"""
+        token = Keyset.encode_cursor('next', [datetime(2024, 3, 1, 9, 30), 42])
+        
+        assert Keyset.decode_cursor(token, (Sale.created_at, Sale.id)) == ('next', [datetime(2024, 3, 1, 9, 30), 42])
+        assert Keyset.decode_cursor('not-a-cursor', (Sale.created_at, Sale.id)) is None
+        assert Keyset.decode_cursor(token, (Sale.id,)) is None
+    
+    @pytest.mark.integration
+    def test_total_is_capped_and_cached(self, app, db_session, admin_user, product, monkeypatch):
+        """Counting stops at the limit and is reused for the same filters"""
+        monkeypatch.setitem(app.config, 'PAGINATION_COUNT_LIMIT', 2)
+        db_session.add_all([_sale(admin_user, product, datetime(2024, 6, day, 9, 0)) for day in (1, 2, 3)])
+        db_session.commit()
+        
+        page = SaleSummary.paginate(per_page=2, count_key=('sales',))
+        assert (page.total, page.total_capped) == (2, True)
+        
+        db_session.query(SaleItem).delete()
+        db_session.query(Sale).delete()
+        db_session.commit()
+        assert SaleSummary.paginate(per_page=2, count_key=('sales',)).total == 2
+        assert SaleSummary.paginate(per_page=2).total is None
+    
+    @pytest.mark.integration
+    def test_sales_pager_keeps_filters(self, authenticated_admin_client, db_session, admin_user, product):
+        """Next links carry the cursor and the active filters"""
+        db_session.add_all([_sale(admin_user, product, datetime(2024, 6, day, 9, 0)) for day in range(1, 13)])
+        db_session.commit()
+        
+        response = authenticated_admin_client.get(f'/sales/?start_date=2024-06-01&user_id={admin_user.id}')
+        html = response.data.decode()
+        
+        href = re.search(r'href="([^"]*cursor=[^"]*)"', html).group(1)
+        query = parse_qs(urlsplit(unescape(href)).query)
+        
+        assert query['start_date'] == ['2024-06-01']
+        assert query['user_id'] == [str(admin_user.id)]
+        assert '12 results' in html